@@ -0,0 +1,281 @@
+"""JSON prediction API alongside the Streamlit apps
+
+Serves the same registry models and submission path as the apps. Single
+predictions from concurrent requests are coalesced into one vectorized
+predict_masks call per event-loop tick.
+
+    python api.py --model-version v4.0 --credentials service_account.json
+    python api.py --local-sheet   # submissions go to an in-memory LocalWorksheet
+    python api.py --sqlite submissions.db   # submissions go to a local SQLite backend
+
+    POST /predict        {"position": "QB", "year": "FR", "dev_trait": "Star",
+                          "xp_penalty": 0, "coaching_abilities": {"OC_TD2": true}}
+    POST /predict/batch  {"players": [{...}, ...], "coaching_abilities": {...}}
+    POST /submit         {...player fields, "team", "player_name", "snaps", "actual_points", "session"}
+    GET  /health
+
+A repeat /submit is dropped only within its "session"; submissions
+without one are always queued.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+
+import numpy as np
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from backends import SQLiteBackend
+from live_stats import LiveStats
+from model import COACHING_VARS, staff_mask
+from outliers import OutlierFilter
+from registry import load_model
+from retrain import OnlineTrainer
+from sheets import LocalWorksheet, SheetsConnection
+from storage import SubmissionStore, record_submission
+
+DEFAULT_MODEL_VERSION = "v4.0"
+
+# Micro-batching of single predictions
+MAX_BATCH = 1024
+MAX_WAIT = 0.001  # seconds the batcher waits for more requests after the first
+
+# Largest roster accepted by /predict/batch
+MAX_BATCH_PLAYERS = 10000
+
+# Input bounds, matching the Streamlit form
+MAX_XP_PENALTY = 100
+MAX_SNAPS = 2000
+MAX_ACTUAL_POINTS = 200
+
+
+def _number(data, name, upper, default=None):
+    """Numeric field in [0, upper]"""
+    value = data.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= upper:
+        raise ValueError(f"{name!r} must be a number between 0 and {upper}")
+    return value
+
+
+def parse_coaching(abilities):
+    """Validate a {ability: bool} dict and pack it into a coaching mask"""
+    if not isinstance(abilities, dict):
+        raise ValueError("'coaching_abilities' must be an object of ability flags")
+    unknown = set(abilities) - set(COACHING_VARS)
+    if unknown:
+        raise ValueError(f"Unknown coaching abilities {sorted(unknown)}, expected names from {COACHING_VARS}")
+    return staff_mask(abilities)
+
+
+def parse_player(model, data, default_mask=0):
+    """Integer-code one player object; returns (position, year, dev_trait, xp_penalty, mask)"""
+    if not isinstance(data, dict):
+        raise ValueError("Each player must be a JSON object")
+    codes = []
+    for name, index in (('position', model.position_index), ('year', model.year_index),
+                        ('dev_trait', model.dev_trait_index)):
+        value = data.get(name)
+        if value not in index:
+            raise ValueError(f"Unknown {name} {value!r}, expected one of {list(index)}")
+        codes.append(index[value])
+    xp_penalty = _number(data, 'xp_penalty', MAX_XP_PENALTY, default=0)
+    mask = parse_coaching(data['coaching_abilities']) if 'coaching_abilities' in data else default_mask
+    return (*codes, xp_penalty, mask)
+
+
+def score(model, parsed):
+    """Vectorized predictions for a list of parse_player results"""
+    positions, years, dev_traits, xp_penalty, masks = (np.array(column) for column in zip(*parsed))
+    players = {'position': positions, 'year': years, 'dev_trait': dev_traits, 'xp_penalty': xp_penalty}
+    return model.predict_masks(players, masks)
+
+
+class PredictionBatcher:
+    """Coalesces concurrent single predictions into vectorized model calls
+
+    The first queued request waits up to `max_wait` seconds for others to
+    arrive, then up to `max_batch` requests are scored together.
+    """
+
+    def __init__(self, model, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.requests = 0
+        self._queue = None
+        self._task = None
+
+    def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+    async def predict(self, parsed):
+        """Score one parsed player once its batch runs"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((parsed, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.max_wait)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                predictions = score(self.model, [parsed for parsed, _ in batch]).tolist()
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+            self.batches += 1
+            self.requests += len(batch)
+
+
+def _error(message, status_code=400):
+    return JSONResponse({'error': message}, status_code=status_code)
+
+
+async def _json_body(request):
+    try:
+        return await request.json()
+    except ValueError:
+        raise ValueError("Request body must be valid JSON")
+
+
+def create_app(model, store, trainer=None, live_stats=None, outliers=None, max_batch=MAX_BATCH, max_wait=MAX_WAIT):
+    """Build the API around a model and a SubmissionStore
+
+    Pass a store over sheets.LocalWorksheet to run entirely locally.
+    """
+    batcher = PredictionBatcher(model, max_batch=max_batch, max_wait=max_wait)
+
+    async def health(request):
+        return JSONResponse({
+            'status': 'ok',
+            'model_version': model.version,
+            'batches': batcher.batches,
+            'batched_requests': batcher.requests
+        })
+
+    async def predict(request):
+        try:
+            parsed = parse_player(model, await _json_body(request))
+        except ValueError as e:
+            return _error(str(e))
+        prediction = await batcher.predict(parsed)
+        return JSONResponse({'prediction': prediction, 'model_version': model.version})
+
+    async def predict_batch(request):
+        try:
+            data = await _json_body(request)
+            players = data.get('players') if isinstance(data, dict) else None
+            if not isinstance(players, list) or not 0 < len(players) <= MAX_BATCH_PLAYERS:
+                raise ValueError(f"'players' must be a list of 1 to {MAX_BATCH_PLAYERS} objects")
+            default_mask = parse_coaching(data.get('coaching_abilities', {}))
+            parsed = [parse_player(model, player, default_mask) for player in players]
+        except ValueError as e:
+            return _error(str(e))
+        return JSONResponse({'predictions': score(model, parsed).tolist(), 'model_version': model.version})
+
+    async def submit(request):
+        try:
+            data = await _json_body(request)
+            parsed = parse_player(model, data)
+            actual_points = _number(data, 'actual_points', MAX_ACTUAL_POINTS)
+            snaps = _number(data, 'snaps', MAX_SNAPS, default=0)
+        except ValueError as e:
+            return _error(str(e))
+
+        prediction = await batcher.predict(parsed)
+        mask = parsed[-1]
+        prediction_data = {
+            'team': str(data.get('team', '')),
+            'player_name': str(data.get('player_name', '')),
+            'snaps': snaps,
+            'position': data['position'],
+            'year': data['year'],
+            'dev_trait': data['dev_trait'],
+            'xp_penalty': parsed[3],
+            'prediction': prediction,
+            **{var: (mask >> bit) & 1 for bit, var in enumerate(COACHING_VARS)}
+        }
+        # The spool commit is a blocking fsync, so keep it off the event loop
+        queued = await run_in_threadpool(record_submission, store, prediction_data, actual_points,
+                                         trainer=trainer, live_stats=live_stats, scope=str(data.get('session', '')),
+                                         outliers=outliers)
+        return JSONResponse({'queued': queued, 'duplicate': not queued, 'prediction': prediction,
+                             'prediction_error': abs(actual_points - prediction)},
+                            status_code=202 if queued else 200)
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        batcher.start()
+        yield
+        await batcher.stop()
+
+    app = Starlette(routes=[
+        Route('/health', health),
+        Route('/predict', predict, methods=['POST']),
+        Route('/predict/batch', predict_batch, methods=['POST']),
+        Route('/submit', submit, methods=['POST'])
+    ], lifespan=lifespan)
+    app.state.batcher = batcher
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve skill point predictions over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model-version', default=DEFAULT_MODEL_VERSION)
+    parser.add_argument('--spool', default='api_spool.db', help="SQLite spool for submissions (not shared with the apps)")
+    parser.add_argument('--dedupe', default='api_submission_keys.db', help="SQLite index of submission keys, to drop repeats")
+    sheet = parser.add_mutually_exclusive_group(required=True)
+    sheet.add_argument('--credentials', help="Service account JSON key file")
+    sheet.add_argument('--local-sheet', action='store_true', help="Write submissions to an in-memory stand-in")
+    sheet.add_argument('--sqlite', metavar='PATH', help="Write submissions to a local SQLite backend")
+    parser.add_argument('--retrain-state', help="OnlineTrainer state file to feed submissions into")
+    parser.add_argument('--live-stats', help="LiveStats file to feed submissions into")
+    parser.add_argument('--outliers', help="OutlierFilter database; quarantined outliers skip retraining and live stats")
+    args = parser.parse_args()
+
+    import uvicorn
+
+    model = load_model(args.model_version)
+    if args.local_sheet:
+        sheet = LocalWorksheet()
+    elif args.sqlite:
+        sheet = SQLiteBackend(args.sqlite)
+    else:
+        with open(args.credentials) as f:
+            info = json.load(f)
+        sheet = SheetsConnection(lambda: info)
+
+    store = SubmissionStore(args.spool, lambda: sheet, dedupe_path=args.dedupe)
+    trainer = OnlineTrainer(args.retrain_state, model) if args.retrain_state else None
+    live_stats = LiveStats(args.live_stats) if args.live_stats else None
+    outliers = OutlierFilter(args.outliers) if args.outliers else None
+    app = create_app(model, store, trainer=trainer, live_stats=live_stats, outliers=outliers)
+    print(f"Serving model {model.version} on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning', access_log=False)
+
+
+if __name__ == '__main__':
+    main()
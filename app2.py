@@ -1,8 +1,13 @@
+import os
+import uuid
+
 import streamlit as st
-import pandas as pd
-from datetime import datetime
-import gspread
-from google.oauth2.service_account import Credentials
+
+from features import COACHING_INTERACTIONS
+from metrics import metrics
+from optimizer import family_abilities, optimize_staff
+from registry import load_model
+from services import AppServices
 
 # Page config
 st.set_page_config(
@@ -11,77 +16,39 @@ st.set_page_config(
     layout="centered"
 )
 
-# Google Sheets setup
-SHEET_ID = "1ANYMLAgjc1nwXYCdm2nbegrgPtUfUGh1aR_nhLxcMK8"
-SCOPES = [
-    'https://www.googleapis.com/auth/spreadsheets',
-    'https://www.googleapis.com/auth/drive'
-]
+# Published model for this app (Dummy_Model_Clean, 506 players, outliers removed), see models/v2.3.json
+MODEL_VERSION = "v2.3"
+MODEL = load_model(MODEL_VERSION)
+coefficients, position_coeffs, year_coeffs, dev_trait_coeffs = MODEL.coefficient_dicts()
 
-# Initialize Google Sheets connection using Streamlit secrets
-@st.cache_resource
-def get_gsheet_connection():
-    """Connect to Google Sheets using secrets"""
-    try:
-        # Load credentials from Streamlit secrets
-        creds = Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=SCOPES
-        )
-        client = gspread.authorize(creds)
-        sheet = client.open_by_key(SHEET_ID).sheet1
-        return sheet
-    except Exception as e:
-        st.error(f"Error connecting to Google Sheets: {e}")
-        return None
+# Local write-behind spool for submissions
+SPOOL_BATCH_SIZE = 50
+SPOOL_MAX_LATENCY = 10.0  # seconds a submission may wait before a flush
 
-# Coefficients from Dummy_Model_Clean (506 players, outliers removed)
-coefficients = {
-    'Intercept': 83.40709,
-    'HC_Moti.1': 0.35494,
-    'HC_Moti.2': 2.03755,
-    'OC_Moti.1': 0.62476,
-    'DC_Moti.1': 3.16875,
-    'HC_TD1': 9.49064,
-    'HC_TD2': 2.77841,
-    'HC_TD3': -0.33346,
-    'OC_TD1': 3.08600,
-    'OC_TD2': 1.82702,
-    'OC_TD3': 2.45405,
-    'DC_TD1': -1.44690,
-    'DC_TD2': 14.21596,
-    'DC_TD3': 13.07231,
-    'XP_Penalty': -0.42761
-}
+# Online retraining from submitted results
+# Interaction terms fit on top of the additive model, see features.py
+RETRAIN_INTERACTIONS = COACHING_INTERACTIONS
+# The layout differs from the additive retrain_state_v2.3.npz, so the state is rebuilt from the replica
+TRAINER_STATE_PATH = f"retrain_state_{MODEL_VERSION}-ix.npz"
+RETRAIN_MIN_ROWS = 100
+SERVE_RETRAINED_MODEL = False  # hot-swap to the latest refit instead of the published fit
 
-# Development Trait coefficients (baseline is Elite)
-dev_trait_coeffs = {
-    'Elite': 0,
-    'Impact': -38.18651,
-    'Normal': -50.53085,
-    'Star': -23.53652
-}
+# Live accuracy statistics from submitted results
+LIVE_STATS_MIN_N = 30  # live numbers replace the fit-time ones from this many submissions
 
-# DevT to number mapping for database
-dev_trait_num = {
-    'Elite': 4,
-    'Star': 3,
-    'Impact': 2,
-    'Normal': 1
-}
+# Ingest-time outlier screen: outliers are quarantined instead of reaching retraining and live stats
+OUTLIER_THRESHOLD = 3.5  # robust z-score (median/MAD per DevT and position)
 
-# Position coefficients (baseline is QB)
-position_coeffs = {
-    'QB': 0, 'RB': -4.687237, 'WR': -0.3681322, 'TE': -6.699325,
-    'OL': 3.123435, 'DL': -6.514467, 'DT': -3.839926, 'LB': -10.68404,
-    'S': -2.186808, 'CB': 0.5434067, 'K': 0.2088728, 'P': 0.8526459
-}
+# Per-prediction intervals from stored submission residuals
+PLAYER_SUGGESTIONS = 5  # previously submitted players offered for prefill
+INTERVAL_METHOD = "conformal"  # bootstrap tables can be prebuilt with intervals.py
 
-# Year coefficients (baseline is FR)
-year_coeffs = {
-    'FR': 0, 'FR (RS)': -2.86779, 'SO': -3.145401, 'SO (RS)': -5.05219,
-    'JR': -4.748136, 'JR (RS)': -2.66559, 'SR': 0.08653364
-}
+# Metrics export: "prometheus" (GET /metrics on METRICS_PORT), "file" (rotating metrics_{MODEL_VERSION}.jsonl) or unset to disable
+METRICS_EXPORT = os.environ.get("METRICS_EXPORT")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 9465))  # each app has its own default, so both can run
+
+# Where submissions are stored: "sheets" (the Google Sheet), "sqlite:PATH" (a local file) or "local" (in memory)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sheets")
 
 # Variable labels
 variable_labels = {
@@ -100,130 +67,132 @@ variable_labels = {
     'DC_TD3': 'DC Talent Developer Tier 3'
 }
 
-# Model performance statistics
-MODEL_STATS = {
-    'r_squared': 0.9322,
-    'adj_r_squared': 0.9273,
-    'mae': 4.39,
-    'rmse': 5.65,
-    'n': 506
-}
-
-# DevT-specific accuracy data
-DEVT_ACCURACY = {
-    'Elite': {
-        'n': 11, 'mae': 8.62,
-        'ranges': [
-            {'range': 5, 'percentage': 27.3},
-            {'range': 10, 'percentage': 63.6},
-            {'range': 15, 'percentage': 90.9}
-        ]
-    },
-    'Impact': {
-        'n': 250, 'mae': 4.05,
-        'ranges': [
-            {'range': 5, 'percentage': 68.8},
-            {'range': 10, 'percentage': 94.8},
-            {'range': 15, 'percentage': 99.2}
-        ]
-    },
-    'Normal': {
-        'n': 116, 'mae': 5.5,
-        'ranges': [
-            {'range': 5, 'percentage': 51.7},
-            {'range': 10, 'percentage': 82.8},
-            {'range': 15, 'percentage': 99.1}
-        ]
-    },
-    'Star': {
-        'n': 129, 'mae': 5.39,
-        'ranges': [
-            {'range': 5, 'percentage': 48.1},
-            {'range': 10, 'percentage': 86.8},
-            {'range': 15, 'percentage': 97.7}
-        ]
-    }
-}
+@st.cache_resource
+def get_services():
+    """Storage, retraining, accuracy and lookup services for this app's model, created once per process"""
+    # The Sheets backend re-reads secrets on every reconnect, so a failed first connect is never cached
+    return AppServices(
+        MODEL_VERSION,
+        load_info=lambda: dict(st.secrets["gcp_service_account"]),
+        storage_backend=STORAGE_BACKEND,
+        spool_batch_size=SPOOL_BATCH_SIZE,
+        spool_max_latency=SPOOL_MAX_LATENCY,
+        trainer_state_path=TRAINER_STATE_PATH,
+        retrain_interactions=RETRAIN_INTERACTIONS,
+        retrain_min_rows=RETRAIN_MIN_ROWS,
+        serve_retrained=SERVE_RETRAINED_MODEL,
+        live_stats_min_n=LIVE_STATS_MIN_N,
+        outlier_threshold=OUTLIER_THRESHOLD,
+        interval_method=INTERVAL_METHOD,
+        metrics_export=METRICS_EXPORT,
+        metrics_port=METRICS_PORT
+    )
 
 # Database functions
+def get_session_key():
+    """Random per-session id, so repeats are only dropped within one session"""
+    if 'session_key' not in st.session_state:
+        st.session_state.session_key = uuid.uuid4().hex
+    return st.session_state.session_key
+
 def save_complete_data(prediction_data, actual_points):
-    """Save complete data (prediction + actual) to Google Sheets"""
+    """Queue complete data (prediction + actual) for the storage backend
+
+    Returns True once queued, None if this session already submitted the same data, False on error.
+    """
     try:
-        sheet = get_gsheet_connection()
-        if sheet is None:
-            return False
-        
-        row = [
-            prediction_data['team'],
-            prediction_data['player_name'],
-            actual_points,
-            prediction_data['position'],
-            prediction_data['year'],
-            prediction_data['dev_trait'],
-            dev_trait_num[prediction_data['dev_trait']],
-            prediction_data['snaps'],
-            prediction_data['HC_Moti.1'],
-            prediction_data['HC_Moti.2'],
-            prediction_data['OC_Moti.1'],
-            prediction_data['DC_Moti.1'],
-            prediction_data['HC_TD1'],
-            prediction_data['HC_TD2'],
-            prediction_data['HC_TD3'],
-            prediction_data['OC_TD1'],
-            prediction_data['OC_TD2'],
-            prediction_data['OC_TD3'],
-            prediction_data['DC_TD1'],
-            prediction_data['DC_TD2'],
-            prediction_data['DC_TD3'],
-            prediction_data['xp_penalty']
-        ]
-        
-        sheet.append_row(row)
+        if not get_services().save(prediction_data, actual_points, scope=get_session_key()):
+            return None
         return True
     except Exception as e:
+        metrics.incr('submission_failures')
         st.error(f"Error saving to database: {e}")
         return False
 
+def get_model():
+    """Model used for predictions"""
+    return get_services().model()
+
+@metrics.timed('predict')
 def calculate_prediction(position, year, dev_trait, xp_penalty, coaching_abilities):
     """Calculate skill points prediction"""
-    prediction = coefficients['Intercept']
-    prediction += position_coeffs[position]
-    prediction += year_coeffs[year]
-    prediction += dev_trait_coeffs[dev_trait]
-    prediction += coefficients['XP_Penalty'] * xp_penalty
-    
-    for var, value in coaching_abilities.items():
-        if value:
-            prediction += coefficients[var]
-    
-    return prediction
+    return get_model().predict(position, year, dev_trait, xp_penalty, coaching_abilities)
 
-def show_predictor():
-    """Show the skill points predictor tab"""
-    st.title("🏈 NCAA 26 Skill Points Predictor")
-    st.caption(f"v2.3 | Clean Model (R² = {MODEL_STATS['r_squared']:.4f}, MAE = {MODEL_STATS['mae']:.2f})")
-    
-    st.markdown("---")
-    
+@metrics.timed('predict_batch')
+def calculate_predictions(players, coaching_abilities):
+    """Calculate skill points predictions for a whole roster"""
+    return get_model().predict_batch(players, coaching_abilities)
+
+def prefill_player(team, player_name):
+    """Fill the player inputs from the player's latest submission (a button callback)"""
+    last_known = get_services().player_index.last_known(team, player_name)
+    st.session_state.team_name = team
+    st.session_state.player_name = player_name
+    if last_known is None:
+        return
+    for field, options in (('position', position_coeffs), ('year', year_coeffs), ('dev_trait', dev_trait_coeffs)):
+        if last_known[field] in options:
+            st.session_state[field] = last_known[field]
+    st.session_state.xp_penalty = min(100, max(0, int(last_known['xp_penalty'])))
+    st.session_state.snaps = min(2000, max(0, int(last_known['snaps'])))
+
+def show_player_suggestions(team_name, player_name):
+    """Previously submitted players matching the typed name, and the season history of an exact match"""
+    if not player_name.strip():
+        return
+    index = get_services().player_index
+    index.refresh()
+    matches = index.complete_player(player_name, team=team_name or None, limit=PLAYER_SUGGESTIONS)
+    if not matches:
+        return
+    
+    st.caption("Previously submitted players - click to fill in their latest details")
+    cols = st.columns(len(matches))
+    for i, (team, name) in enumerate(matches):
+        with cols[i]:
+            st.button(f"{name} ({team})", key=f"prefill_{i}", on_click=prefill_player, args=(team, name))
+    
+    history = index.history(team_name, player_name, get_model())
+    if history:
+        with st.expander(f"📈 Season history ({len(history)} submitted)"):
+            st.dataframe([
+                {
+                    'Season': entry['season'],
+                    'Year': entry['year'],
+                    'DevT': entry['dev_trait'],
+                    'Predicted': None if entry['predicted'] is None else round(entry['predicted'], 1),
+                    'Actual': entry['actual']
+                }
+                for entry in history
+            ], hide_index=True)
+
+@st.fragment
+@metrics.timed('predictor_rerun')
+def predictor_form():
+    """Player inputs with a live prediction; changing an input reruns only this fragment"""
     st.subheader("Player Information")
     
     col1, col2 = st.columns(2)
     with col1:
-        team_name = st.text_input("Team", placeholder="e.g., Auburn")
+        team_name = st.text_input("Team", placeholder="e.g., Auburn", key="team_name")
     with col2:
-        player_name = st.text_input("Player Name", placeholder="e.g., John Smith")
+        player_name = st.text_input("Player Name", placeholder="e.g., John Smith", key="player_name")
+    
+    show_player_suggestions(team_name, player_name)
     
     col1, col2 = st.columns(2)
     
     with col1:
-        position = st.selectbox("Position", list(position_coeffs.keys()), index=0)
-        year = st.selectbox("Year", list(year_coeffs.keys()), index=0)
+        position = st.selectbox("Position", list(position_coeffs.keys()), index=0, key="position")
+        year = st.selectbox("Year", list(year_coeffs.keys()), index=0, key="year")
     
     with col2:
-        dev_trait = st.selectbox("Development Trait", list(dev_trait_coeffs.keys()), index=2)
-        xp_penalty = st.number_input("XP Penalty Slider", min_value=0, max_value=100, value=0, step=1)
+        # Default to the third DevT through session state, since prefill_player also sets it there
+        st.session_state.setdefault("dev_trait", list(dev_trait_coeffs.keys())[2])
+        dev_trait = st.selectbox("Development Trait", list(dev_trait_coeffs.keys()), key="dev_trait")
+        xp_penalty = st.number_input("XP Penalty Slider", min_value=0, max_value=100, step=1, key="xp_penalty")
     
-    snaps = st.number_input("Snaps Played", min_value=0, max_value=2000, value=0, step=1)
+    snaps = st.number_input("Snaps Played", min_value=0, max_value=2000, step=1, key="snaps")
     
     st.markdown("---")
     st.subheader("Coach Abilities")
@@ -245,83 +214,132 @@ def show_predictor():
     
     st.markdown("---")
     
-    if st.button("🎯 Predict Skill Points", type="primary", use_container_width=True):
-        prediction = calculate_prediction(position, year, dev_trait, xp_penalty, coaching_abilities)
-        
-        st.session_state.last_prediction = prediction
-        st.session_state.last_dev_trait = dev_trait
-        st.session_state.last_inputs = {
-            'team': team_name,
-            'player_name': player_name,
-            'snaps': snaps,
-            'position': position,
-            'year': year,
-            'dev_trait': dev_trait,
-            'xp_penalty': xp_penalty,
-            'HC_Moti.1': 1 if coaching_abilities['HC_Moti.1'] else 0,
-            'HC_Moti.2': 1 if coaching_abilities['HC_Moti.2'] else 0,
-            'OC_Moti.1': 1 if coaching_abilities['OC_Moti.1'] else 0,
-            'DC_Moti.1': 1 if coaching_abilities['DC_Moti.1'] else 0,
-            'HC_TD1': 1 if coaching_abilities['HC_TD1'] else 0,
-            'HC_TD2': 1 if coaching_abilities['HC_TD2'] else 0,
-            'HC_TD3': 1 if coaching_abilities['HC_TD3'] else 0,
-            'OC_TD1': 1 if coaching_abilities['OC_TD1'] else 0,
-            'OC_TD2': 1 if coaching_abilities['OC_TD2'] else 0,
-            'OC_TD3': 1 if coaching_abilities['OC_TD3'] else 0,
-            'DC_TD1': 1 if coaching_abilities['DC_TD1'] else 0,
-            'DC_TD2': 1 if coaching_abilities['DC_TD2'] else 0,
-            'DC_TD3': 1 if coaching_abilities['DC_TD3'] else 0
-        }
+    prediction = calculate_prediction(position, year, dev_trait, xp_penalty, coaching_abilities)
+    
+    st.session_state.last_prediction = prediction
+    st.session_state.last_dev_trait = dev_trait
+    st.session_state.last_inputs = {
+        'team': team_name,
+        'player_name': player_name,
+        'snaps': snaps,
+        'position': position,
+        'year': year,
+        'dev_trait': dev_trait,
+        'xp_penalty': xp_penalty,
+        'prediction': prediction,
+        'HC_Moti.1': 1 if coaching_abilities['HC_Moti.1'] else 0,
+        'HC_Moti.2': 1 if coaching_abilities['HC_Moti.2'] else 0,
+        'OC_Moti.1': 1 if coaching_abilities['OC_Moti.1'] else 0,
+        'DC_Moti.1': 1 if coaching_abilities['DC_Moti.1'] else 0,
+        'HC_TD1': 1 if coaching_abilities['HC_TD1'] else 0,
+        'HC_TD2': 1 if coaching_abilities['HC_TD2'] else 0,
+        'HC_TD3': 1 if coaching_abilities['HC_TD3'] else 0,
+        'OC_TD1': 1 if coaching_abilities['OC_TD1'] else 0,
+        'OC_TD2': 1 if coaching_abilities['OC_TD2'] else 0,
+        'OC_TD3': 1 if coaching_abilities['OC_TD3'] else 0,
+        'DC_TD1': 1 if coaching_abilities['DC_TD1'] else 0,
+        'DC_TD2': 1 if coaching_abilities['DC_TD2'] else 0,
+        'DC_TD3': 1 if coaching_abilities['DC_TD3'] else 0
+    }
     
-    if 'last_prediction' in st.session_state:
-        prediction = st.session_state.last_prediction
-        dev_trait = st.session_state.last_dev_trait
-        
-        st.success(f"### Predicted: {prediction:.1f} skill points")
-        
-        devt_stats = DEVT_ACCURACY[dev_trait]
-        
-        st.info(f"""
-        **Accuracy for {dev_trait} players** (based on {devt_stats['n']} players)  
-        Typical error: ±{devt_stats['mae']:.1f} points
-        """)
-        
+    show_result()
+
+@st.fragment
+def show_result():
+    """Result panel for the latest prediction"""
+    prediction = st.session_state.last_prediction
+    dev_trait = st.session_state.last_dev_trait
+    
+    st.success(f"### Predicted: {prediction:.1f} skill points")
+    
+    devt_stats = get_services().devt_accuracy()[dev_trait]
+    
+    st.info(f"""
+    **Accuracy for {dev_trait} players** (based on {devt_stats['n']} players)  
+    Typical error: ±{devt_stats['mae']:.1f} points
+    """)
+    
+    interval_table = get_services().interval_table()
+    
+    if interval_table is not None:
+        for coverage, lower_offset, upper_offset in interval_table.lookup(dev_trait, st.session_state.last_inputs['position']):
+            lower = max(0, prediction + lower_offset)
+            upper = prediction + upper_offset
+            st.write(f"{coverage:.0%} interval: **{lower:.1f} - {upper:.1f}**")
+    else:
         for acc in devt_stats['ranges']:
             range_val = acc['range']
             pct = acc['percentage']
             lower = max(0, prediction - range_val)
             upper = prediction + range_val
             st.write(f"±{int(range_val)} points ({pct:.1f}% of the time): **{lower:.1f} - {upper:.1f}**")
+    
+    st.markdown("---")
+    
+    submission_form()
+
+@st.fragment
+@metrics.timed('submission_rerun')
+def submission_form():
+    """Actual results form; typing or submitting reruns only this fragment"""
+    prediction = st.session_state.last_prediction
+    
+    with st.expander("📊 Help improve the model - Submit actual results"):
+        st.write("After checking your Training Results screen, come back and enter the actual skill points!")
         
-        st.markdown("---")
+        actual_points = st.number_input(
+            "Actual Skill Points from Training Results:",
+            min_value=0,
+            max_value=200,
+            value=int(prediction),
+            step=1,
+            key="actual_points_input"
+        )
         
-        with st.expander("📊 Help improve the model - Submit actual results"):
-            st.write("After checking your Training Results screen, come back and enter the actual skill points!")
-            
-            actual_points = st.number_input(
-                "Actual Skill Points from Training Results:",
-                min_value=0,
-                max_value=200,
-                value=int(prediction),
-                step=1,
-                key="actual_points_input"
-            )
+        if st.button("Submit Actual Results", key="submit_actual"):
+            error = abs(actual_points - prediction)
             
-            if st.button("Submit Actual Results", key="submit_actual"):
-                error = abs(actual_points - prediction)
-                
-                if save_complete_data(st.session_state.last_inputs, actual_points):
-                    st.success(f"✅ Thank you! Data saved to database. Prediction error was {error:.1f} points")
-                    st.balloons()
-                else:
-                    st.error("Could not save to database")
+            saved = save_complete_data(st.session_state.last_inputs, actual_points)
+            if saved:
+                st.success(f"✅ Thank you! Data saved to database. Prediction error was {error:.1f} points")
+                st.balloons()
+            elif saved is None:
+                st.info("These results were already submitted, so they were not saved again")
+            else:
+                st.error("Could not save to database")
+
+def show_predictor():
+    """Show the skill points predictor tab"""
+    st.title("🏈 NCAA 26 Skill Points Predictor")
+    model_stats = get_services().model_stats()
+    st.caption(f"v2.3 | Clean Model (R² = {model_stats['r_squared']:.4f}, MAE = {model_stats['mae']:.2f})")
     
     st.markdown("---")
-    st.caption("59% of predictions within ±5 points | 89% within ±10 points")
+    
+    predictor_form()
+    
+    st.markdown("---")
+    hit_rates = get_services().live_stats.hit_rates([5, 10])
+    if hit_rates:
+        st.caption(f"{hit_rates[0]:.0f}% of predictions within ±5 points | {hit_rates[1]:.0f}% within ±10 points")
+    else:
+        st.caption("59% of predictions within ±5 points | 89% within ±10 points")
     st.caption("Created by Alex Swanner | [LinkedIn](https://linkedin.com/in/alexswanner/)")
 
 def show_coaching_guide():
     """Show the coaching guide tab"""
+    show_guide_overview()
+    
+    show_staff_optimizer()
+    
+    st.markdown("---")
+    
+    show_development_factors()
+
+# Static guide sections are cached so their elements replay without re-running the markdown code
+@st.cache_data
+def show_guide_overview():
+    """Rankings, insights and tips at the top of the coaching guide"""
     st.title("📋 Best Coaching Abilities for Player Development")
     st.caption("Based on 506 players analyzed")
     
@@ -374,7 +392,10 @@ def show_coaching_guide():
     """)
     
     st.markdown("---")
-    
+
+@st.cache_data
+def show_development_factors():
+    """Player development factors at the bottom of the coaching guide"""
     # Player Development Factors
     st.subheader("📈 Player Development Factors")
     
@@ -421,6 +442,50 @@ def show_coaching_guide():
     st.markdown("---")
     st.caption("Created by Alex Swanner")
 
+@st.fragment
+@metrics.timed('optimizer_rerun')
+def show_staff_optimizer():
+    """Find the best coaching abilities for an uploaded roster; reruns only this fragment"""
+    st.subheader("🧮 Staff Optimizer")
+    st.markdown("Upload your roster as a CSV with `position`, `year`, `dev_trait` and `xp_penalty` columns to find the coaching abilities that maximize its total predicted skill points.")
+    
+    roster_file = st.file_uploader("Roster CSV", type="csv", key="optimizer_roster")
+    
+    family_options = ["Any", "Talent Developer", "Motivator"]
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        hc_abilities = st.number_input("HC abilities unlocked", min_value=0, max_value=5, value=5, step=1)
+    with col2:
+        oc_family = st.selectbox("OC ability type", family_options)
+    with col3:
+        dc_family = st.selectbox("DC ability type", family_options)
+    
+    if roster_file is None:
+        return
+    
+    constraints = {'HC': {'max_abilities': hc_abilities}}
+    for coach, family in (('OC', oc_family), ('DC', dc_family)):
+        if family != "Any":
+            constraints[coach] = {'allowed': family_abilities(coach, family)}
+    
+    try:
+        import pandas as pd
+        roster = pd.read_csv(roster_file)
+        results = optimize_staff(get_model(), roster, constraints, top_k=5)
+    except (KeyError, ValueError) as e:
+        st.error(f"Could not score roster: {e}")
+        return
+    
+    st.dataframe([
+        {
+            'Abilities': ", ".join(variable_labels[var] for var in result['abilities']) or "None",
+            'Total skill points': round(result['total'], 1),
+            'Gain': round(result['gain'], 1)
+        }
+        for result in results
+    ], hide_index=True)
+
+@metrics.timed('script_run')
 def main():
     # Create tabs
     tab1, tab2 = st.tabs(["🎯 Predict Skill Points", "📋 Coaching Guide"])
@@ -432,4 +497,6 @@ def main():
         show_coaching_guide()
 
 if __name__ == "__main__":
+    get_services().start_metrics()
+    get_services().start_replica_sync()
     main()
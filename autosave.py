@@ -0,0 +1,55 @@
+"""Coalesced saving of state kept in memory
+
+The online retrainer and the live accuracy stats change with every
+submission, but rewriting their files each time puts a full-state write
+on the request path. Autosave batches those writes: a save happens after
+`every` changes, or `interval` seconds after the first unsaved change
+(on a timer thread), and once more when the process exits.
+"""
+import atexit
+import threading
+
+
+class Autosave:
+    """Calls `save()` for batches of changes instead of for each one
+
+    `save` must do its own locking; changed() and flush() are called
+    without the owner's lock held.
+    """
+
+    def __init__(self, save, every=50, interval=30.0):
+        self.save = save
+        self.every = every
+        self.interval = interval
+        self.pending = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def changed(self, count=1):
+        """Record `count` unsaved changes, saving now if enough have built up"""
+        with self._lock:
+            self.pending += count
+            if self.pending < self.every:
+                if self._timer is None:
+                    self._timer = threading.Timer(self.interval, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def flush(self):
+        """Save now if anything is unsaved"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self.pending:
+                return
+            self.pending = 0
+        self.save()
+
+    def saved(self):
+        """Note that the owner just saved everything itself"""
+        with self._lock:
+            self.pending = 0
@@ -0,0 +1,225 @@
+"""Storage backends for submitted rows
+
+A backend is where the spool worker flushes its batches: it takes rows in
+SUBMISSION_COLUMNS order through append_rows() and streams them back out
+with iter_rows(). Two are provided:
+
+- SheetsBackend: the Google Sheet (or any worksheet stand-in)
+- SQLiteBackend: a local WAL-mode SQLite file, for offline development,
+  tests and high-volume deployments
+
+Both stream a bulk export to CSV or Parquet in fixed-size chunks, so the
+table is never held in memory as a whole.
+
+    python backends.py sqlite:submissions.db export.parquet
+    python backends.py sheets export.csv --credentials service_account.json
+"""
+import abc
+import argparse
+import csv
+import json
+import sqlite3
+import threading
+
+from metrics import metrics
+from replica import INTEGER_COLUMNS, _parse_row, _quote
+from sheets import LAST_COLUMN, SUBMISSION_COLUMNS, LocalWorksheet, SheetsConnection, _row_span
+
+# Rows per chunk when streaming rows out of a backend
+EXPORT_CHUNK_ROWS = 5000
+
+# Parquet types of the submission columns
+PARQUET_TYPES = {name: 'int64' if name in INTEGER_COLUMNS else 'string' for name in SUBMISSION_COLUMNS}
+
+
+class StorageBackend(abc.ABC):
+    """Interface shared by the submission backends"""
+
+    @abc.abstractmethod
+    def append_rows(self, values, **kwargs):
+        """Store a batch of rows in SUBMISSION_COLUMNS order"""
+
+    @abc.abstractmethod
+    def iter_chunks(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Yield stored rows as lists of typed values, `chunk_rows` at a time"""
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def iter_rows(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Yield stored rows one at a time"""
+        for chunk in self.iter_chunks(chunk_rows):
+            yield from chunk
+
+    def export_csv(self, path, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Stream every row to a CSV file with a header; returns the number of rows written"""
+        written = 0
+        with metrics.span('export_csv'), open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(SUBMISSION_COLUMNS)
+            for chunk in self.iter_chunks(chunk_rows):
+                writer.writerows(chunk)
+                written += len(chunk)
+        return written
+
+    def export_parquet(self, path, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Stream every row to a Parquet file, one row group per chunk; returns the number of rows written"""
+        # Imported here to keep it off the app's startup path
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([(name, PARQUET_TYPES[name]) for name in SUBMISSION_COLUMNS])
+        written = 0
+        with metrics.span('export_parquet'), pq.ParquetWriter(path, schema) as writer:
+            for chunk in self.iter_chunks(chunk_rows):
+                columns = [list(column) for column in zip(*chunk)]
+                writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+                written += len(chunk)
+        return written
+
+    def export(self, path, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Export to CSV or Parquet, chosen by the file extension"""
+        if path.endswith('.parquet'):
+            return self.export_parquet(path, chunk_rows)
+        return self.export_csv(path, chunk_rows)
+
+
+class SheetsBackend(StorageBackend):
+    """Backend over the submissions worksheet
+
+    `sheet` is anything with the worksheet calls (a SheetsConnection,
+    gspread Worksheet or LocalWorksheet). Reads go out as ranged requests
+    of `chunk_rows` rows; header and blank rows are skipped.
+    """
+
+    def __init__(self, sheet):
+        self.sheet = sheet
+
+    def append_rows(self, values, **kwargs):
+        return self.sheet.append_rows(values, **kwargs)
+
+    def get(self, range_name, **kwargs):
+        return self.sheet.get(range_name, **kwargs)
+
+    def iter_chunks(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        first = 1
+        while True:
+            last = first + chunk_rows - 1
+            values = self.sheet.get(f'A{first}:{LAST_COLUMN}{last}', value_render_option='UNFORMATTED_VALUE')
+            if not values:
+                break
+            chunk = [row for row in map(_parse_row, values) if row is not None]
+            if chunk:
+                yield chunk
+            if len(values) < chunk_rows:
+                break
+            first = last + 1
+
+
+class SQLiteBackend(StorageBackend):
+    """Backend over a local SQLite file
+
+    The database runs in WAL mode, so exports and readers never block the
+    writer. Every batch goes in as one transaction through a single
+    prepared INSERT, and rows are numbered like sheet rows, so the backend
+    also answers the ranged get() calls SheetReplica.sync makes.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        columns = ', '.join(
+            f"{_quote(name)} {'INTEGER' if name in INTEGER_COLUMNS else 'TEXT'}"
+            for name in SUBMISSION_COLUMNS
+        )
+        with self._conn:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS submissions (row_id INTEGER PRIMARY KEY, {columns})')
+        names = ', '.join(_quote(name) for name in SUBMISSION_COLUMNS)
+        placeholders = ', '.join('?' * len(SUBMISSION_COLUMNS))
+        self._insert = f'INSERT INTO submissions ({names}) VALUES ({placeholders})'
+        self._names = names
+
+    def append_rows(self, values, **kwargs):
+        with self._lock, self._conn:
+            self._conn.executemany(self._insert, values)
+
+    def get(self, range_name, **kwargs):
+        """Rows in an A1 row range like 'A5:V104', as a worksheet would return them"""
+        first, last = _row_span(range_name)
+        with self._lock:
+            cur = self._conn.execute(f'SELECT {self._names} FROM submissions WHERE row_id BETWEEN ? AND ? ORDER BY row_id', (first, last))
+            return [list(row) for row in cur]
+
+    def get_all_values(self, **kwargs):
+        return [row for chunk in self.iter_chunks() for row in chunk]
+
+    def iter_chunks(self, chunk_rows=EXPORT_CHUNK_ROWS):
+        # Keyset pagination keeps each read short, so the lock is never held across a yield
+        last = 0
+        while True:
+            with self._lock:
+                cur = self._conn.execute(
+                    f'SELECT row_id, {self._names} FROM submissions WHERE row_id > ? ORDER BY row_id LIMIT ?',
+                    (last, chunk_rows)
+                )
+                rows = cur.fetchall()
+            if not rows:
+                break
+            last = rows[-1][0]
+            yield [list(row[1:]) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_backend(spec, load_info=None):
+    """Open the backend named by a config string
+
+    'sheets' connects to the Google Sheet with the service account info
+    returned by `load_info`; 'sqlite:PATH' opens a local SQLite file;
+    'local' or 'local:LATENCY' keeps rows in an in-memory LocalWorksheet
+    that delays every call by LATENCY seconds, for tests and load runs.
+    """
+    kind, _, path = spec.partition(':')
+    if kind == 'sheets':
+        if load_info is None:
+            raise ValueError("The sheets backend needs service account credentials")
+        return SheetsBackend(SheetsConnection(load_info))
+    if kind == 'sqlite':
+        if not path:
+            raise ValueError("The sqlite backend needs a path, e.g. 'sqlite:submissions.db'")
+        return SQLiteBackend(path)
+    if kind == 'local':
+        return SheetsBackend(LocalWorksheet(latency=float(path or 0.0)))
+    raise ValueError(f"Unknown storage backend {spec!r}; use 'sheets', 'sqlite:PATH' or 'local'")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream every stored submission to a CSV or Parquet file")
+    parser.add_argument('backend', help="'sheets' or 'sqlite:PATH'")
+    parser.add_argument('output', help="Output file; .parquet writes Parquet, anything else CSV")
+    parser.add_argument('--credentials', help="Service account JSON key file (sheets backend)")
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS)
+    args = parser.parse_args()
+
+    load_info = None
+    if args.credentials:
+        with open(args.credentials) as f:
+            info = json.load(f)
+        load_info = lambda: info
+
+    backend = open_backend(args.backend, load_info)
+    written = backend.export(args.output, chunk_rows=args.chunk_rows)
+    print(f"Exported {written} rows to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
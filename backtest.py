@@ -0,0 +1,254 @@
+"""Cross-validation and backtesting of model versions on stored submissions
+
+Every variant is scored on the same rows and the same folds, so the
+published coefficients of app.py (v4.0) and app2.py (v2.3) can be compared
+directly, against each other and against refits:
+
+    v4.0            the published model, scored as-is
+    refit:v4.0      v4.0's design refit on each training fold
+    refit:v2.3+ix   v2.3's design plus features.COACHING_INTERACTIONS
+
+Schemes:
+- kfold: rows shuffled with `seed` into k folds
+- season: the sheet has no season column, so submission order stands in
+  for time. The rows are cut into k contiguous blocks, and block i is
+  predicted from blocks 0..i-1 (expanding window; block 0 is never tested)
+
+Only rows whose position, year and DevT every variant knows are used.
+Fold x variant tasks run across a process pool. Workers memory-map the
+columnar dataset, so the rows are never pickled. Results are cached per
+variant under the data snapshot hash and the model hash.
+
+    python backtest.py submissions.cols
+    python backtest.py submissions_replica.db --scheme season --folds 5 --by position
+"""
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from columnar import ColumnarDataset, write_dataset
+from features import COACHING_INTERACTIONS
+from model import CompiledModel
+from registry import MODEL_DIR, available_versions, load_model
+from retrain import SufficientStats
+
+CACHE_DIR = 'backtest_cache'
+
+# Hit-rate ranges, as in the apps' accuracy panels
+HIT_RANGES = (5, 10, 15)
+
+SCHEMES = ('kfold', 'season')
+
+
+def parse_variant(spec):
+    """(kind, base version, interactions) for a variant name like 'refit:v2.3+ix'"""
+    kind, _, rest = spec.rpartition(':')
+    version, _, extra = rest.partition('+')
+    kind = kind or 'published'
+    if kind not in ('published', 'refit'):
+        raise ValueError(f"Unknown variant kind {kind!r} in {spec!r}; use VERSION or refit:VERSION[+ix]")
+    if extra not in ('', 'ix') or (extra and kind != 'refit'):
+        raise ValueError(f"Unknown variant suffix in {spec!r}; only refit variants take '+ix'")
+    return kind, version, list(COACHING_INTERACTIONS) if extra else []
+
+
+def model_hash(spec, model_dir=MODEL_DIR):
+    """Short hash of everything that determines a variant's predictions"""
+    kind, version, interactions = parse_variant(spec)
+    payload = json.dumps([kind, interactions, load_model(version, model_dir).to_artifact()], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:12]
+
+
+def snapshot_hash(dataset):
+    """Short hash of a columnar dataset's contents"""
+    h = hashlib.sha256()
+    for name in sorted(dataset.columns):
+        h.update(name.encode())
+        h.update(json.dumps(dataset.columns[name], sort_keys=True).encode())
+        h.update(np.ascontiguousarray(dataset[name]).tobytes())
+    return h.hexdigest()[:16]
+
+
+def open_dataset(path, cache_dir=CACHE_DIR):
+    """Open a columnar dataset, converting a SQLite replica into one first"""
+    if os.path.isdir(path):
+        return ColumnarDataset(path)
+    from replica import SheetReplica
+    converted = os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0] + '.cols')
+    os.makedirs(cache_dir, exist_ok=True)
+    replica = SheetReplica(path)
+    try:
+        write_dataset(converted, replica.iter_rows())
+    finally:
+        replica.close()
+    return ColumnarDataset(converted)
+
+
+def common_rows(dataset, variants, model_dir=MODEL_DIR):
+    """Indices of rows every variant's base model can score
+
+    Comparing v2.3 with v4.0 drops DT rows (v2.3 only) and SR (RS) rows
+    (v4.0 only).
+    """
+    known = np.ones(len(dataset), dtype=bool)
+    for version in {parse_variant(spec)[1] for spec in variants}:
+        known &= dataset.model_inputs(load_model(version, model_dir))[2]
+    return np.flatnonzero(known)
+
+
+def make_folds(rows, scheme, k, seed=0):
+    """[(train indices, test indices)] over the dataset rows in `rows`"""
+    if scheme == 'kfold':
+        shuffled = np.random.default_rng(seed).permutation(rows)
+        blocks = np.array_split(shuffled, k)
+        return [(np.sort(np.concatenate(blocks[:i] + blocks[i + 1:])), np.sort(blocks[i])) for i in range(k)]
+    if scheme == 'season':
+        # Dataset rows follow sheet order, so contiguous blocks are successive stretches of submissions
+        blocks = np.array_split(np.sort(rows), k)
+        return [(np.concatenate(blocks[:i]), blocks[i]) for i in range(1, k)]
+    raise ValueError(f"Unknown scheme {scheme!r}, expected one of {SCHEMES}")
+
+
+def _score_fold(task):
+    """Predict one fold's test rows with one variant (runs in a worker process)"""
+    dataset_path, spec, model_dir, train, test = task
+    kind, version, interactions = parse_variant(spec)
+    base = load_model(version, model_dir)
+    dataset = ColumnarDataset(dataset_path)
+    players, masks, known = dataset.model_inputs(base)
+    # model_inputs drops unknown rows; map dataset row numbers to positions in its output
+    position_of = np.cumsum(known) - 1
+
+    model = base
+    if kind == 'refit':
+        rows = position_of[train]
+        stats = SufficientStats(base.position_levels, base.year_levels, base.dev_trait_levels, interactions)
+        stats.update_batch(players['position'][rows], players['year'][rows], players['dev_trait'][rows],
+                           players['xp_penalty'][rows], masks[rows],
+                           np.asarray(dataset['actual_points'])[train].astype(np.float64))
+        model = CompiledModel.from_vector(
+            stats.full_vector(stats.solve()), base.position_levels, base.year_levels, base.dev_trait_levels,
+            interactions=interactions, floor=base.floor, version=spec
+        )
+
+    rows = position_of[test]
+    subset = {name: values[rows] for name, values in players.items()}
+    return model.predict_masks(subset, masks[rows])
+
+
+def accuracy(actual, predicted):
+    """MAE, RMSE and ±k hit rates (percent) of one group of predictions"""
+    residual = np.abs(actual - predicted)
+    if not len(residual):
+        return {'n': 0}
+    result = {
+        'n': int(len(residual)),
+        'mae': float(residual.mean()),
+        'rmse': float(np.sqrt((residual ** 2).mean()))
+    }
+    for points in HIT_RANGES:
+        result[f'within_{points}'] = float(100.0 * (residual <= points).mean())
+    return result
+
+
+def summarize(actual, predicted, dev_traits, positions):
+    """Overall, per-DevT and per-position accuracy"""
+    summary = {'overall': accuracy(actual, predicted)}
+    for name, groups in (('dev_trait', dev_traits), ('position', positions)):
+        summary[name] = {
+            str(level): accuracy(actual[groups == level], predicted[groups == level])
+            for level in np.unique(groups)
+        }
+    return summary
+
+
+def backtest(dataset_path, variants, scheme='kfold', k=5, seed=0, workers=None, model_dir=MODEL_DIR,
+             cache_dir=CACHE_DIR):
+    """Evaluate each variant on the same folds; returns {variant: summary}
+
+    A variant's summary is reused from `cache_dir` when one exists for the
+    same data snapshot, model hash, scheme, k and seed.
+    """
+    dataset = ColumnarDataset(dataset_path)
+    snapshot = snapshot_hash(dataset)
+    rows = common_rows(dataset, variants, model_dir)
+    folds = make_folds(rows, scheme, k, seed)
+    tested = np.concatenate([test for _, test in folds]) if folds else np.zeros(0, dtype=np.intp)
+
+    results = {}
+    pending = []
+    for spec in variants:
+        path = os.path.join(cache_dir, f'{snapshot}_{model_hash(spec, model_dir)}_{scheme}{k}_s{seed}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                results[spec] = json.load(f)
+        else:
+            pending.append((spec, path))
+
+    tasks = [(dataset_path, spec, model_dir, train, test) for spec, _ in pending for train, test in folds]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) <= 1:
+        predictions = [_score_fold(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            predictions = list(pool.map(_score_fold, tasks))
+
+    actual = np.asarray(dataset['actual_points'])[tested].astype(np.float64)
+    dev_traits = dataset.decode('dev_trait')[tested]
+    positions = dataset.decode('position')[tested]
+    os.makedirs(cache_dir, exist_ok=True)
+    for i, (spec, path) in enumerate(pending):
+        predicted = np.concatenate(predictions[i * len(folds):(i + 1) * len(folds)]) if folds else np.zeros(0)
+        summary = summarize(actual, predicted, dev_traits, positions)
+        summary.update(snapshot=snapshot, model_hash=model_hash(spec, model_dir), scheme=scheme, folds=k, seed=seed)
+        with open(path, 'w') as f:
+            json.dump(summary, f, indent=2)
+        results[spec] = summary
+    return {spec: results[spec] for spec in variants}
+
+
+def _row(label, stats):
+    if not stats['n']:
+        return f"  {label:<14}{0:>6}"
+    hits = ''.join(f"{stats[f'within_{points}']:>8.1f}%" for points in HIT_RANGES)
+    return f"  {label:<14}{stats['n']:>6}{stats['mae']:>8.2f}{stats['rmse']:>8.2f}{hits}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validate model versions on stored submissions")
+    parser.add_argument('data', help="Columnar dataset directory (columnar.py) or SQLite replica file")
+    parser.add_argument('--variants', nargs='+',
+                        help="VERSION, refit:VERSION or refit:VERSION+ix (default: every published version and its refit)")
+    parser.add_argument('--scheme', choices=SCHEMES, default='kfold')
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--by', choices=('dev_trait', 'position'), default='dev_trait', help="breakdown to print")
+    parser.add_argument('--cache-dir', default=CACHE_DIR)
+    parser.add_argument('--json', help="also write the full results to this file")
+    args = parser.parse_args()
+
+    variants = args.variants or [spec for version in available_versions() for spec in (version, f'refit:{version}')]
+    dataset = open_dataset(args.data, args.cache_dir)
+    results = backtest(dataset.path, variants, scheme=args.scheme, k=args.folds, seed=args.seed,
+                       workers=args.workers, cache_dir=args.cache_dir)
+
+    hits = ''.join(f"{f'±{points}':>9}" for points in HIT_RANGES)
+    print(f"{args.scheme} with {args.folds} folds, snapshot {next(iter(results.values()))['snapshot']}")
+    for spec, summary in results.items():
+        print(f"{spec}\n  {'':<14}{'n':>6}{'MAE':>8}{'RMSE':>8}{hits}")
+        print(_row('overall', summary['overall']))
+        for level, stats in summary[args.by].items():
+            print(_row(level, stats))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
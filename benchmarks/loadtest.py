@@ -0,0 +1,369 @@
+"""Concurrent-user load test for the Streamlit apps, many sessions on one server
+
+Starts each app with `streamlit run` and connects `--sessions` simulated
+browsers to that one server over its websocket (/_stcore/stream), the
+way the frontend does: each client sends rerun BackMsgs carrying its
+widget states and reads ForwardMsgs until the run finishes. All clients
+run together in one asyncio loop in this process, and each one replays
+the same interaction script with its own random inputs:
+
+    fill    type a team and player name
+    select  pick a position, year and DevT
+    toggle  switch a few coaching abilities on or off
+    predict change the XP penalty
+    submit  enter the actual points and press "Submit Actual Results"
+
+Each step is one rerun, timed from sending the BackMsg until the
+script_finished message arrives. A widget inside an st.fragment reruns
+only its fragment, as in the browser, and the report counts how many of
+each step's reruns were fragment reruns. Submissions go to an
+in-memory LocalWorksheet with injected latency (STORAGE_BACKEND=
+local:LATENCY) and all spool, dedupe and stats files go to a scratch
+directory.
+
+Reports, per app and so for one server instance:
+- rerun latency percentiles per step, pooled over all sessions, so they
+  include contention in the server's event loop, script threads, session
+  state and shared caches;
+- the server's resident memory before the sessions connect (after one
+  warm-up session has loaded the model and shared resources), with all
+  sessions rendered, and at the end, and the growth per session.
+
+The clients are cheap next to the server, but they share this process's
+CPU; run with --think to spread the load out. RSS is read from /proc, so
+the memory figures need Linux.
+
+    python benchmarks/loadtest.py                          # 20 sessions on each app
+    python benchmarks/loadtest.py --sessions 100 --apps app2.py --iterations 5
+    python benchmarks/loadtest.py --json loadtest.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from model import COACHING_VARS
+
+APPS = ('app.py', 'app2.py')
+STEPS = ('fill', 'select', 'toggle', 'predict', 'submit')
+PERCENTILES = (50, 90, 99)
+
+SHEET_LATENCY = 0.05  # seconds per simulated Sheets API call
+SCRIPT_TIMEOUT = 120
+SERVER_START_TIMEOUT = 60
+
+TEAMS = ('Ohio State', 'Auburn', 'Oregon', 'Georgia', 'Texas', 'Michigan', 'LSU', 'Alabama')
+
+
+class Session:
+    """One simulated browser tab connected to the server's websocket
+
+    Keeps the widgets of the last render (by user key) and the widget
+    values this user has set, and sends all of them with every rerun.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}   # user key -> (element type, element proto, fragment id)
+        self.states = {}    # widget id -> WidgetState
+        self.errors = []
+
+    @classmethod
+    async def connect(cls, port):
+        from websockets.asyncio.client import connect
+        ws = await connect(f'ws://127.0.0.1:{port}/_stcore/stream', subprotocols=['streamlit'], max_size=None)
+        return cls(ws)
+
+    async def close(self):
+        await self.ws.close()
+
+    async def rerun(self, fragment_id='', trigger=None):
+        """Send a rerun with the current widget states and wait for it to finish; returns the script_finished status"""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        msg = BackMsg()
+        msg.rerun_script.query_string = ''
+        msg.rerun_script.page_script_hash = ''
+        msg.rerun_script.fragment_id = fragment_id
+        msg.rerun_script.widget_states.widgets.extend(self.states.values())
+        if trigger is not None:
+            msg.rerun_script.widget_states.widgets.add(id=trigger, trigger_value=True)
+        await self.ws.send(msg.SerializeToString())
+
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self.ws.recv(), SCRIPT_TIMEOUT))
+            kind = forward.WhichOneof('type')
+            if kind == 'script_finished':
+                return forward.script_finished
+            if kind == 'delta' and forward.delta.WhichOneof('type') == 'new_element':
+                self._element(forward.delta.new_element, forward.delta.fragment_id)
+
+    def _element(self, element, fragment_id):
+        kind = element.WhichOneof('type')
+        proto = getattr(element, kind)
+        if kind == 'exception':
+            self.errors.append(f"{proto.type}: {proto.message}")
+        widget_id = getattr(proto, 'id', '')
+        if widget_id.startswith('$$ID-'):
+            self.widgets[widget_id.split('-', 2)[2]] = (kind, proto, fragment_id)
+
+    def _widget(self, key):
+        if key not in self.widgets:
+            raise KeyError(f"No widget with key {key!r} in the last render")
+        return self.widgets[key]
+
+    def set(self, key, **value):
+        """Set a widget's value, e.g. set('team_name', string_value='Auburn'); returns its fragment id"""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+        _, proto, fragment_id = self._widget(key)
+        self.states[proto.id] = WidgetState(id=proto.id, **value)
+        return fragment_id
+
+    def value(self, key, field, default):
+        """A widget's current value: the last one set, or its default"""
+        _, proto, _ = self._widget(key)
+        state = self.states.get(proto.id)
+        return getattr(state, field) if state is not None else default(proto)
+
+    def click(self, key):
+        """Fragment id and widget id for pressing a button"""
+        _, proto, fragment_id = self._widget(key)
+        return fragment_id, proto.id
+
+
+# Each step sets widget values and returns the rerun's (fragment_id, button to trigger)
+
+def step_fill(session, rng):
+    session.set('team_name', string_value=rng.choice(TEAMS))
+    return session.set('player_name', string_value=f"Player {rng.randrange(10_000)}"), None
+
+
+def step_select(session, rng):
+    for key in ('position', 'year', 'dev_trait'):
+        fragment_id = session.set(key, string_value=rng.choice(session.widgets[key][1].options))
+    return fragment_id, None
+
+
+def step_toggle(session, rng):
+    for var in rng.sample(COACHING_VARS, 3):
+        checked = session.value(var, 'bool_value', lambda proto: proto.default)
+        fragment_id = session.set(var, bool_value=not checked)
+    return fragment_id, None
+
+
+def step_predict(session, rng):
+    return session.set('xp_penalty', double_value=rng.randrange(0, 101)), None
+
+
+def step_submit(session, rng):
+    session.set('actual_points_input', double_value=rng.randrange(0, 201))
+    return session.click('submit_actual')
+
+
+SCRIPT = {
+    'fill': step_fill,
+    'select': step_select,
+    'toggle': step_toggle,
+    'predict': step_predict,
+    'submit': step_submit
+}
+
+
+def rss(pid):
+    """Resident set size of a process in bytes, or None where /proc is unavailable"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def percentiles(times):
+    times = sorted(times)
+    result = {f'p{p}_s': times[min(len(times) - 1, int(p / 100 * len(times)))] for p in PERCENTILES}
+    result['max_s'] = times[-1]
+    result['runs'] = len(times)
+    return result
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(path, port):
+    """`streamlit run` the app headlessly in the working directory; returns once it answers health checks"""
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'streamlit', 'run', path, '--server.headless', 'true',
+         '--server.address', '127.0.0.1', '--server.port', str(port), '--server.fileWatcherType', 'none',
+         '--browser.gatherUsageStats', 'false'],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"streamlit run {path} exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/_stcore/health', timeout=1) as response:
+                if response.status == 200:
+                    return server
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    raise RuntimeError(f"streamlit run {path} did not start within {SERVER_START_TIMEOUT}s")
+
+
+async def run_session(session, seed, iterations, think, timings, fragment_runs):
+    """Replay the interaction script on a connected, rendered session"""
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+    rng = random.Random(seed)
+    for _ in range(iterations):
+        for name in STEPS:
+            if think:
+                await asyncio.sleep(rng.uniform(0, think))
+            fragment_id, trigger = SCRIPT[name](session, rng)
+            start = time.perf_counter()
+            status = await session.rerun(fragment_id, trigger)
+            timings.setdefault(name, []).append(time.perf_counter() - start)
+            fragment_runs[name] = fragment_runs.get(name, 0) + (status == ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+
+
+async def drive(port, pid, n_sessions, iterations, think, seed):
+    """Warm the server up, connect `n_sessions` clients, render them all, then replay the script on each"""
+    warmup = await Session.connect(port)
+    await warmup.rerun()
+    await warmup.close()
+    await asyncio.sleep(1)  # let the server drop the warm-up session
+    memory = {'baseline': rss(pid)}
+
+    sessions = await asyncio.gather(*(Session.connect(port) for _ in range(n_sessions)))
+    timings = {}
+    fragment_runs = {}
+
+    async def first_render(session):
+        start = time.perf_counter()
+        await session.rerun()
+        timings.setdefault('first_render', []).append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(first_render(s) for s in sessions), return_exceptions=True)
+        memory['rendered'] = rss(pid)
+        results += await asyncio.gather(
+            *(run_session(s, seed + i, iterations, think, timings, fragment_runs) for i, s in enumerate(sessions)),
+            return_exceptions=True
+        )
+        memory['end'] = rss(pid)
+    finally:
+        elapsed = time.perf_counter() - start
+        await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+
+    errors = [f"{type(e).__name__}: {e}" for e in results if isinstance(e, BaseException)]
+    errors += [error for s in sessions for error in s.errors]
+    return timings, fragment_runs, memory, errors, elapsed
+
+
+def load_app(app, n_sessions, iterations, think, seed):
+    """Run `n_sessions` concurrent sessions against one `streamlit run` server for `app`"""
+    port = free_port()
+    server = start_server(os.path.join(ROOT, app), port)
+    try:
+        timings, fragment_runs, memory, errors, elapsed = asyncio.run(
+            drive(port, server.pid, n_sessions, iterations, think, seed)
+        )
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    reruns = sum(len(times) for times in timings.values())
+    baseline = memory['baseline']
+    per_session = {
+        stage: (memory[stage] - baseline) / n_sessions if memory.get(stage) is not None and baseline else None
+        for stage in ('rendered', 'end')
+    }
+    return {
+        'sessions': n_sessions,
+        'iterations': iterations,
+        'wall_s': elapsed,
+        'reruns_per_s': reruns / elapsed,
+        'server_rss_bytes': memory,
+        'rss_growth_per_session_bytes': per_session,
+        'fragment_reruns': fragment_runs,
+        'errors': errors,
+        'latency': {name: percentiles(timings[name]) for name in ('first_render', *STEPS) if name in timings}
+    }
+
+
+def _mib(n):
+    return 'n/a' if n is None else f"{n / 2**20:.1f} MiB"
+
+
+def report(app, result):
+    memory = result['server_rss_bytes']
+    growth = result['rss_growth_per_session_bytes']
+    print(f"{app}: {result['sessions']} sessions on one server x {result['iterations']} iterations "
+          f"in {result['wall_s']:.1f}s ({result['reruns_per_s']:.1f} reruns/s)")
+    print(f"  server RSS {_mib(memory['baseline'])} warm, {_mib(memory.get('rendered'))} with every session "
+          f"rendered, {_mib(memory.get('end'))} at the end; per session {_mib(growth['rendered'])} "
+          f"rendered, {_mib(growth['end'])} at the end")
+    header = ''.join(f"{f'p{p}':>10}" for p in PERCENTILES)
+    print(f"  {'step':<14}{header}{'max':>10}{'runs':>8}{'fragment':>10}")
+    for name, stats in result['latency'].items():
+        cells = ''.join(f"{stats[f'p{p}_s'] * 1000:>8.1f}ms" for p in PERCENTILES)
+        print(f"  {name:<14}{cells}{stats['max_s'] * 1000:>8.1f}ms{stats['runs']:>8}"
+              f"{result['fragment_reruns'].get(name, 0):>10}")
+    for error in result['errors'][:5]:
+        print(f"  ERROR {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent users against one Streamlit server per app")
+    parser.add_argument('--apps', nargs='+', choices=APPS, default=list(APPS))
+    parser.add_argument('--sessions', type=int, default=20, help="concurrent sessions per app")
+    parser.add_argument('--iterations', type=int, default=3, help="times each session replays the script")
+    parser.add_argument('--think', type=float, default=0.0, help="max random pause in seconds before each step")
+    parser.add_argument('--sheet-latency', type=float, default=SHEET_LATENCY)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    # The server inherits the config and writes its spool/stats files to the working directory
+    os.environ['STORAGE_BACKEND'] = f'local:{args.sheet_latency}'
+    os.environ.pop('METRICS_EXPORT', None)
+    workdir = tempfile.mkdtemp(prefix='loadtest-')
+    os.chdir(workdir)
+    try:
+        results = {}
+        for app in args.apps:
+            results[app] = load_app(app, args.sessions, args.iterations, args.think, args.seed)
+            report(app, results[app])
+    finally:
+        os.chdir(ROOT)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+    sys.exit(1 if any(result['errors'] for result in results.values()) else 0)
+
+
+if __name__ == '__main__':
+    main()
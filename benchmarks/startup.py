@@ -0,0 +1,139 @@
+"""Cold-start benchmark for the Streamlit apps
+
+Every sample runs in a fresh interpreter, so nothing is shared between
+samples. Two things are measured per app:
+
+- import_seconds: time to run the app's own top-level imports after
+  streamlit is already loaded
+- first_render_seconds: time for AppTest to execute the first script run
+
+The run fails (exit status 1) if the median of either exceeds the stored
+baseline by more than the tolerance. It also fails if the first render
+loads a module from DEFERRED_MODULES, which only the submit path should
+need.
+
+    python benchmarks/startup.py                    # check against the baseline
+    python benchmarks/startup.py --update-baseline  # record new baseline numbers
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'startup_baseline.json')
+APPS = ('app.py', 'app2.py')
+
+# Modules that must stay unloaded until the first "Submit Actual Results"
+DEFERRED_MODULES = ('gspread', 'google.oauth2', 'google.auth', 'pandas')
+
+IMPORT_PROBE = '''
+import json, sys, time
+import streamlit
+start = time.perf_counter()
+exec(compile(sys.argv[2], sys.argv[1], 'exec'), {'__name__': 'startup_probe'})
+print(json.dumps({'import_seconds': time.perf_counter() - start}))
+'''
+
+RENDER_PROBE = '''
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'first_render_seconds': elapsed,
+    'exception': [str(e.value) for e in at.exception],
+    'deferred_loaded': [m for m in sys.argv[2].split(',') if m in sys.modules]
+}))
+'''
+
+
+def app_imports(path):
+    """Source of an app's top-level import statements"""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    imports = [node for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))]
+    return ast.unparse(ast.Module(body=imports, type_ignores=[]))
+
+
+def _probe(code, *args, cwd):
+    result = subprocess.run(
+        [sys.executable, '-c', code, *args],
+        cwd=cwd, capture_output=True, text=True, check=True,
+        env=dict(os.environ, PYTHONPATH=ROOT)
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure(app, repeats, workdir):
+    """Median import and first-render times for one app"""
+    path = os.path.join(ROOT, app)
+    imports = app_imports(path)
+    import_times = []
+    render_times = []
+    deferred_loaded = set()
+    for _ in range(repeats):
+        import_times.append(_probe(IMPORT_PROBE, path, imports, cwd=workdir)['import_seconds'])
+        render = _probe(RENDER_PROBE, path, ','.join(DEFERRED_MODULES), cwd=workdir)
+        if render['exception']:
+            raise RuntimeError(f"{app} raised on first render: {render['exception']}")
+        render_times.append(render['first_render_seconds'])
+        deferred_loaded.update(render['deferred_loaded'])
+    return {
+        'import_seconds': statistics.median(import_times),
+        'first_render_seconds': statistics.median(render_times),
+        'deferred_loaded': sorted(deferred_loaded)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app cold-start time and check it against a baseline")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--tolerance', type=float, default=0.5, help="allowed fractional slowdown over baseline")
+    parser.add_argument('--slack', type=float, default=0.05, help="allowed absolute slowdown in seconds")
+    parser.add_argument('--update-baseline', action='store_true')
+    args = parser.parse_args()
+
+    # Run from a scratch directory so local spool/replica files are not picked up
+    workdir = os.path.join(ROOT, 'benchmarks', '.startup_workdir')
+    os.makedirs(workdir, exist_ok=True)
+
+    results = {app: measure(app, args.repeats, workdir) for app in APPS}
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH) as f:
+            baseline = json.load(f)
+
+    failures = []
+    for app, result in results.items():
+        print(f"{app}: import {result['import_seconds'] * 1000:.1f} ms, "
+              f"first render {result['first_render_seconds'] * 1000:.1f} ms")
+        if result['deferred_loaded']:
+            failures.append(f"{app} loaded {', '.join(result['deferred_loaded'])} before any submission")
+        for metric in ('import_seconds', 'first_render_seconds'):
+            limit = baseline.get(app, {}).get(metric)
+            if limit is None or args.update_baseline:
+                continue
+            allowed = limit * (1 + args.tolerance) + args.slack
+            if result[metric] > allowed:
+                failures.append(f"{app} {metric} {result[metric]:.3f}s exceeds {allowed:.3f}s (baseline {limit:.3f}s)")
+
+    if args.update_baseline:
+        with open(BASELINE_PATH, 'w') as f:
+            json.dump({app: {k: round(v, 4) for k, v in r.items() if k.endswith('_seconds')}
+                       for app, r in results.items()}, f, indent=2)
+            f.write('\n')
+        print(f"Baseline written to {BASELINE_PATH}")
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
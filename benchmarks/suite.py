@@ -0,0 +1,261 @@
+"""Benchmark suite for prediction, interval rendering and the save path
+
+Runs the same benchmarks for each app's model (app.py serves v4.0, app2.py
+serves v2.3). Each run appends one JSON line to the history file. Every
+result is compared with the latest earlier run of the same benchmark, so
+a regression shows up between model variants and between commits.
+
+    python benchmarks/suite.py                         # all benchmarks, both models
+    python benchmarks/suite.py --only predict --models v4.0
+    python benchmarks/suite.py --fail-on-regression 0.25
+
+Benchmarks:
+- predict.scalar / predict.batch / predict.batch.codes: calculate_prediction
+  called per player vs. one predict_batch call over the roster, with string
+  or pre-encoded integer categories
+- intervals.build.conformal / intervals.build.bootstrap: IntervalTable
+  construction from a residual snapshot
+- intervals.render: the result panel's per-DevT lookup and formatting
+- save.enqueue / save.flush: the save path of save_complete_data (spool,
+  retrainer, live stats) against a LocalWorksheet with injected latency,
+  timed to return and to reach the sheet
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from intervals import IntervalTable
+from live_stats import LiveStats
+from model import COACHING_VARS
+from registry import load_model
+from retrain import OnlineTrainer
+from sheets import LocalWorksheet
+from storage import SubmissionStore, record_submission
+
+HISTORY_PATH = os.path.join(ROOT, 'benchmarks', 'history.jsonl')
+
+# Model served by each app
+APP_MODELS = {'app.py': 'v4.0', 'app2.py': 'v2.3'}
+
+ROSTER_SIZE = 10_000
+RESIDUALS = 5_000
+SAVES = 200
+SHEET_LATENCY = 0.05  # seconds per simulated Sheets API call
+
+
+def timed(fn, repeat):
+    """Per-call wall times of `fn` over `repeat` runs"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def summary(times, items=1):
+    """Median, p95 and per-item throughput of a list of timings"""
+    times = sorted(times)
+    median = statistics.median(times)
+    return {
+        'median_s': median,
+        'p95_s': times[min(len(times) - 1, int(0.95 * len(times)))],
+        'runs': len(times),
+        'items': items,
+        'items_per_s': items / median if median else None
+    }
+
+
+def synthetic_roster(model, n, seed=0):
+    """Random roster over the model's category levels"""
+    rng = np.random.default_rng(seed)
+    return {
+        'position': rng.choice(model.position_levels, n),
+        'year': rng.choice(model.year_levels, n),
+        'dev_trait': rng.choice(model.dev_trait_levels, n),
+        'xp_penalty': rng.integers(0, 101, n)
+    }
+
+
+def synthetic_residuals(model, n, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'dev_trait': rng.choice(model.dev_trait_levels, n),
+        'position': rng.choice(model.position_levels, n),
+        'residual': rng.normal(0.0, 6.0, n)
+    }
+
+
+def bench_predict(model, repeat):
+    roster = synthetic_roster(model, ROSTER_SIZE)
+    coaching_abilities = {var: var.endswith('TD2') for var in COACHING_VARS}
+    rows = list(zip(roster['position'], roster['year'], roster['dev_trait'], roster['xp_penalty'].tolist()))
+    positions, years, dev_traits = model.encode(roster)
+    coded = dict(roster, position=positions, year=years, dev_trait=dev_traits)
+
+    def scalar():
+        for position, year, dev_trait, xp_penalty in rows:
+            model.predict(position, year, dev_trait, xp_penalty, coaching_abilities)
+
+    return {
+        'predict.scalar': summary(timed(scalar, max(1, repeat // 5)), ROSTER_SIZE),
+        'predict.batch': summary(timed(lambda: model.predict_batch(roster, coaching_abilities), repeat), ROSTER_SIZE),
+        'predict.batch.codes': summary(timed(lambda: model.predict_batch(coded, coaching_abilities), repeat), ROSTER_SIZE)
+    }
+
+
+def bench_intervals(model, repeat):
+    residuals = synthetic_residuals(model, RESIDUALS)
+    results = {
+        'intervals.build.conformal': summary(timed(
+            lambda: IntervalTable.build(residuals, method='conformal'), repeat)),
+        'intervals.build.bootstrap': summary(timed(
+            lambda: IntervalTable.build(residuals, method='bootstrap', n_boot=200, workers=1), max(1, repeat // 5)))
+    }
+
+    table = IntervalTable.build(residuals, method='conformal')
+    strata = [(d, p) for d in model.dev_trait_levels for p in model.position_levels]
+    prediction = 40.0
+
+    def render():
+        # Same work as the result panel, minus the Streamlit calls
+        lines = []
+        for dev_trait, position in strata:
+            for coverage, lower_offset, upper_offset in table.lookup(dev_trait, position):
+                lower = max(0, prediction + lower_offset)
+                upper = prediction + upper_offset
+                lines.append(f"{coverage:.0%} interval: **{lower:.1f} - {upper:.1f}**")
+        return lines
+
+    results['intervals.render'] = summary(timed(render, repeat * 10), len(strata))
+    return results
+
+
+def bench_save(model, repeat):
+    roster = synthetic_roster(model, SAVES, seed=1)
+    submissions = [
+        {
+            'team': 'Bench', 'player_name': f'Player {i}', 'snaps': 0,
+            'position': roster['position'][i], 'year': roster['year'][i], 'dev_trait': roster['dev_trait'][i],
+            'xp_penalty': int(roster['xp_penalty'][i]), 'prediction': 40.0,
+            **{var: 0 for var in COACHING_VARS}
+        }
+        for i in range(SAVES)
+    ]
+
+    enqueue_times = []
+    flush_times = []
+    for _ in range(max(1, repeat // 5)):
+        with tempfile.TemporaryDirectory() as tmp:
+            sheet = LocalWorksheet(latency=SHEET_LATENCY)
+            store = SubmissionStore(os.path.join(tmp, 'spool.db'), lambda: sheet, batch_size=50, max_latency=0.1)
+            trainer = OnlineTrainer(os.path.join(tmp, 'retrain.npz'), model)
+            live_stats = LiveStats(os.path.join(tmp, 'live_stats.json'))
+
+            start = time.perf_counter()
+            for data in submissions:
+                t = time.perf_counter()
+                record_submission(store, data, 42, trainer=trainer, live_stats=live_stats)
+                enqueue_times.append(time.perf_counter() - t)
+            while len(sheet.rows) < SAVES:
+                time.sleep(0.005)
+            flush_times.append(time.perf_counter() - start)
+
+            store.worker.stop()
+            store.worker.spool.close()
+
+    return {
+        'save.enqueue': summary(enqueue_times),
+        'save.flush': summary(flush_times, SAVES)
+    }
+
+
+BENCHMARKS = {
+    'predict': bench_predict,
+    'intervals': bench_intervals,
+    'save': bench_save
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def previous_results(path):
+    """Latest earlier result for every (model version, benchmark) pair"""
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                record = json.loads(line)
+                for version, results in record['results'].items():
+                    for name, result in results.items():
+                        latest[(version, name)] = result
+    return latest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and append the results to the history file")
+    parser.add_argument('--models', nargs='*', default=list(APP_MODELS.values()))
+    parser.add_argument('--only', nargs='*', choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--history', default=HISTORY_PATH)
+    parser.add_argument('--fail-on-regression', type=float, metavar='FRACTION',
+                        help="exit non-zero if any median slows down by more than this fraction")
+    args = parser.parse_args()
+
+    previous = previous_results(args.history)
+    results = {}
+    regressions = []
+    for version in args.models:
+        model = load_model(version)
+        results[version] = {}
+        for group in args.only:
+            results[version].update(BENCHMARKS[group](model, args.repeat))
+
+        for name, result in results[version].items():
+            line = f"{version:6} {name:28} median {result['median_s'] * 1000:10.3f} ms"
+            before = previous.get((version, name))
+            if before:
+                change = result['median_s'] / before['median_s'] - 1
+                line += f"  ({change:+.0%} vs previous)"
+                if args.fail_on_regression is not None and change > args.fail_on_regression:
+                    regressions.append(f"{version} {name} {change:+.0%}")
+            print(line)
+
+    record = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'apps': {app: version for app, version in APP_MODELS.items() if version in results},
+        'results': results
+    }
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(record) + '\n')
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+"""Compact, memory-mappable columnar copy of the submission dataset
+
+A dataset is a directory holding one .npy file per column and a meta.json:
+
+- team, player_name, position, year, dev_trait are dictionary-encoded as
+  the smallest unsigned integer codes that fit, levels kept in meta.json
+- the 13 coaching flags are packed into one int16 coaching_mask (bit
+  order of model.COACHING_VARS)
+- the remaining integer columns use the smallest dtype holding their range
+
+Loading maps the files read-only (np.load(mmap_mode='r')), so opening even
+a few hundred thousand submissions is near-instant and zero-copy.
+
+    python columnar.py submissions_replica.db submissions.cols
+"""
+import argparse
+import json
+import os
+import shutil
+
+import numpy as np
+
+from model import COACHING_VARS
+from sheets import SUBMISSION_COLUMNS
+
+FORMAT_VERSION = 1
+
+CATEGORICAL_COLUMNS = ('team', 'player_name', 'position', 'year', 'dev_trait')
+INTEGER_COLUMNS = tuple(
+    name for name in ('sheet_row', *SUBMISSION_COLUMNS)
+    if name not in CATEGORICAL_COLUMNS and name not in COACHING_VARS
+)
+MASK_COLUMN = 'coaching_mask'
+
+_INTEGER_DTYPES = (np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.int64)
+
+
+def smallest_int_dtype(values):
+    """Smallest integer dtype that holds every value"""
+    if not len(values):
+        return np.dtype(np.uint8)
+    lo, hi = int(np.min(values)), int(np.max(values))
+    for dtype in _INTEGER_DTYPES:
+        info = np.iinfo(dtype)
+        if info.min <= lo and hi <= info.max:
+            return np.dtype(dtype)
+    raise ValueError(f"Values {lo}..{hi} do not fit in int64")
+
+
+def write_dataset(path, rows):
+    """Write submission rows (dicts with SUBMISSION_COLUMNS, e.g. SheetReplica.iter_rows()) to `path`
+
+    The directory is built next to `path` and swapped in at the end, so
+    readers never see a half-written dataset. Returns the row count.
+    """
+    dictionaries = {name: {} for name in CATEGORICAL_COLUMNS}
+    codes = {name: [] for name in CATEGORICAL_COLUMNS}
+    integers = {name: [] for name in INTEGER_COLUMNS}
+    masks = []
+
+    for row in rows:
+        for name in CATEGORICAL_COLUMNS:
+            dictionary = dictionaries[name]
+            value = row[name]
+            code = dictionary.get(value)
+            if code is None:
+                code = dictionary[value] = len(dictionary)
+            codes[name].append(code)
+        for name in INTEGER_COLUMNS:
+            if name in row:
+                integers[name].append(int(row[name]))
+        mask = 0
+        for bit, var in enumerate(COACHING_VARS):
+            if row[var]:
+                mask |= 1 << bit
+        masks.append(mask)
+
+    n = len(masks)
+    arrays = {}
+    columns = {}
+    for name in CATEGORICAL_COLUMNS:
+        levels = list(dictionaries[name])
+        arrays[name] = np.array(codes[name], dtype=smallest_int_dtype([len(levels) - 1] if levels else []))
+        columns[name] = {'kind': 'categorical', 'levels': levels}
+    for name in INTEGER_COLUMNS:
+        if len(integers[name]) != n:
+            continue  # sheet_row is optional
+        values = np.array(integers[name], dtype=np.int64)
+        arrays[name] = values.astype(smallest_int_dtype(values))
+        columns[name] = {'kind': 'integer'}
+    arrays[MASK_COLUMN] = np.array(masks, dtype=np.int16)
+    columns[MASK_COLUMN] = {'kind': 'mask', 'bits': COACHING_VARS}
+
+    for name, array in arrays.items():
+        columns[name]['dtype'] = array.dtype.str
+
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'format': FORMAT_VERSION, 'n_rows': n, 'columns': columns}, f)
+
+    old_path = f'{path}.old'
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return n
+
+
+class ColumnarDataset:
+    """Read-only view of a dataset written by write_dataset
+
+    `dataset[name]` is the stored array (codes for categoricals), memory
+    mapped unless `mmap=False`.
+    """
+
+    def __init__(self, path, mmap=True):
+        self.path = path
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta['format'] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported columnar format {meta['format']} in {path}")
+        self.n_rows = meta['n_rows']
+        self.columns = meta['columns']
+        self._mmap_mode = 'r' if mmap else None
+        self._arrays = {}
+
+    def __len__(self):
+        return self.n_rows
+
+    def __contains__(self, name):
+        return name in self.columns
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            if name not in self.columns:
+                raise KeyError(name)
+            # np.load cannot memory-map an empty array
+            mmap_mode = self._mmap_mode if self.n_rows else None
+            self._arrays[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode=mmap_mode)
+        return self._arrays[name]
+
+    def levels(self, name):
+        return self.columns[name]['levels']
+
+    def decode(self, name):
+        """Categorical column as an array of its string values"""
+        return np.asarray(self.levels(name), dtype=object)[self[name]]
+
+    def recode(self, name, levels):
+        """Codes of a categorical column in another level order, -1 where a value is not in `levels`"""
+        index = {level: i for i, level in enumerate(levels)}
+        remap = np.array([index.get(level, -1) for level in self.levels(name)], dtype=np.intp)
+        return remap[self[name]]
+
+    @property
+    def masks(self):
+        return self[MASK_COLUMN]
+
+    def model_inputs(self, model):
+        """(players, masks, known) ready for model.predict_masks
+
+        `players` holds integer codes in the model's level order for the
+        rows whose categories the model knows; `known` marks those rows.
+        """
+        codes = {
+            'position': self.recode('position', model.position_levels),
+            'year': self.recode('year', model.year_levels),
+            'dev_trait': self.recode('dev_trait', model.dev_trait_levels)
+        }
+        known = (codes['position'] >= 0) & (codes['year'] >= 0) & (codes['dev_trait'] >= 0)
+        players = {name: values[known] for name, values in codes.items()}
+        players['xp_penalty'] = np.asarray(self['xp_penalty'])[known]
+        return players, np.asarray(self.masks, dtype=np.int64)[known], known
+
+    def to_dataframe(self):
+        """Load into pandas with categorical columns"""
+        import pandas as pd
+        frame = {}
+        for name, spec in self.columns.items():
+            if spec['kind'] == 'categorical':
+                frame[name] = pd.Categorical.from_codes(np.asarray(self[name]), categories=spec['levels'])
+            elif spec['kind'] == 'mask':
+                masks = np.asarray(self[name])
+                for bit, var in enumerate(spec['bits']):
+                    frame[var] = (masks >> bit & 1).astype(np.uint8)
+            else:
+                frame[name] = np.asarray(self[name])
+        return pd.DataFrame(frame)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the columnar submission dataset from a local replica")
+    parser.add_argument('replica', help="SQLite replica file (see replica.py)")
+    parser.add_argument('output', help="Dataset directory to write")
+    args = parser.parse_args()
+
+    from replica import SheetReplica
+    replica = SheetReplica(args.replica)
+    n = write_dataset(args.output, replica.iter_rows())
+    size = sum(os.path.getsize(os.path.join(args.output, name)) for name in os.listdir(args.output))
+    print(f"Wrote {n} submissions to {args.output} ({size / 1024:.1f} KiB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+# Bytes of the BLAKE2b digest kept per key
+KEY_BYTES = 16
+
+# Seconds a key is kept; every key is session-scoped and sessions end long before this
+KEY_TTL = 24 * 3600
+
+# Seconds between sweeps of expired keys while running
+PRUNE_INTERVAL = 3600
+
+
+def _normalize(value):
+    """Canonical form of a cell so equal content hashes equally (5 == 5.0, ' Auburn' == 'auburn')"""
+    if isinstance(value, str):
+        return value.strip().casefold()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def submission_key(row, scope=''):
+    """Content key of a sheet row (SUBMISSION_COLUMNS order)
+
+    `scope` narrows the key, e.g. to one browser session; keys for rows
+    already in the sheet use the empty scope.
+    """
+    payload = json.dumps([scope, *(_normalize(v) for v in row)], separators=(',', ':'))
+    return hashlib.blake2b(payload.encode(), digest_size=KEY_BYTES).digest()
+
+
+class DedupeIndex:
+    """Submission keys seen in the last `ttl` seconds, persisted in SQLite
+
+    Membership checks hit an in-memory dict. Only a key that is new goes to
+    disk, so a duplicate is rejected without any I/O. Keys older than
+    `ttl` are dropped on open and swept every PRUNE_INTERVAL seconds, so
+    neither the file nor the startup load grows with every session ever
+    seen. `ttl=None` keeps keys forever.
+    """
+
+    def __init__(self, path, ttl=KEY_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS submission_keys (key BLOB PRIMARY KEY, created REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS submission_keys_created ON submission_keys (created)')
+        self._keys = {}
+        self._pruned = None
+        self.prune()
+        self._keys = dict(self._conn.execute('SELECT key, created FROM submission_keys'))
+
+    def prune(self, now=None):
+        """Forget keys older than the TTL; returns the number removed"""
+        now = time.time() if now is None else now
+        with self._lock:
+            self._pruned = now
+            if self.ttl is None:
+                return 0
+            cutoff = now - self.ttl
+            removed = self._conn.execute('DELETE FROM submission_keys WHERE created < ?', (cutoff,)).rowcount
+            self._keys = {key: created for key, created in self._keys.items() if created >= cutoff}
+            return removed
+
+    def add(self, key):
+        """Record a key; returns False if it was already present"""
+        now = time.time()
+        if now - self._pruned >= PRUNE_INTERVAL:
+            self.prune(now)
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._conn.execute('INSERT OR IGNORE INTO submission_keys VALUES (?, ?)', (key, now))
+            self._keys[key] = now
+            return True
+
+    def discard(self, key):
+        """Forget a key, e.g. when the write it guarded failed"""
+        with self._lock:
+            self._keys.pop(key, None)
+            self._conn.execute('DELETE FROM submission_keys WHERE key = ?', (key,))
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
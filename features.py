@@ -0,0 +1,302 @@
+"""Declarative feature engine for the skill points design
+
+The design is the published dummy-coded main effects (Intercept,
+position/year/DevT dummies without their baseline level, the 13 coaching
+flags and XP_Penalty) followed by named interaction columns. Interactions
+are declared as products of factors:
+
+    DC_TD2 * year{FR,SO}      coaching flag x year in {FR, SO}: one column
+    dev_trait * xp_penalty    one column per non-baseline DevT level
+    OC_TD2 * position{WR,TE}  flag x position subset
+
+A factor is a coaching ability, 'xp_penalty', a category name ('position',
+'year', 'dev_trait'), expanded over its non-baseline levels, or a category
+restricted to a {subset} of levels, giving one 0/1 indicator.
+
+Rows come out as a SparseDesign holding only the active entries. A row
+has at most 18 main-effect entries plus one per interaction, so scoring
+cost grows with the active entries rather than with the number of
+columns.
+"""
+import itertools
+import re
+
+import numpy as np
+
+from model import COACHING_VARS
+
+CATEGORIES = ('position', 'year', 'dev_trait')
+
+# The coaching guide's Coordinator TD2 effect on underclassmen, plus DevT-specific XP penalty slopes
+COACHING_INTERACTIONS = ('DC_TD2 * year{FR,SO}', 'OC_TD2 * year{FR,SO}', 'dev_trait * xp_penalty')
+
+# Rows per dense block when accumulating X'X
+GRAM_BLOCK_ROWS = 8192
+
+_FACTOR = re.compile(r'^([\w.]+)(?:\{([^}]*)\})?$')
+
+
+class SparseDesign:
+    """Design matrix rows in CSR form (indptr, indices, data)"""
+
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def row_ids(self):
+        """Row number of every stored entry"""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def dot(self, beta):
+        """X @ beta in O(nnz)"""
+        return np.bincount(self.row_ids(), weights=self.data * beta[self.indices], minlength=self.shape[0])
+
+    def tdot(self, y):
+        """X' @ y in O(nnz)"""
+        return np.bincount(self.indices, weights=self.data * y[self.row_ids()], minlength=self.shape[1])
+
+    def gram(self, block_rows=GRAM_BLOCK_ROWS):
+        """X' @ X, expanding one block of rows at a time (the design is narrow, so BLAS wins here)"""
+        n, p = self.shape
+        xtx = np.zeros((p, p))
+        for start in range(0, n, block_rows):
+            block = self.slice(start, min(n, start + block_rows)).toarray()
+            xtx += block.T @ block
+        return xtx
+
+    def slice(self, start, stop):
+        """Rows start..stop as a new SparseDesign"""
+        lo, hi = self.indptr[start], self.indptr[stop]
+        return SparseDesign(self.indptr[start:stop + 1] - lo, self.indices[lo:hi], self.data[lo:hi],
+                            (stop - start, self.shape[1]))
+
+    def toarray(self):
+        X = np.zeros(self.shape)
+        X[self.row_ids(), self.indices] = self.data
+        return X
+
+    @classmethod
+    def from_triplets(cls, rows, cols, vals, shape):
+        """Build from unordered (row, column, value) entries"""
+        order = np.argsort(rows, kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=shape[0]))])
+        return cls(indptr, cols[order].astype(np.intp), vals[order].astype(np.float64), shape)
+
+
+class Factor:
+    """One factor of an interaction term"""
+
+    def __init__(self, token, levels):
+        match = _FACTOR.match(token.strip())
+        if match is None:
+            raise ValueError(f"Cannot parse factor {token!r}")
+        name, subset = match.groups()
+        self.name = name
+        self.subset = None
+        if name in COACHING_VARS:
+            self.kind = 'flag'
+            self.bit = COACHING_VARS.index(name)
+            self.labels = [name]
+        elif name == 'xp_penalty':
+            self.kind = 'numeric'
+            self.labels = [name]
+        elif name in CATEGORIES:
+            category_levels = levels[name]
+            if subset is None:
+                self.kind = 'levels'
+                self.labels = [f'{name}[{level}]' for level in category_levels[1:]]
+            else:
+                self.subset = [level.strip() for level in subset.split(',') if level.strip()]
+                unknown = [level for level in self.subset if level not in category_levels]
+                if unknown or not self.subset:
+                    raise ValueError(f"Factor {token!r} names levels {unknown} not in {list(category_levels)}")
+                self.kind = 'subset'
+                self.codes = np.array([category_levels.index(level) for level in self.subset])
+                self.code_set = frozenset(self.codes.tolist())
+                self.labels = [f"{name}{{{','.join(self.subset)}}}"]
+        else:
+            raise ValueError(f"Unknown factor {name!r}; use a coaching ability, xp_penalty or one of {CATEGORIES}")
+
+    def evaluate(self, inputs):
+        """Per-row (local column, value) arrays; a zero value means inactive"""
+        if self.kind == 'flag':
+            values = ((inputs['mask'] >> self.bit) & 1).astype(np.float64)
+        elif self.kind == 'numeric':
+            values = inputs['xp_penalty'].astype(np.float64)
+        elif self.kind == 'subset':
+            values = np.isin(inputs[self.name], self.codes).astype(np.float64)
+        else:
+            codes = inputs[self.name]
+            return np.maximum(codes - 1, 0), (codes > 0).astype(np.float64)
+        return np.zeros(len(values), dtype=np.intp), values
+
+    def value(self, row):
+        """(local column, value) for one row of Python scalars"""
+        if self.kind == 'flag':
+            return 0, float((row['mask'] >> self.bit) & 1)
+        if self.kind == 'numeric':
+            return 0, float(row['xp_penalty'])
+        code = row[self.name]
+        if self.kind == 'subset':
+            return 0, float(code in self.code_set)
+        return max(code - 1, 0), float(code > 0)
+
+
+class Interaction:
+    """Product of factors, with one column per combination of factor columns"""
+
+    def __init__(self, spec, levels):
+        self.factors = [Factor(token, levels) for token in spec.split('*')]
+        if len(self.factors) < 2:
+            raise ValueError(f"Interaction {spec!r} needs at least two factors joined by '*'")
+        self.spec = ' * '.join(token.strip() for token in spec.split('*'))
+        self.labels = [':'.join(combo) for combo in itertools.product(*(f.labels for f in self.factors))]
+
+    def evaluate(self, inputs):
+        """Per-row (column within this term, value) arrays; a zero value means inactive"""
+        local = None
+        value = None
+        for factor in self.factors:
+            cols, vals = factor.evaluate(inputs)
+            local = cols if local is None else local * len(factor.labels) + cols
+            value = vals if value is None else value * vals
+        return local, value
+
+    def value(self, row):
+        """(column within this term, value) for one row, stopping at the first inactive factor"""
+        local = 0
+        value = 1.0
+        for factor in self.factors:
+            col, val = factor.value(row)
+            if not val:
+                return 0, 0.0
+            local = local * len(factor.labels) + col
+            value *= val
+        return local, value
+
+
+class FeatureEngine:
+    """Column layout and sparse design rows for main effects plus interactions
+
+    The main-effect columns match SufficientStats' dummy layout, so an
+    engine without interactions reproduces the additive design exactly.
+    Interaction columns follow XP_Penalty in declaration order.
+    """
+
+    def __init__(self, position_levels, year_levels, dev_trait_levels, interactions=()):
+        self.position_levels = list(position_levels)
+        self.year_levels = list(year_levels)
+        self.dev_trait_levels = list(dev_trait_levels)
+        self.levels = {'position': self.position_levels, 'year': self.year_levels,
+                       'dev_trait': self.dev_trait_levels}
+        self.indexes = {name: {level: i for i, level in enumerate(levels)} for name, levels in self.levels.items()}
+
+        self.terms = [Interaction(spec, self.levels) for spec in interactions]
+        self.interactions = [term.spec for term in self.terms]
+
+        # Dummy columns; a level's column is start + index - 1 (baseline has none)
+        self.position_start = 1
+        self.year_start = self.position_start + len(self.position_levels) - 1
+        self.dev_trait_start = self.year_start + len(self.year_levels) - 1
+        self.coaching_start = self.dev_trait_start + len(self.dev_trait_levels) - 1
+        self.xp_col = self.coaching_start + len(COACHING_VARS)
+        self.interaction_start = self.xp_col + 1
+
+        self.term_starts = []
+        p = self.interaction_start
+        for term in self.terms:
+            self.term_starts.append(p)
+            p += len(term.labels)
+        self.p = p
+        self.interaction_columns = [label for term in self.terms for label in term.labels]
+        self.columns = (
+            ['Intercept']
+            + [f'position[{level}]' for level in self.position_levels[1:]]
+            + [f'year[{level}]' for level in self.year_levels[1:]]
+            + [f'dev_trait[{level}]' for level in self.dev_trait_levels[1:]]
+            + list(COACHING_VARS)
+            + ['XP_Penalty']
+            + self.interaction_columns
+        )
+
+    def inputs(self, positions, years, dev_traits, xp_penalty, masks):
+        """Bundle integer category codes, XP penalties and coaching masks as aligned arrays"""
+        positions = np.asarray(positions, dtype=np.intp)
+        n = len(positions)
+        return {
+            'position': positions,
+            'year': np.asarray(years, dtype=np.intp),
+            'dev_trait': np.asarray(dev_traits, dtype=np.intp),
+            'xp_penalty': np.broadcast_to(np.asarray(xp_penalty, dtype=np.float64), (n,)),
+            'mask': np.broadcast_to(np.asarray(masks, dtype=np.int64), (n,))
+        }
+
+    def _interaction_triplets(self, inputs, offset):
+        rows, cols, vals = [], [], []
+        for term, start in zip(self.terms, self.term_starts):
+            local, value = term.evaluate(inputs)
+            active = np.flatnonzero(value)
+            rows.append(active)
+            cols.append(start - offset + local[active])
+            vals.append(value[active])
+        return rows, cols, vals
+
+    def design(self, positions, years, dev_traits, xp_penalty, masks):
+        """Full sparse design for rows given as integer codes in this engine's level order"""
+        inputs = self.inputs(positions, years, dev_traits, xp_penalty, masks)
+        n = len(inputs['position'])
+        rows = [np.arange(n)]
+        cols = [np.zeros(n, dtype=np.intp)]
+        vals = [np.ones(n)]
+        for name, start in (('position', self.position_start), ('year', self.year_start),
+                            ('dev_trait', self.dev_trait_start)):
+            active = np.flatnonzero(inputs[name] > 0)
+            rows.append(active)
+            cols.append(start + inputs[name][active] - 1)
+            vals.append(np.ones(len(active)))
+        flag_rows, bits = np.nonzero((inputs['mask'][:, None] >> np.arange(len(COACHING_VARS))) & 1)
+        rows.append(flag_rows)
+        cols.append(self.coaching_start + bits)
+        vals.append(np.ones(len(flag_rows)))
+        active = np.flatnonzero(inputs['xp_penalty'])
+        rows.append(active)
+        cols.append(np.full(len(active), self.xp_col))
+        vals.append(inputs['xp_penalty'][active])
+
+        more_rows, more_cols, more_vals = self._interaction_triplets(inputs, 0)
+        return SparseDesign.from_triplets(
+            np.concatenate(rows + more_rows), np.concatenate(cols + more_cols),
+            np.concatenate(vals + more_vals), (n, self.p)
+        )
+
+    def interaction_design(self, positions, years, dev_traits, xp_penalty, masks):
+        """Sparse design of the interaction columns only (column 0 is the first interaction column)"""
+        inputs = self.inputs(positions, years, dev_traits, xp_penalty, masks)
+        n = len(inputs['position'])
+        rows, cols, vals = self._interaction_triplets(inputs, self.interaction_start)
+        if not rows:
+            return SparseDesign(np.zeros(n + 1, dtype=np.intp), np.zeros(0, dtype=np.intp), np.zeros(0), (n, 0))
+        return SparseDesign.from_triplets(np.concatenate(rows), np.concatenate(cols), np.concatenate(vals),
+                                          (n, len(self.interaction_columns)))
+
+    def interaction_row(self, position, year, dev_trait, xp_penalty, mask):
+        """Active (interaction column, value) pairs of one row given as integer codes"""
+        row = {'position': position, 'year': year, 'dev_trait': dev_trait, 'xp_penalty': xp_penalty, 'mask': mask}
+        entries = []
+        for term, start in zip(self.terms, self.term_starts):
+            local, value = term.value(row)
+            if value:
+                entries.append((start - self.interaction_start + local, value))
+        return entries
+
+    def row_features(self, position, year, dev_trait, xp_penalty, mask):
+        """Active column indices and values of one observation's design row (category strings)"""
+        codes = [self.indexes[name][value] for name, value in zip(CATEGORIES, (position, year, dev_trait))]
+        X = self.design(*([code] for code in codes), [xp_penalty], [mask])
+        return X.indices, X.data
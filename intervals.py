@@ -0,0 +1,287 @@
+"""Per-prediction intervals from stored submission residuals
+
+Tables are cached on disk by model version, method and data snapshot.
+The apps never build one on a render: an IntervalRefresher rebuilds in a
+background thread whenever the local replica grows, and a table can be
+prebuilt with
+
+    python intervals.py submissions_replica.db --model-version v4.0 --method bootstrap
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import coaching_masks
+
+# Interval coverage levels shown in the result panel
+COVERAGES = (0.5, 0.8, 0.95)
+
+# Fewest residuals a (DevT, position) or DevT stratum needs before it gets its own intervals
+MIN_STRATUM = 30
+
+# Stratum key for "any"
+ANY = '*'
+
+# Seconds between checks of the replica for new rows
+REFRESH_INTERVAL = 60.0
+
+
+def residuals_from_rows(model, rows):
+    """Actual-minus-predicted residuals for stored submissions
+
+    `rows` is a DataFrame of submissions (e.g. SheetReplica.to_dataframe());
+    rows with categories the model does not know are dropped.
+    """
+    known = (
+        rows['position'].isin(model.position_levels)
+        & rows['year'].isin(model.year_levels)
+        & rows['dev_trait'].isin(model.dev_trait_levels)
+    )
+    rows = rows[known]
+    predicted = model.predict_masks(rows, coaching_masks(rows))
+    return {
+        'dev_trait': rows['dev_trait'].to_numpy(),
+        'position': rows['position'].to_numpy(),
+        'residual': rows['actual_points'].to_numpy(dtype=np.float64) - predicted
+    }
+
+
+def residuals_from_dataset(model, dataset):
+    """Same as residuals_from_rows, for a columnar.ColumnarDataset"""
+    players, masks, known = dataset.model_inputs(model)
+    predicted = model.predict_masks(players, masks)
+    return {
+        'dev_trait': dataset.decode('dev_trait')[known],
+        'position': dataset.decode('position')[known],
+        'residual': np.asarray(dataset['actual_points'])[known].astype(np.float64) - predicted
+    }
+
+
+def _conformal_ranks(n, coverage):
+    """1-based ranks of the lower and upper split-conformal order statistics"""
+    alpha = 1 - coverage
+    lo_rank = max(1, math.floor((n + 1) * alpha / 2))
+    hi_rank = min(n, math.ceil((n + 1) * (1 - alpha / 2)))
+    return lo_rank, hi_rank
+
+
+def conformal_bounds(residuals, coverages):
+    """Split-conformal lower/upper residual offsets for each coverage level
+
+    Uses the finite-sample ranks floor((n + 1) * a/2) and
+    ceil((n + 1) * (1 - a/2)) on the sorted calibration residuals.
+    """
+    r = np.sort(residuals)
+    bounds = []
+    for coverage in coverages:
+        lo_rank, hi_rank = _conformal_ranks(len(r), coverage)
+        bounds.append((coverage, float(r[lo_rank - 1]), float(r[hi_rank - 1])))
+    return bounds
+
+
+# Bootstrap resamples drawn per block, bounds memory for large strata
+BOOTSTRAP_BLOCK = 100
+
+
+def _bootstrap_bounds(task):
+    """Bootstrap-averaged conformal bounds for one stratum (runs in a worker process)"""
+    residuals, coverages, n_boot, seed = task
+    rng = np.random.default_rng(seed)
+    ranks = [_conformal_ranks(len(residuals), coverage) for coverage in coverages]
+    sums = np.zeros((len(coverages), 2))
+
+    for start in range(0, n_boot, BOOTSTRAP_BLOCK):
+        samples = rng.choice(residuals, size=(min(BOOTSTRAP_BLOCK, n_boot - start), len(residuals)))
+        samples.sort(axis=1)
+        for i, (lo_rank, hi_rank) in enumerate(ranks):
+            sums[i] += samples[:, lo_rank - 1].sum(), samples[:, hi_rank - 1].sum()
+
+    mean = sums / n_boot
+    return [(coverage, float(lo), float(hi)) for coverage, (lo, hi) in zip(coverages, mean)]
+
+
+class IntervalTable:
+    """Per-stratum residual offsets, looked up in constant time at render time
+
+    Strata are (DevT, position), falling back to (DevT, any) and then
+    (any, any) when a stratum has fewer than `min_stratum` residuals.
+    """
+
+    def __init__(self, bounds, version=None):
+        self.bounds = bounds
+        self.version = version
+
+    @classmethod
+    def build(cls, residuals, coverages=COVERAGES, method='conformal', min_stratum=MIN_STRATUM,
+              n_boot=1000, seed=0, workers=None, version=None):
+        """Compute the table from a residuals dict (see residuals_from_rows)
+
+        'conformal' uses the split-conformal quantiles directly; 'bootstrap'
+        averages them over `n_boot` resamples per stratum, spread across a
+        process pool.
+        """
+        dev_trait = np.asarray(residuals['dev_trait'])
+        position = np.asarray(residuals['position'])
+        r = np.asarray(residuals['residual'], dtype=np.float64)
+        if not len(r):
+            raise ValueError("No residuals to build intervals from")
+
+        strata = {(ANY, ANY): r}
+        for d in np.unique(dev_trait):
+            in_devt = dev_trait == d
+            if in_devt.sum() >= min_stratum:
+                strata[(d, ANY)] = r[in_devt]
+            for p in np.unique(position[in_devt]):
+                in_stratum = in_devt & (position == p)
+                if in_stratum.sum() >= min_stratum:
+                    strata[(d, p)] = r[in_stratum]
+
+        keys = sorted(strata)
+        if method == 'conformal':
+            results = [conformal_bounds(strata[k], coverages) for k in keys]
+        elif method == 'bootstrap':
+            seeds = np.random.SeedSequence(seed).spawn(len(keys))
+            tasks = [(strata[k], coverages, n_boot, s) for k, s in zip(keys, seeds)]
+            workers = workers or os.cpu_count() or 1
+            if workers == 1:
+                results = [_bootstrap_bounds(task) for task in tasks]
+            else:
+                with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+                    results = list(pool.map(_bootstrap_bounds, tasks))
+        else:
+            raise ValueError(f"Unknown interval method {method!r}")
+
+        return cls({f'{d}|{p}': b for (d, p), b in zip(keys, results)}, version=version)
+
+    def lookup(self, dev_trait, position):
+        """[(coverage, lower offset, upper offset), ...] for a player's stratum"""
+        for key in (f'{dev_trait}|{position}', f'{dev_trait}|{ANY}', f'{ANY}|{ANY}'):
+            if key in self.bounds:
+                return self.bounds[key]
+
+    def save(self, path):
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': self.version, 'bounds': self.bounds}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls({k: [tuple(b) for b in v] for k, v in data['bounds'].items()}, version=data['version'])
+
+
+def snapshot_key(residuals):
+    """Short hash identifying a residual data snapshot"""
+    h = hashlib.sha256()
+    for name in ('dev_trait', 'position', 'residual'):
+        h.update(np.asarray(residuals[name]).astype(str if name != 'residual' else np.float64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def cached_table(model, rows, cache_dir, method='conformal', **build_kwargs):
+    """Load the interval table for this model version and data snapshot, building it once"""
+    residuals = residuals_from_rows(model, rows)
+    path = os.path.join(cache_dir, f'intervals_{model.version}_{method}_{snapshot_key(residuals)}.json')
+    if os.path.exists(path):
+        return IntervalTable.load(path)
+    table = IntervalTable.build(residuals, method=method, version=model.version, **build_kwargs)
+    os.makedirs(cache_dir, exist_ok=True)
+    table.save(path)
+    return table
+
+
+class IntervalRefresher:
+    """Keeps one model's interval table current with the local replica
+
+    current() never builds on the calling thread. When the replica's
+    high-water mark has moved since the last build (checked at most every
+    `refresh_interval` seconds) it starts a background rebuild and keeps
+    returning the previous table, or None until the first one is ready.
+    A missing replica or one without usable rows is simply retried later.
+
+    It runs inside the Streamlit server, so a bootstrap build stays on its
+    own thread (`workers=1`): forking a multithreaded server process for a
+    pool is unsafe. Prebuild bootstrap tables with the CLI to use a pool.
+    """
+
+    def __init__(self, model, replica_path, cache_dir, method='conformal', refresh_interval=REFRESH_INTERVAL,
+                 workers=1):
+        self.model = model
+        self.replica_path = replica_path
+        self.cache_dir = cache_dir
+        self.method = method
+        self.refresh_interval = refresh_interval
+        self.workers = workers
+        self.table = None
+        self.built_at = None  # replica high-water mark the table was built from
+        self._last_check = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def current(self):
+        """The latest table, or None; schedules a rebuild when one is due"""
+        now = time.monotonic()
+        with self._lock:
+            due = self._last_check is None or now - self._last_check >= self.refresh_interval
+            if due and (self._thread is None or not self._thread.is_alive()):
+                self._last_check = now
+                self._thread = threading.Thread(target=self.refresh, name='interval-refresh', daemon=True)
+                self._thread.start()
+        return self.table
+
+    def refresh(self):
+        """Rebuild (or load from the cache) if the replica has new rows; returns True if the table changed"""
+        if not os.path.exists(self.replica_path):
+            return False
+        from replica import SheetReplica
+        replica = SheetReplica(self.replica_path)
+        try:
+            high_water = replica.high_water()
+            if high_water == self.built_at:
+                return False
+            rows = replica.to_dataframe()
+        finally:
+            replica.close()
+        try:
+            self.table = cached_table(self.model, rows, self.cache_dir, method=self.method, workers=self.workers)
+        except ValueError:
+            return False
+        self.built_at = high_water
+        return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prebuild the interval table for a model from the local replica")
+    parser.add_argument('replica', help="SQLite replica file (see replica.py)")
+    parser.add_argument('--model-version', required=True)
+    parser.add_argument('--method', choices=('conformal', 'bootstrap'), default='conformal')
+    parser.add_argument('--cache-dir', default='interval_cache')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    from registry import load_model
+    from replica import SheetReplica
+    model = load_model(args.model_version)
+    replica = SheetReplica(args.replica)
+    try:
+        rows = replica.to_dataframe()
+    finally:
+        replica.close()
+
+    start = time.perf_counter()
+    table = cached_table(model, rows, args.cache_dir, method=args.method, workers=args.workers)
+    print(f"Interval table for {model.version} ({args.method}, {len(table.bounds)} strata) "
+          f"ready in {time.perf_counter() - start:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
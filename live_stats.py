@@ -0,0 +1,151 @@
+import json
+import math
+import os
+import threading
+
+from autosave import Autosave
+
+# Absolute residual histogram: bin i counts residuals with i - 1 < |r| <= i
+HISTOGRAM_BINS = 101  # last bin collects everything above 100 points
+
+# Hit-rate ranges shown per DevT
+ACCURACY_RANGES = (5, 10, 15)
+
+
+class ResidualAccumulator:
+    """Streaming accuracy statistics for actual-vs-predicted pairs
+
+    Keeps Welford moments of the actual values (for r²), running absolute
+    and squared residual sums, and a fixed-bucket histogram of absolute
+    residuals for ±k hit rates. Every update is O(1).
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean_actual = 0.0
+        self.m2_actual = 0.0
+        self.sum_abs = 0.0
+        self.sum_sq = 0.0
+        self.histogram = [0] * HISTOGRAM_BINS
+
+    def update(self, actual, predicted):
+        residual = actual - predicted
+        self.n += 1
+        delta = actual - self.mean_actual
+        self.mean_actual += delta / self.n
+        self.m2_actual += delta * (actual - self.mean_actual)
+        self.sum_abs += abs(residual)
+        self.sum_sq += residual * residual
+        self.histogram[min(HISTOGRAM_BINS - 1, math.ceil(abs(residual)))] += 1
+
+    @property
+    def mae(self):
+        return self.sum_abs / self.n if self.n else 0.0
+
+    @property
+    def rmse(self):
+        return math.sqrt(self.sum_sq / self.n) if self.n else 0.0
+
+    @property
+    def r_squared(self):
+        return 1 - self.sum_sq / self.m2_actual if self.m2_actual > 0 else 0.0
+
+    def hit_rate(self, points):
+        """Percentage of residuals within ±points"""
+        if not self.n:
+            return 0.0
+        return 100.0 * sum(self.histogram[:int(points) + 1]) / self.n
+
+    def to_dict(self):
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data):
+        acc = cls()
+        vars(acc).update(data)
+        return acc
+
+
+class LiveStats:
+    """Overall and per-DevT residual accumulators persisted as JSON
+
+    Until a group has `min_n` live observations, the published fit-time
+    numbers passed in as fallbacks are reported for it instead. Updates are
+    saved in batches of `save_every`, `save_interval` seconds after the
+    first unsaved one, or at exit.
+    """
+
+    def __init__(self, path, min_n=30, save_every=50, save_interval=30.0):
+        self.path = path
+        self.min_n = min_n
+        self.overall = ResidualAccumulator()
+        self.by_dev_trait = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path) as f:
+                data = json.load(f)
+            self.overall = ResidualAccumulator.from_dict(data['overall'])
+            self.by_dev_trait = {
+                dev_trait: ResidualAccumulator.from_dict(acc)
+                for dev_trait, acc in data['by_dev_trait'].items()
+            }
+        self.autosave = Autosave(self.save, every=save_every, interval=save_interval)
+
+    def update(self, dev_trait, actual, predicted):
+        """Record one actual-vs-predicted pair; it is saved with the next batch"""
+        with self._lock:
+            self.overall.update(actual, predicted)
+            self.by_dev_trait.setdefault(dev_trait, ResidualAccumulator()).update(actual, predicted)
+        self.autosave.changed()
+
+    def save(self):
+        """Write the accumulators to `path` now"""
+        with self._lock:
+            data = {
+                'overall': self.overall.to_dict(),
+                'by_dev_trait': {d: acc.to_dict() for d, acc in self.by_dev_trait.items()}
+            }
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+
+    def is_live(self, dev_trait=None):
+        """Whether enough live observations exist to replace the fit-time numbers"""
+        acc = self.overall if dev_trait is None else self.by_dev_trait.get(dev_trait)
+        return acc is not None and acc.n >= self.min_n
+
+    def model_stats(self, fallback, n_params=None):
+        """MODEL_STATS-shaped dict from live residuals, or `fallback`"""
+        if not self.is_live():
+            return fallback
+        acc = self.overall
+        r_squared = acc.r_squared
+        adj_r_squared = r_squared
+        if n_params is not None and acc.n > n_params + 1:
+            adj_r_squared = 1 - (1 - r_squared) * (acc.n - 1) / (acc.n - n_params - 1)
+        return {
+            'r_squared': r_squared,
+            'adj_r_squared': adj_r_squared,
+            'mae': acc.mae,
+            'rmse': acc.rmse,
+            'n': acc.n
+        }
+
+    def devt_accuracy(self, fallback, ranges=ACCURACY_RANGES):
+        """DEVT_ACCURACY-shaped dict, live for each DevT with enough observations"""
+        accuracy = dict(fallback)
+        for dev_trait, acc in self.by_dev_trait.items():
+            if acc.n >= self.min_n:
+                accuracy[dev_trait] = {
+                    'n': acc.n,
+                    'mae': acc.mae,
+                    'ranges': [{'range': r, 'percentage': acc.hit_rate(r)} for r in ranges]
+                }
+        return accuracy
+
+    def hit_rates(self, ranges):
+        """Overall live ±range hit percentages, or None before min_n observations"""
+        if not self.is_live():
+            return None
+        return [self.overall.hit_rate(r) for r in ranges]
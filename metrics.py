@@ -0,0 +1,210 @@
+import bisect
+import contextlib
+import functools
+import json
+import logging
+import logging.handlers
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Prefix for every exported metric name
+NAMESPACE = 'skillpoints'
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus layout"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.start)
+
+
+class Metrics:
+    """Process-wide timing spans and counters
+
+    Disabled by default: span() then returns a shared no-op context manager
+    and incr()/observe() return immediately, so instrumented code pays one
+    attribute check per call.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def incr(self, name, amount=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def span(self, name):
+        """Context manager recording the duration of its block under `name`"""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def timed(self, name):
+        """Decorator form of span()"""
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return fn(*args, **kwargs)
+                start = time.perf_counter()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Plain-dict copy of all counters and histograms"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'histograms': {
+                    name: {'count': h.count, 'sum': h.sum, 'buckets': list(h.counts)}
+                    for name, h in self.histograms.items()
+                }
+            }
+
+    def render_prometheus(self):
+        """All metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in sorted(snapshot['counters'].items()):
+            metric = f'{NAMESPACE}_{name}_total'
+            lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+        for name, h in sorted(snapshot['histograms'].items()):
+            metric = f'{NAMESPACE}_{name}_seconds'
+            lines.append(f'# TYPE {metric} histogram')
+            cumulative = 0
+            for bound, count in zip((*BUCKETS, '+Inf'), h['buckets']):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines += [f'{metric}_sum {h["sum"]}', f'{metric}_count {h["count"]}']
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+# Shared instance used by the instrumented modules
+metrics = Metrics()
+
+
+def serve_prometheus(port, host='0.0.0.0', registry=metrics):
+    """Serve GET /metrics on a daemon thread; returns the server"""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = registry.render_prometheus().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+class MetricsFileWriter(threading.Thread):
+    """Daemon thread appending a JSON snapshot line every `interval` seconds
+
+    The file rotates at `max_bytes`, keeping `backups` old files.
+    """
+
+    def __init__(self, path, interval=15.0, max_bytes=5_000_000, backups=3, registry=metrics):
+        super().__init__(name='metrics-file', daemon=True)
+        self.registry = registry
+        self.interval = interval
+        self._stopping = threading.Event()
+        self._logger = logging.getLogger(f'{__name__}.file.{path}')
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+        self._handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        self._logger.addHandler(self._handler)
+
+    def write_once(self):
+        record = {'timestamp': time.time(), **self.registry.snapshot()}
+        self._logger.info(json.dumps(record))
+
+    def run(self):
+        while not self._stopping.wait(self.interval):
+            self.write_once()
+
+    def stop(self):
+        self._stopping.set()
+        self.join()
+        self.write_once()
+        self._logger.removeHandler(self._handler)
+        self._handler.close()
+
+
+def start_export(mode, port=9464, path='metrics.jsonl', interval=15.0):
+    """Enable the shared metrics and start an exporter: 'prometheus', 'file' or None (disabled)"""
+    if not mode:
+        return None
+    if mode not in ('prometheus', 'file'):
+        raise ValueError(f"Unknown metrics export {mode!r}, expected 'prometheus' or 'file'")
+    if mode == 'prometheus':
+        try:
+            server = serve_prometheus(port)
+        except OSError as e:
+            # Another process (e.g. the other app) holding the port must not take the app down
+            logging.getLogger(__name__).warning("Metrics export disabled: cannot serve on port %s: %s", port, e)
+            return None
+        metrics.enabled = True
+        return server
+    metrics.enabled = True
+    writer = MetricsFileWriter(path, interval=interval)
+    writer.start()
+    return writer
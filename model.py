@@ -0,0 +1,333 @@
+import json
+import os
+
+import numpy as np
+
+# Coaching ability variables in display/bit order
+COACHING_VARS = [
+    'HC_Moti.1',
+    'HC_Moti.2',
+    'OC_Moti.1',
+    'DC_Moti.1',
+    'HC_TD1',
+    'HC_TD2',
+    'HC_TD3',
+    'OC_TD1',
+    'OC_TD2',
+    'OC_TD3',
+    'DC_TD1',
+    'DC_TD2',
+    'DC_TD3'
+]
+
+# Number of distinct coaching staffs (one bit per ability)
+N_STAFF_MASKS = 1 << len(COACHING_VARS)
+
+
+def encode_categories(values, levels):
+    """Map category strings to integer codes, rejecting unknown levels"""
+    index = {level: code for code, level in enumerate(levels)}
+    try:
+        return np.fromiter((index[v] for v in values), dtype=np.intp, count=len(values))
+    except KeyError as e:
+        raise ValueError(f"Unknown category {e.args[0]!r}, expected one of {list(levels)}") from None
+
+
+def staff_mask(coaching_abilities):
+    """Pack a coaching ability dict into a 13-bit mask"""
+    mask = 0
+    for bit, var in enumerate(COACHING_VARS):
+        if coaching_abilities.get(var):
+            mask |= 1 << bit
+    return mask
+
+
+def mask_bits(masks):
+    """Unpack coaching masks into an (n, 13) 0/1 matrix"""
+    masks = np.asarray(masks, dtype=np.int64)
+    return ((masks[..., None] >> np.arange(len(COACHING_VARS))) & 1).astype(np.float64)
+
+
+def coaching_masks(players):
+    """Pack per-row coaching flag columns (e.g. stored submissions) into masks"""
+    masks = np.zeros(len(players[COACHING_VARS[0]]), dtype=np.int64)
+    for bit, var in enumerate(COACHING_VARS):
+        masks |= (_column(players, var).astype(np.int64) != 0).astype(np.int64) << bit
+    return masks
+
+
+def _column(players, name):
+    """Get a column from a DataFrame or a dict of column arrays"""
+    col = players[name]
+    return col.to_numpy() if hasattr(col, 'to_numpy') else np.asarray(col)
+
+
+def _category_codes(players, name, levels):
+    """Integer-code a categorical column, reusing pandas category codes or pre-coded ints"""
+    col = players[name]
+    if hasattr(col, 'cat'):
+        remap = encode_categories(list(col.cat.categories), levels)
+        codes = col.cat.codes.to_numpy()
+        if (codes < 0).any():
+            raise ValueError(f"Missing values in column {name!r}")
+        return remap[codes]
+
+    values = _column(players, name)
+    if np.issubdtype(values.dtype, np.integer):
+        if len(values) and (values.min() < 0 or values.max() >= len(levels)):
+            raise ValueError(f"Codes in column {name!r} out of range for {list(levels)}")
+        return values.astype(np.intp, copy=False)
+    return encode_categories(values, levels)
+
+
+class CompiledModel:
+    """Dummy-coded linear model compiled into flat coefficient and lookup tables
+
+    The coefficient vector follows the design layout
+    [Intercept | positions | years | dev traits | 13 coaching flags | XP_Penalty | interactions],
+    with one column per category level (baselines carry a zero coefficient).
+    Interaction terms (features.FeatureEngine specs) do not fit the lookup
+    tables; they are scored from a sparse design of their active entries.
+    """
+
+    def __init__(self, coefficients, position_coeffs, year_coeffs, dev_trait_coeffs,
+                 floor=None, stats=None, devt_accuracy=None, version=None,
+                 interactions=None, interaction_coeffs=None):
+        self.version = version
+        self.position_levels = list(position_coeffs)
+        self.year_levels = list(year_coeffs)
+        self.dev_trait_levels = list(dev_trait_coeffs)
+        self.coaching_vars = list(COACHING_VARS)
+        self.floor = floor
+        self.stats = stats
+        self.devt_accuracy = devt_accuracy
+
+        # Category-to-column index maps
+        self.position_index = {p: i for i, p in enumerate(self.position_levels)}
+        self.year_index = {y: i for i, y in enumerate(self.year_levels)}
+        self.dev_trait_index = {d: i for i, d in enumerate(self.dev_trait_levels)}
+
+        self.position_start = 1
+        self.year_start = self.position_start + len(self.position_levels)
+        self.dev_trait_start = self.year_start + len(self.year_levels)
+        self.coaching_start = self.dev_trait_start + len(self.dev_trait_levels)
+        self.xp_col = self.coaching_start + len(self.coaching_vars)
+
+        self.interactions = list(interactions or [])
+        self.engine = None
+        interaction_columns = []
+        if self.interactions:
+            from features import FeatureEngine
+            self.engine = FeatureEngine(self.position_levels, self.year_levels, self.dev_trait_levels,
+                                        self.interactions)
+            interaction_columns = self.engine.interaction_columns
+        interaction_coeffs = interaction_coeffs or {}
+        self.interaction_beta = np.array([interaction_coeffs.get(c, 0.0) for c in interaction_columns],
+                                         dtype=np.float64)
+
+        self.columns = (
+            ['Intercept']
+            + [f'position[{p}]' for p in self.position_levels]
+            + [f'year[{y}]' for y in self.year_levels]
+            + [f'dev_trait[{d}]' for d in self.dev_trait_levels]
+            + self.coaching_vars
+            + ['XP_Penalty']
+            + interaction_columns
+        )
+        self.beta = np.ascontiguousarray(np.concatenate([
+            [coefficients['Intercept']],
+            [position_coeffs[p] for p in self.position_levels],
+            [year_coeffs[y] for y in self.year_levels],
+            [dev_trait_coeffs[d] for d in self.dev_trait_levels],
+            [coefficients[var] for var in self.coaching_vars],
+            [coefficients['XP_Penalty']],
+            self.interaction_beta
+        ]), dtype=np.float64)
+
+        # Player effect for every (position, year, dev trait) combination
+        b = self.beta
+        self.base = np.ascontiguousarray(
+            b[0]
+            + b[self.position_start:self.year_start][:, None, None]
+            + b[self.year_start:self.dev_trait_start][None, :, None]
+            + b[self.dev_trait_start:self.coaching_start][None, None, :]
+        )
+        self.xp_coeff = float(b[self.xp_col])
+
+        # Total staff bonus for every 13-bit coaching mask (interactions excluded)
+        coaching_beta = b[self.coaching_start:self.xp_col]
+        self.staff_bonus = np.ascontiguousarray(mask_bits(np.arange(N_STAFF_MASKS)) @ coaching_beta)
+
+    @classmethod
+    def from_vector(cls, beta, position_levels, year_levels, dev_trait_levels, **kwargs):
+        """Build a model from a coefficient vector in design-column order"""
+        beta = [float(b) for b in beta]
+        year_start = 1 + len(position_levels)
+        dev_trait_start = year_start + len(year_levels)
+        coaching_start = dev_trait_start + len(dev_trait_levels)
+        xp_col = coaching_start + len(COACHING_VARS)
+        coefficients = {'Intercept': beta[0], 'XP_Penalty': beta[xp_col]}
+        coefficients.update(zip(COACHING_VARS, beta[coaching_start:xp_col]))
+        if kwargs.get('interactions'):
+            from features import FeatureEngine
+            engine = FeatureEngine(position_levels, year_levels, dev_trait_levels, kwargs['interactions'])
+            kwargs['interaction_coeffs'] = dict(zip(engine.interaction_columns, beta[xp_col + 1:]))
+        return cls(
+            coefficients,
+            dict(zip(position_levels, beta[1:year_start])),
+            dict(zip(year_levels, beta[year_start:dev_trait_start])),
+            dict(zip(dev_trait_levels, beta[dev_trait_start:coaching_start])),
+            **kwargs
+        )
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        """Build a model from its serialized artifact dict"""
+        return cls(
+            artifact['coefficients'],
+            artifact['position_coeffs'],
+            artifact['year_coeffs'],
+            artifact['dev_trait_coeffs'],
+            floor=artifact.get('floor'),
+            stats=artifact.get('stats'),
+            devt_accuracy=artifact.get('devt_accuracy'),
+            version=artifact.get('version'),
+            interactions=artifact.get('interactions'),
+            interaction_coeffs=artifact.get('interaction_coeffs')
+        )
+
+    def to_artifact(self):
+        """Serialize the model to a JSON-compatible dict"""
+        coefficients, position_coeffs, year_coeffs, dev_trait_coeffs = self.coefficient_dicts()
+        artifact = {
+            'version': self.version,
+            'coefficients': coefficients,
+            'position_coeffs': position_coeffs,
+            'year_coeffs': year_coeffs,
+            'dev_trait_coeffs': dev_trait_coeffs,
+            'floor': self.floor,
+            'stats': self.stats,
+            'devt_accuracy': self.devt_accuracy
+        }
+        if self.interactions:
+            artifact['interactions'] = self.interactions
+            artifact['interaction_coeffs'] = dict(zip(self.engine.interaction_columns, self.interaction_beta.tolist()))
+        return artifact
+
+    def coefficient_dicts(self):
+        """Rebuild the (coefficients, position, year, dev trait) coefficient dicts"""
+        b = self.beta.tolist()
+        coefficients = {'Intercept': b[0]}
+        coefficients.update(zip(self.coaching_vars, b[self.coaching_start:self.xp_col]))
+        coefficients['XP_Penalty'] = b[self.xp_col]
+        return (
+            coefficients,
+            dict(zip(self.position_levels, b[self.position_start:self.year_start])),
+            dict(zip(self.year_levels, b[self.year_start:self.dev_trait_start])),
+            dict(zip(self.dev_trait_levels, b[self.dev_trait_start:self.coaching_start]))
+        )
+
+    def predict(self, position, year, dev_trait, xp_penalty, coaching_abilities):
+        """Predict one player's skill points"""
+        prediction = float(self.base[
+            self.position_index[position],
+            self.year_index[year],
+            self.dev_trait_index[dev_trait]
+        ])
+        prediction += self.xp_coeff * xp_penalty
+        mask = staff_mask(coaching_abilities)
+        prediction += float(self.staff_bonus[mask])
+        if self.interactions:
+            for col, value in self.engine.interaction_row(self.position_index[position], self.year_index[year],
+                                                          self.dev_trait_index[dev_trait], xp_penalty, mask):
+                prediction += self.interaction_beta[col] * value
+
+        if self.floor is not None:
+            prediction = max(self.floor, prediction)
+
+        return prediction
+
+    def encode(self, players):
+        """Integer-code the position, year and dev trait columns of a roster"""
+        return (
+            _category_codes(players, 'position', self.position_levels),
+            _category_codes(players, 'year', self.year_levels),
+            _category_codes(players, 'dev_trait', self.dev_trait_levels)
+        )
+
+    def design_matrix(self, players, masks):
+        """Build the one-hot design matrix for a roster
+
+        `masks` is a single coaching mask shared by the roster or one mask per row.
+        """
+        positions, years, dev_traits = self.encode(players)
+        xp_penalty = _column(players, 'xp_penalty').astype(np.float64)
+        masks = np.broadcast_to(np.asarray(masks, dtype=np.int64), positions.shape)
+
+        m = len(positions)
+        X = np.zeros((m, len(self.beta)))
+        rows = np.arange(m)
+        X[:, 0] = 1.0
+        X[rows, self.position_start + positions] = 1.0
+        X[rows, self.year_start + years] = 1.0
+        X[rows, self.dev_trait_start + dev_traits] = 1.0
+        X[:, self.coaching_start:self.xp_col] = mask_bits(masks)
+        X[:, self.xp_col] = xp_penalty
+        if self.interactions:
+            X[:, self.xp_col + 1:] = self.engine.interaction_design(
+                positions, years, dev_traits, xp_penalty, masks).toarray()
+        return X
+
+    def interaction_effect(self, positions, years, dev_traits, xp_penalty, masks):
+        """Summed interaction contributions for rows given as integer codes
+
+        Costs O(active interaction entries); zero for an additive model.
+        """
+        if not self.interactions:
+            return np.zeros(len(positions))
+        return self.engine.interaction_design(positions, years, dev_traits, xp_penalty, masks).dot(self.interaction_beta)
+
+    def base_predictions(self, players):
+        """Per-player predictions before any coaching bonus, interaction or floor"""
+        positions, years, dev_traits = self.encode(players)
+        xp_penalty = _column(players, 'xp_penalty').astype(np.float64)
+        return self.base[positions, years, dev_traits] + self.xp_coeff * xp_penalty
+
+    def predict_batch(self, players, coaching_abilities):
+        """Score a whole roster with table lookups
+
+        `players` is a DataFrame (or dict of arrays) with position, year,
+        dev_trait and xp_penalty columns. Categorical columns may be strings,
+        pandas categoricals or integer codes into the model's level order.
+        `coaching_abilities` is the staff's ability set shared by every player.
+        Equivalent to design_matrix(players, mask) @ beta.
+        """
+        return self.predict_masks(players, staff_mask(coaching_abilities))
+
+    def predict_masks(self, players, masks):
+        """Score a roster with one coaching mask shared by all rows or one mask per row"""
+        predictions = self.base_predictions(players)
+        predictions += self.staff_bonus[masks]
+        if self.interactions:
+            positions, years, dev_traits = self.encode(players)
+            xp_penalty = _column(players, 'xp_penalty').astype(np.float64)
+            predictions += self.interaction_effect(positions, years, dev_traits, xp_penalty, masks)
+
+        if self.floor is not None:
+            np.maximum(predictions, self.floor, out=predictions)
+
+        return predictions
+
+
+def save_artifact(model, path):
+    """Atomically write a model artifact as JSON"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(model.to_artifact(), f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_artifact(path):
+    """Load a model from a JSON artifact"""
+    with open(path) as f:
+        return CompiledModel.from_artifact(json.load(f))
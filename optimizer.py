@@ -0,0 +1,150 @@
+import itertools
+
+import numpy as np
+
+from model import COACHING_VARS
+
+# Abilities each coach can hold
+COACH_ABILITIES = {
+    'HC': ['HC_Moti.1', 'HC_Moti.2', 'HC_TD1', 'HC_TD2', 'HC_TD3'],
+    'OC': ['OC_Moti.1', 'OC_TD1', 'OC_TD2', 'OC_TD3'],
+    'DC': ['DC_Moti.1', 'DC_TD1', 'DC_TD2', 'DC_TD3']
+}
+
+# Ability families, for constraints like "OC has Talent Developer only"
+ABILITY_FAMILIES = {
+    'Motivator': 'Moti',
+    'Talent Developer': 'TD'
+}
+
+# Higher tiers require the tier below them
+TIER_PREREQUISITES = {
+    'HC_Moti.2': 'HC_Moti.1',
+    'HC_TD2': 'HC_TD1',
+    'HC_TD3': 'HC_TD2',
+    'OC_TD2': 'OC_TD1',
+    'OC_TD3': 'OC_TD2',
+    'DC_TD2': 'DC_TD1',
+    'DC_TD3': 'DC_TD2'
+}
+
+BIT = {var: 1 << i for i, var in enumerate(COACHING_VARS)}
+
+
+def family_abilities(coach, family):
+    """A coach's abilities belonging to one family ('Motivator' or 'Talent Developer')"""
+    tag = ABILITY_FAMILIES[family]
+    return [var for var in COACH_ABILITIES[coach] if var.split('_', 1)[1].startswith(tag)]
+
+
+def mask_abilities(mask):
+    """Expand a coaching mask into a coaching_abilities dict"""
+    return {var: bool(mask & BIT[var]) for var in COACHING_VARS}
+
+
+def coach_options(coach, allowed=None, required=(), max_abilities=None, tiered=True):
+    """Feasible ability sub-masks for one coach under its constraints"""
+    abilities = [var for var in COACH_ABILITIES[coach] if allowed is None or var in allowed]
+    options = []
+    for r in range(len(abilities) + 1):
+        if max_abilities is not None and r > max_abilities:
+            break
+        for combo in itertools.combinations(abilities, r):
+            chosen = set(combo)
+            if not chosen.issuperset(required):
+                continue
+            if tiered and any(TIER_PREREQUISITES.get(var, var) not in chosen for var in chosen):
+                continue
+            options.append(sum(BIT[var] for var in combo))
+    return options
+
+
+def feasible_masks(constraints=None, tiered=True):
+    """All staff masks satisfying per-coach constraints
+
+    `constraints` maps 'HC'/'OC'/'DC' to dicts with optional 'allowed',
+    'required' and 'max_abilities' keys. Each coach is pruned on its own
+    before combining, so infeasible staffs are never materialized.
+    """
+    constraints = constraints or {}
+    masks = np.zeros(1, dtype=np.int64)
+    for coach in COACH_ABILITIES:
+        options = np.array(coach_options(coach, tiered=tiered, **constraints.get(coach, {})), dtype=np.int64)
+        masks = (masks[:, None] | options[None, :]).ravel()
+    return masks
+
+
+def roster_totals(model, base, masks):
+    """Total predicted roster skill points for each staff mask
+
+    Without a floor the total is sum(base) + n * bonus. With app.py's floor,
+    players are sorted once and each staff's cutoff is found by binary
+    search, so scoring costs O(masks * log n) instead of O(masks * n).
+    """
+    bonus = model.staff_bonus[masks]
+    n = len(base)
+    if model.floor is None:
+        return base.sum() + n * bonus
+
+    ordered = np.sort(base)
+    suffix = np.concatenate([np.cumsum(ordered[::-1])[::-1], [0.0]])
+    # Players with base + bonus > floor keep their prediction; the rest sit at the floor
+    cut = np.searchsorted(ordered, model.floor - bonus, side='right')
+    above = n - cut
+    return suffix[cut] + above * bonus + cut * model.floor
+
+
+def interaction_totals(model, roster, masks, block_masks=256):
+    """Exact roster totals for a model with interaction terms
+
+    Interactions tie a player's bonus to both the staff and the player, so
+    the sorted-cutoff shortcut no longer applies: every (staff, player)
+    pair is scored, in blocks of `block_masks` staffs.
+    """
+    positions, years, dev_traits = model.encode(roster)
+    xp_penalty = np.asarray(roster['xp_penalty'], dtype=np.float64)
+    base = model.base_predictions(roster)
+    n = len(base)
+    totals = np.empty(len(masks))
+    for start in range(0, len(masks), block_masks):
+        block = masks[start:start + block_masks]
+        pair_masks = np.repeat(block, n)
+        effect = model.interaction_effect(np.tile(positions, len(block)), np.tile(years, len(block)),
+                                          np.tile(dev_traits, len(block)), np.tile(xp_penalty, len(block)),
+                                          pair_masks).reshape(len(block), n)
+        points = base[None, :] + model.staff_bonus[block][:, None] + effect
+        if model.floor is not None:
+            np.maximum(points, model.floor, out=points)
+        totals[start:start + len(block)] = points.sum(axis=1)
+    return totals
+
+
+def optimize_staff(model, roster, constraints=None, top_k=5, tiered=True):
+    """Find the coaching ability sets that maximize total predicted roster skill points
+
+    Returns up to `top_k` dicts, best first, with the staff's abilities,
+    total predicted points and gain over a staff with no abilities.
+    """
+    masks = feasible_masks(constraints, tiered=tiered)
+    if model.interactions:
+        totals = interaction_totals(model, roster, masks)
+        baseline = interaction_totals(model, roster, np.zeros(1, dtype=np.int64))[0]
+    else:
+        base = model.base_predictions(roster)
+        totals = roster_totals(model, base, masks)
+        baseline = roster_totals(model, base, np.zeros(1, dtype=np.int64))[0]
+
+    k = min(top_k, len(masks))
+    if k == 0:
+        return []
+    best = np.argpartition(-totals, k - 1)[:k]
+    best = best[np.argsort(-totals[best], kind='stable')]
+    return [
+        {
+            'mask': int(masks[i]),
+            'abilities': [var for var in COACHING_VARS if masks[i] & BIT[var]],
+            'total': float(totals[i]),
+            'gain': float(totals[i] - baseline)
+        }
+        for i in best
+    ]
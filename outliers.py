@@ -0,0 +1,246 @@
+"""Streaming outlier screen for submissions on their way into training
+
+Each new residual (actual - predicted) is scored against robust running
+statistics of its DevT x position stratum: the median and MAD, read off a
+fixed-bin residual histogram. Scoring and updating cost a bounded scan of
+N_BINS counts plus one small SQLite upsert, whatever the number of
+submissions, so the training data stays clean as it arrives instead of
+needing an offline outlier pass.
+
+Strata with fewer than `min_n` residuals borrow the pooled DevT, then the
+overall statistics. Every residual, outlier or not, updates the histograms;
+median and MAD are robust to the outliers they let in.
+
+    python outliers.py outliers_v4.0.db              # list quarantined submissions
+    python outliers.py outliers_v4.0.db --release 12
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+from metrics import metrics
+
+# Residual histogram: BIN_WIDTH-point bins over ±RESIDUAL_RANGE, the end bins collect everything beyond
+BIN_WIDTH = 0.5
+RESIDUAL_RANGE = 100.0
+N_BINS = int(2 * RESIDUAL_RANGE / BIN_WIDTH) + 1
+
+# Robust z-score |0.6745 (r - median) / MAD| above which a residual is an outlier (Iglewicz & Hoaglin)
+THRESHOLD = 3.5
+MAD_SCALE = 0.6745
+
+# Stratum key used for pooling over a category
+ALL = '*'
+
+
+class RobustHistogram:
+    """Residual counts in fixed bins, with median and MAD to within one bin"""
+
+    def __init__(self):
+        self.counts = [0] * N_BINS
+        self.n = 0
+
+    @staticmethod
+    def bin(residual):
+        return min(N_BINS - 1, max(0, round((residual + RESIDUAL_RANGE) / BIN_WIDTH)))
+
+    def add(self, residual, count=1):
+        self.counts[self.bin(residual)] += count
+        self.n += count
+
+    def _median_bin(self):
+        target = (self.n + 1) / 2
+        cumulative = 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return i
+        return N_BINS - 1
+
+    def median(self):
+        return self._median_bin() * BIN_WIDTH - RESIDUAL_RANGE
+
+    def mad(self):
+        """Median absolute deviation from the median, at least one bin wide"""
+        center = self._median_bin()
+        target = (self.n + 1) / 2
+        total = self.counts[center]
+        distance = 0
+        while total < target and distance < N_BINS:
+            distance += 1
+            if center - distance >= 0:
+                total += self.counts[center - distance]
+            if center + distance < N_BINS:
+                total += self.counts[center + distance]
+        return max(distance, 1) * BIN_WIDTH
+
+
+class OutlierFilter:
+    """Ingest-time outlier screen with a quarantine, persisted in SQLite
+
+    With action='quarantine', admit() returns False for an outlier, and the
+    submission is held in the quarantine table instead of reaching the
+    retrainer. With action='flag', outliers are logged there but still
+    admitted.
+    """
+
+    def __init__(self, path, threshold=THRESHOLD, min_n=30, action='quarantine'):
+        if action not in ('quarantine', 'flag'):
+            raise ValueError(f"Unknown outlier action {action!r}, expected 'quarantine' or 'flag'")
+        self.path = path
+        self.threshold = threshold
+        self.min_n = min_n
+        self.action = action
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS residual_bins ('
+                               'dev_trait TEXT, position TEXT, bin INTEGER, count INTEGER NOT NULL, '
+                               'PRIMARY KEY (dev_trait, position, bin))')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS quarantine ('
+                               'id INTEGER PRIMARY KEY, created REAL NOT NULL, dev_trait TEXT, position TEXT, '
+                               'residual REAL, score REAL, record TEXT NOT NULL, actual_points REAL, '
+                               'released INTEGER NOT NULL DEFAULT 0)')
+        self.histograms = {}
+        for dev_trait, position, index, count in self._conn.execute('SELECT * FROM residual_bins'):
+            histogram = self.histograms.setdefault((dev_trait, position), RobustHistogram())
+            histogram.counts[index] = count
+            histogram.n += count
+
+    def _strata(self, dev_trait, position):
+        return ((dev_trait, position), (dev_trait, ALL), (ALL, ALL))
+
+    def score(self, dev_trait, position, residual):
+        """Robust z-score of a residual, or None while every stratum it pools into is below min_n"""
+        for key in self._strata(dev_trait, position):
+            histogram = self.histograms.get(key)
+            if histogram is not None and histogram.n >= self.min_n:
+                return MAD_SCALE * (residual - histogram.median()) / histogram.mad()
+        return None
+
+    def admit(self, record, actual_points):
+        """Score one submission (prediction inputs + prediction) and update the statistics
+
+        Returns False when the submission is quarantined, True otherwise.
+        """
+        dev_trait, position = record['dev_trait'], record['position']
+        residual = actual_points - record['prediction']
+        index = RobustHistogram.bin(residual)
+        with self._lock:
+            score = self.score(dev_trait, position, residual)
+            outlier = score is not None and abs(score) > self.threshold
+            strata = self._strata(dev_trait, position)
+            for key in strata:
+                self.histograms.setdefault(key, RobustHistogram()).add(residual)
+            with self._conn:
+                self._conn.executemany(
+                    'INSERT INTO residual_bins VALUES (?, ?, ?, 1) '
+                    'ON CONFLICT (dev_trait, position, bin) DO UPDATE SET count = count + 1',
+                    [(*key, index) for key in strata]
+                )
+                if outlier:
+                    self._conn.execute(
+                        'INSERT INTO quarantine (created, dev_trait, position, residual, score, record, actual_points) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                        (time.time(), dev_trait, position, residual, score, json.dumps(record), actual_points)
+                    )
+        if not outlier:
+            return True
+        metrics.incr('outlier_submissions')
+        return self.action != 'quarantine'
+
+    def quarantined(self, include_released=False):
+        """Quarantined submissions as dicts, oldest first"""
+        query = 'SELECT * FROM quarantine'
+        if not include_released:
+            query += ' WHERE released = 0'
+        cur = self._conn.execute(query + ' ORDER BY id')
+        names = [d[0] for d in cur.description]
+        rows = []
+        for values in cur:
+            row = dict(zip(names, values))
+            row['record'] = json.loads(row['record'])
+            rows.append(row)
+        return rows
+
+    def release(self, quarantine_id):
+        """Mark a quarantined submission as a false positive; returns (record, actual_points) to train on"""
+        with self._lock, self._conn:
+            row = self._conn.execute('SELECT record, actual_points FROM quarantine WHERE id = ? AND released = 0',
+                                     (quarantine_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No quarantined submission with id {quarantine_id}")
+            self._conn.execute('UPDATE quarantine SET released = 1 WHERE id = ?', (quarantine_id,))
+        return json.loads(row[0]), row[1]
+
+    def screen(self, rows, model):
+        """Stored submissions (dicts with SUBMISSION_COLUMNS, e.g. replica rows) that pass this screen
+
+        For backfilling a retrainer. Rows matching a submission still in
+        quarantine are dropped, and the rest are scored against the current
+        statistics using `model`'s predictions. Nothing is updated, since
+        the live path already counted the rows it saw. Rows with categories
+        the model does not know pass unscored.
+        """
+        from dedupe import submission_key
+        from model import COACHING_VARS
+        from sheets import SUBMISSION_COLUMNS
+        from storage import submission_row
+
+        held = {submission_key(submission_row(row['record'], row['actual_points'])) for row in self.quarantined()}
+        for row in rows:
+            if submission_key([row[name] for name in SUBMISSION_COLUMNS]) in held:
+                continue
+            try:
+                predicted = model.predict(row['position'], row['year'], row['dev_trait'], row['xp_penalty'],
+                                          {var: row[var] for var in COACHING_VARS})
+            except KeyError:
+                yield row
+                continue
+            score = self.score(row['dev_trait'], row['position'], row['actual_points'] - predicted)
+            if self.action == 'quarantine' and score is not None and abs(score) > self.threshold:
+                continue
+            yield row
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM quarantine WHERE released = 0').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Review submissions quarantined as outliers")
+    parser.add_argument('path', help="Outlier filter database (see OutlierFilter)")
+    parser.add_argument('--release', type=int, nargs='*', default=[], metavar='ID',
+                        help="Release these submissions, optionally into a retrainer")
+    parser.add_argument('--retrain-state', help="OnlineTrainer state file to add released submissions to")
+    parser.add_argument('--model-version', default='v4.0', help="Base model of the retrainer")
+    args = parser.parse_args()
+
+    outliers = OutlierFilter(args.path)
+    trainer = None
+    if args.release and args.retrain_state:
+        from registry import load_model
+        from retrain import OnlineTrainer
+        trainer = OnlineTrainer(args.retrain_state, load_model(args.model_version))
+
+    for quarantine_id in args.release:
+        record, actual_points = outliers.release(quarantine_id)
+        if trainer is not None:
+            trainer.add(record, actual_points)
+        print(f"Released #{quarantine_id} ({record['player_name'] or 'unnamed'})")
+
+    for row in outliers.quarantined():
+        record = row['record']
+        print(f"#{row['id']:<5} {record['dev_trait']:6} {record['position']:5} "
+              f"predicted {record['prediction']:6.1f}  actual {row['actual_points']:6.1f}  "
+              f"z {row['score']:+6.1f}  {record['player_name']}")
+
+
+if __name__ == '__main__':
+    main()
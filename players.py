@@ -0,0 +1,232 @@
+"""Player identity index over previously submitted team/player pairs
+
+Keeps sorted arrays of normalized team names and (team, player) keys, so
+autocomplete is a binary search plus a short scan of the matching run.
+Each player's submissions are kept in sheet-row order, giving the last known
+position/year/DevT for prefilling the form and a season-over-season
+history of predicted vs actual points.
+
+The index fills from the local replica (replica.py) and refreshes
+incrementally from its sheet-row high-water mark. Submissions made by this
+process are added straight away and ordered after every synced row; when
+one comes back through the replica it takes that row's place, so history
+order never depends on whether the replica was read before or after.
+
+    python players.py submissions_replica.db "ohio st"
+"""
+import argparse
+import bisect
+import math
+import os
+import threading
+import time
+
+from dedupe import submission_key
+from model import COACHING_VARS
+from sheets import SUBMISSION_COLUMNS
+
+# Fields copied into the predictor form from a player's latest submission
+PREFILL_FIELDS = ('position', 'year', 'dev_trait', 'xp_penalty', 'snaps')
+
+# Seconds between replica checks
+REFRESH_INTERVAL = 30.0
+
+# Sorts after every character a name can contain, to bound a prefix range
+_HIGH = '\U0010ffff'
+
+# Sheet row of a submission not yet seen in the replica; sorts after every synced one
+PENDING = math.inf
+
+
+def normalize(name):
+    """Canonical form of a team or player name for matching"""
+    return ' '.join(str(name).split()).casefold()
+
+
+class PlayerIndex:
+    """Sorted prefix index of submitted players and their submission history
+
+    `replica_path` is opened on the first refresh after the file exists,
+    so an index made before the first sync picks the replica up later.
+    """
+
+    def __init__(self, replica_path=None, refresh_interval=REFRESH_INTERVAL):
+        self.replica_path = replica_path
+        self.refresh_interval = refresh_interval
+        self.high_water = 0
+        self._replica = None
+        self._last_refresh = None
+        self._teams = []        # sorted normalized team names
+        self._players = []      # sorted (team, player) normalized keys
+        self._by_player = []    # sorted (player, team) normalized keys
+        self._team_names = {}   # normalized team -> latest spelling
+        self._records = {}      # (team, player) -> {'team', 'player_name', 'history'}
+        self._keys = {}         # content key -> (record, history entry)
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, row):
+        """Add one submission (a dict with SUBMISSION_COLUMNS, plus 'sheet_row' once synced)
+
+        Returns False for one already indexed. A synced copy of a pending
+        submission moves it to its sheet row.
+        """
+        key = submission_key([row[name] for name in SUBMISSION_COLUMNS])
+        team, player = normalize(row['team']), normalize(row['player_name'])
+        if not team or not player:
+            return False
+        sheet_row = row.get('sheet_row') or PENDING
+        with self._lock:
+            if key in self._keys:
+                record, entry = self._keys[key]
+                if entry['sheet_row'] == PENDING and sheet_row != PENDING:
+                    entry['sheet_row'] = sheet_row
+                    record['history'].sort(key=lambda e: e['sheet_row'])
+                return False
+            identity = (team, player)
+            record = self._records.get(identity)
+            if record is None:
+                record = self._records[identity] = {'history': []}
+                bisect.insort(self._players, identity)
+                bisect.insort(self._by_player, (player, team))
+                if team not in self._team_names:
+                    bisect.insort(self._teams, team)
+            entry = {name: row[name] for name in SUBMISSION_COLUMNS}
+            entry['sheet_row'] = sheet_row
+            history = record['history']
+            # Stable: pending submissions keep the order they were made in
+            history.insert(bisect.bisect_right([e['sheet_row'] for e in history], sheet_row), entry)
+            self._keys[key] = (record, entry)
+            if history[-1] is entry:
+                record['team'] = self._team_names[team] = str(row['team']).strip()
+                record['player_name'] = str(row['player_name']).strip()
+        return True
+
+    def add_submission(self, prediction_data, actual_points):
+        """Add a submission made by this process (the save path's prediction_data)"""
+        from storage import DEV_TRAIT_NUM
+        return self.add(dict(prediction_data, actual_points=actual_points,
+                             dev_trait_num=DEV_TRAIT_NUM[prediction_data['dev_trait']]))
+
+    def refresh(self, force=False):
+        """Index replica rows past the high-water mark; returns the number of new submissions"""
+        now = time.monotonic()
+        if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+            return 0
+        # Another session already refreshing is as good as refreshing here
+        if not self._refresh_lock.acquire(blocking=force):
+            return 0
+        try:
+            self._last_refresh = now
+            if self._replica is None:
+                if self.replica_path is None or not os.path.exists(self.replica_path):
+                    return 0
+                from replica import SheetReplica
+                self._replica = SheetReplica(self.replica_path)
+
+            added = 0
+            for row in self._replica.iter_rows(after=self.high_water):
+                added += self.add(row)
+                self.high_water = row['sheet_row']
+            return added
+        finally:
+            self._refresh_lock.release()
+
+    def _names(self, pairs):
+        return [(self._records[pair]['team'], self._records[pair]['player_name']) for pair in pairs]
+
+    def complete_team(self, prefix, limit=10):
+        """Known team names starting with `prefix`, alphabetically"""
+        prefix = normalize(prefix)
+        with self._lock:
+            start = bisect.bisect_left(self._teams, prefix)
+            stop = bisect.bisect_left(self._teams, prefix + _HIGH, lo=start)
+            return [self._team_names[team] for team in self._teams[start:min(stop, start + limit)]]
+
+    def complete_player(self, prefix, team=None, limit=10):
+        """(team, player_name) pairs whose player name starts with `prefix`, within `team` if given"""
+        prefix = normalize(prefix)
+        with self._lock:
+            if team:
+                team = normalize(team)
+                start = bisect.bisect_left(self._players, (team, prefix))
+                stop = bisect.bisect_left(self._players, (team, prefix + _HIGH), lo=start)
+                return self._names(self._players[start:min(stop, start + limit)])
+            start = bisect.bisect_left(self._by_player, (prefix,))
+            stop = bisect.bisect_left(self._by_player, (prefix + _HIGH,), lo=start)
+            return self._names([(team, player) for player, team in self._by_player[start:min(stop, start + limit)]])
+
+    def _record(self, team, player_name):
+        return self._records.get((normalize(team), normalize(player_name)))
+
+    def last_known(self, team, player_name):
+        """The player's latest position, year, DevT, XP penalty and snaps, or None if never submitted"""
+        with self._lock:
+            record = self._record(team, player_name)
+            if record is None:
+                return None
+            latest = record['history'][-1]
+            return {name: latest[name] for name in PREFILL_FIELDS}
+
+    def history(self, team, player_name, model=None):
+        """One entry per submission in sheet-row order (season 1, 2, ...) with actual and predicted points
+
+        The sheet does not store the prediction shown at submit time, so
+        `predicted` is `model`'s prediction for the stored inputs (None
+        without a model or for categories the model does not know).
+        """
+        with self._lock:
+            record = self._record(team, player_name)
+            rows = list(record['history']) if record is not None else []
+        timeline = []
+        for season, row in enumerate(rows, start=1):
+            predicted = None
+            if model is not None and (row['position'] in model.position_index and row['year'] in model.year_index
+                                      and row['dev_trait'] in model.dev_trait_index):
+                predicted = model.predict(row['position'], row['year'], row['dev_trait'], row['xp_penalty'],
+                                          {var: row[var] for var in COACHING_VARS})
+            timeline.append({
+                'season': season,
+                'year': row['year'],
+                'position': row['position'],
+                'dev_trait': row['dev_trait'],
+                'predicted': predicted,
+                'actual': row['actual_points']
+            })
+        return timeline
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up previously submitted players")
+    parser.add_argument('replica', help="SQLite replica file (see replica.py)")
+    parser.add_argument('prefix', help="Start of a player name")
+    parser.add_argument('--team', help="Only players of this team")
+    parser.add_argument('--model-version', help="Show this model's predictions in the history")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = PlayerIndex(args.replica)
+    index.refresh(force=True)
+    print(f"Indexed {len(index)} players in {time.perf_counter() - start:.2f}s")
+
+    model = None
+    if args.model_version:
+        from registry import load_model
+        model = load_model(args.model_version)
+
+    start = time.perf_counter()
+    matches = index.complete_player(args.prefix, team=args.team)
+    print(f"{len(matches)} matches in {(time.perf_counter() - start) * 1e6:.0f} us")
+    for team, player_name in matches:
+        print(f"{player_name} ({team}): last known {index.last_known(team, player_name)}")
+        for entry in index.history(team, player_name, model):
+            predicted = '-' if entry['predicted'] is None else f"{entry['predicted']:.1f}"
+            print(f"  season {entry['season']}: {entry['year']} {entry['dev_trait']} "
+                  f"predicted {predicted}, actual {entry['actual']}")
+
+
+if __name__ == '__main__':
+    main()
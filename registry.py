@@ -0,0 +1,56 @@
+import functools
+import os
+
+import numpy as np
+
+from model import load_artifact, staff_mask
+
+# Directory of serialized model artifacts, one <version>.json per model
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+
+def available_versions(model_dir=MODEL_DIR):
+    """Versions that have an artifact in the registry"""
+    return sorted(name[:-len('.json')] for name in os.listdir(model_dir) if name.endswith('.json'))
+
+
+@functools.lru_cache(maxsize=None)
+def load_model(version, model_dir=MODEL_DIR):
+    """Load and compile a model version on first use, memoized per process"""
+    path = os.path.join(model_dir, f'{version}.json')
+    if not os.path.exists(path):
+        raise KeyError(f"Unknown model version {version!r}, expected one of {available_versions(model_dir)}")
+    return load_artifact(path)
+
+
+def known_rows(model, players):
+    """Boolean mask of rows whose categories all exist in the model"""
+    return (
+        np.isin(np.asarray(players['position']), model.position_levels)
+        & np.isin(np.asarray(players['year']), model.year_levels)
+        & np.isin(np.asarray(players['dev_trait']), model.dev_trait_levels)
+    )
+
+
+def shadow_score(players, versions, coaching_abilities=None, masks=None, model_dir=MODEL_DIR):
+    """Score the same players under several model versions for side-by-side comparison
+
+    Pass either one staff's `coaching_abilities` or per-row coaching `masks`.
+    Returns {version: predictions}; rows with a position or year a version
+    does not model (e.g. DT, SR (RS)) score NaN for that version.
+    """
+    if masks is None:
+        masks = staff_mask(coaching_abilities or {})
+    n = len(players['position'])
+    masks = np.broadcast_to(np.asarray(masks, dtype=np.int64), (n,))
+
+    scores = {}
+    for version in versions:
+        model = load_model(version, model_dir)
+        known = known_rows(model, players)
+        predictions = np.full(n, np.nan)
+        if known.any():
+            subset = {name: np.asarray(players[name])[known] for name in ('position', 'year', 'dev_trait', 'xp_penalty')}
+            predictions[known] = model.predict_masks(subset, masks[known])
+        scores[version] = predictions
+    return scores
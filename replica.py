@@ -0,0 +1,259 @@
+"""Local SQLite replica of the submissions worksheet
+
+Each sync reads only the rows appended since the last one, using ranged
+reads from the stored high-water mark. Analysis code should read from the
+replica instead of the Sheets API.
+
+    python replica.py submissions_replica.db --credentials service_account.json
+"""
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+from dedupe import submission_key
+from sheets import LAST_COLUMN, SUBMISSION_COLUMNS, open_worksheet
+
+# Columns stored as integers; the rest are text
+INTEGER_COLUMNS = set(SUBMISSION_COLUMNS) - {'team', 'player_name', 'position', 'year', 'dev_trait'}
+
+# Rows fetched per ranged read
+SYNC_CHUNK_ROWS = 1000
+
+# Seconds between background syncs, and before the first one
+SYNC_INTERVAL = 60.0
+SYNC_START_DELAY = 5.0
+
+# Version of the duplicate rule recorded in sync_state; older replicas are re-deduplicated on open
+DEDUPE_RULE = 'identified'
+
+_TEAM = SUBMISSION_COLUMNS.index('team')
+_PLAYER = SUBMISSION_COLUMNS.index('player_name')
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _parse_row(values):
+    """Convert raw sheet cells into typed column values, or None for headers/blank rows"""
+    if not any(v not in ('', None) for v in values):
+        return None
+    values = list(values) + [''] * (len(SUBMISSION_COLUMNS) - len(values))
+    parsed = []
+    for name, value in zip(SUBMISSION_COLUMNS, values):
+        if name in INTEGER_COLUMNS:
+            if value in ('', None):
+                value = 0
+            try:
+                value = int(float(value))
+            except (TypeError, ValueError):
+                return None
+        else:
+            value = '' if value is None else str(value)
+        parsed.append(value)
+    return parsed
+
+
+def _identified(values):
+    """True if a parsed row names its team and player
+
+    The sheet records no session, so anonymous rows with equal content may
+    be different people's submissions and are never treated as duplicates.
+    """
+    return bool(str(values[_TEAM]).strip() and str(values[_PLAYER]).strip())
+
+
+class SheetReplica:
+    """SQLite mirror of the submissions worksheet keyed by sheet row number
+
+    Rows that name a team and player and repeat an earlier row's content
+    (same submission_key) are not mirrored, so double submissions already
+    in the sheet never reach training or analysis. Rows with a blank team
+    or player are always kept. Replicas deduplicated under an older rule
+    are cleaned up once when opened and re-read from the first sheet row,
+    which brings back anonymous rows that rule removed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        columns = ', '.join(
+            f"{_quote(name)} {'INTEGER' if name in INTEGER_COLUMNS else 'TEXT'}"
+            for name in SUBMISSION_COLUMNS
+        )
+        with self._conn:
+            self._conn.execute(f'CREATE TABLE IF NOT EXISTS submissions (sheet_row INTEGER PRIMARY KEY, {columns})')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT)')
+            self._conn.execute('CREATE TABLE IF NOT EXISTS content_keys (key BLOB PRIMARY KEY, sheet_row INTEGER NOT NULL)')
+        self._keys = dict(self._conn.execute('SELECT key, sheet_row FROM content_keys'))  # key -> first sheet row
+        self.duplicates = 0
+        rule = self._conn.execute("SELECT value FROM sync_state WHERE key = 'dedupe_rule'").fetchone()
+        if rule is None or rule[0] != DEDUPE_RULE:
+            resync = bool(self._keys)
+            if len(self):
+                self.dedupe()
+            with self._conn:
+                if resync:
+                    self._conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('high_water', '0')")
+                self._conn.execute("INSERT OR REPLACE INTO sync_state VALUES ('dedupe_rule', ?)", (DEDUPE_RULE,))
+
+    def dedupe(self):
+        """Rebuild the content keys, deleting every identified row that repeats an earlier one; returns rows removed"""
+        keys = {}
+        duplicate_rows = []
+        for row in self.iter_rows():
+            values = [row[name] for name in SUBMISSION_COLUMNS]
+            if not _identified(values):
+                continue
+            key = submission_key(values)
+            if key in keys:
+                duplicate_rows.append((row['sheet_row'],))
+            else:
+                keys[key] = row['sheet_row']
+        with self._lock, self._conn:
+            self._conn.execute('DELETE FROM content_keys')
+            self._conn.executemany('INSERT INTO content_keys VALUES (?, ?)', keys.items())
+            self._conn.executemany('DELETE FROM submissions WHERE sheet_row = ?', duplicate_rows)
+        self._keys = keys
+        self.duplicates += len(duplicate_rows)
+        return len(duplicate_rows)
+
+    def high_water(self):
+        """Last sheet row number that has been mirrored"""
+        row = self._conn.execute("SELECT value FROM sync_state WHERE key = 'high_water'").fetchone()
+        return int(row[0]) if row else 0
+
+    def sync(self, sheet, chunk_rows=SYNC_CHUNK_ROWS):
+        """Fetch rows appended since the last sync; returns the number of rows stored"""
+        placeholders = ', '.join('?' * (len(SUBMISSION_COLUMNS) + 1))
+        insert = f'INSERT OR REPLACE INTO submissions VALUES ({placeholders})'
+        stored = 0
+
+        with self._lock:
+            while True:
+                first = self.high_water() + 1
+                last = first + chunk_rows - 1
+                values = sheet.get(f'A{first}:{LAST_COLUMN}{last}', value_render_option='UNFORMATTED_VALUE')
+                if not values:
+                    break
+
+                rows = []
+                keys = []
+                for offset, raw in enumerate(values):
+                    parsed = _parse_row(raw)
+                    if parsed is None:
+                        continue
+                    if _identified(parsed):
+                        key = submission_key(parsed)
+                        seen = self._keys.get(key)
+                        if seen is not None:
+                            # A re-read of the row that owns the key is not a duplicate
+                            self.duplicates += seen != first + offset
+                            continue
+                        self._keys[key] = first + offset
+                        keys.append((key, first + offset))
+                    rows.append([first + offset] + parsed)
+
+                with self._conn:
+                    self._conn.executemany(insert, rows)
+                    self._conn.executemany('INSERT OR REPLACE INTO content_keys VALUES (?, ?)', keys)
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO sync_state VALUES ('high_water', ?)",
+                        (str(first + len(values) - 1),)
+                    )
+                stored += len(rows)
+
+                if len(values) < chunk_rows:
+                    break
+
+        return stored
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM submissions').fetchone()[0]
+
+    def iter_rows(self, batch_size=5000, after=0):
+        """Yield submissions as dicts in sheet order, optionally only those past sheet row `after`"""
+        cur = self._conn.execute('SELECT * FROM submissions WHERE sheet_row > ? ORDER BY sheet_row', (after,))
+        names = [d[0] for d in cur.description]
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            for row in batch:
+                yield dict(zip(names, row))
+
+    def to_dataframe(self):
+        """Load the replica into a pandas DataFrame"""
+        import pandas as pd
+        return pd.read_sql('SELECT * FROM submissions ORDER BY sheet_row', self._conn)
+
+    def close(self):
+        self._conn.close()
+
+
+class ReplicaSyncer(threading.Thread):
+    """Daemon thread that syncs the replica from the storage backend every `interval` seconds
+
+    `get_sheet` returns the worksheet (or backend) to read from. The first
+    sync waits `start_delay` seconds, keeping the Sheets client import off
+    the app's first render. A failed sync is kept in `last_error` and
+    retried on the next interval.
+    """
+
+    def __init__(self, path, get_sheet, interval=SYNC_INTERVAL, start_delay=SYNC_START_DELAY):
+        super().__init__(name='replica-sync', daemon=True)
+        self.path = path
+        self.get_sheet = get_sheet
+        self.interval = interval
+        self.start_delay = start_delay
+        self.last_sync = None
+        self.last_error = None
+        self._replica = None
+        self._stopping = threading.Event()
+
+    def sync_once(self):
+        """Sync now on the calling thread; returns the number of rows stored"""
+        if self._replica is None:
+            self._replica = SheetReplica(self.path)
+        stored = self._replica.sync(self.get_sheet())
+        self.last_sync = time.time()
+        return stored
+
+    def run(self):
+        if self._stopping.wait(self.start_delay):
+            return
+        while True:
+            try:
+                self.sync_once()
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+            if self._stopping.wait(self.interval):
+                return
+
+    def stop(self, timeout=None):
+        self._stopping.set()
+        self.join(timeout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incrementally sync the submissions sheet to a local replica")
+    parser.add_argument('path', help="SQLite replica file")
+    parser.add_argument('--credentials', required=True, help="Service account JSON key file")
+    args = parser.parse_args()
+
+    with open(args.credentials) as f:
+        sheet = open_worksheet(json.load(f))
+
+    replica = SheetReplica(args.path)
+    stored = replica.sync(sheet)
+    print(f"Synced {stored} new rows, skipped {replica.duplicates} duplicates "
+          f"({len(replica)} total, high-water row {replica.high_water()})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,235 @@
+import json
+import os
+import threading
+
+import numpy as np
+
+from autosave import Autosave
+from features import FeatureEngine
+from model import CompiledModel, save_artifact, staff_mask
+
+
+class SufficientStats:
+    """Running X'X, X'y and y'y for the dummy-coded skill points design
+
+    The design matches the published models: Intercept, position/year/DevT
+    dummies (the first level of each is the baseline), the 13 coaching flags
+    and XP_Penalty, then any `interactions` (see features.FeatureEngine).
+    Each observation touches at most 18 main-effect columns plus one per
+    interaction, so an update costs O(active^2) and solving is independent
+    of row count.
+    """
+
+    def __init__(self, position_levels, year_levels, dev_trait_levels, interactions=()):
+        self.engine = FeatureEngine(position_levels, year_levels, dev_trait_levels, interactions)
+        self.position_levels = self.engine.position_levels
+        self.year_levels = self.engine.year_levels
+        self.dev_trait_levels = self.engine.dev_trait_levels
+        self.interactions = self.engine.interactions
+
+        self.position_start = self.engine.position_start
+        self.year_start = self.engine.year_start
+        self.dev_trait_start = self.engine.dev_trait_start
+        self.coaching_start = self.engine.coaching_start
+        self.xp_col = self.engine.xp_col
+        self.p = self.engine.p
+
+        self.xtx = np.zeros((self.p, self.p))
+        self.xty = np.zeros(self.p)
+        self.yty = 0.0
+        self.n = 0
+
+    def features(self, position, year, dev_trait, xp_penalty, mask):
+        """Active column indices and values of one observation's design row"""
+        return self.engine.row_features(position, year, dev_trait, xp_penalty, mask)
+
+    def update(self, position, year, dev_trait, xp_penalty, mask, actual_points):
+        """Add one observation"""
+        idx, vals = self.features(position, year, dev_trait, xp_penalty, mask)
+        self.xtx[np.ix_(idx, idx)] += np.outer(vals, vals)
+        self.xty[idx] += vals * actual_points
+        self.yty += float(actual_points) ** 2
+        self.n += 1
+
+    def update_batch(self, positions, years, dev_traits, xp_penalty, masks, actual_points, block_rows=50_000):
+        """Add many observations given integer category codes in this object's level order"""
+        for start in range(0, len(positions), block_rows):
+            rows = slice(start, start + block_rows)
+            X = self.engine.design(positions[rows], years[rows], dev_traits[rows], xp_penalty[rows], masks[rows])
+            y = np.asarray(actual_points[rows], dtype=np.float64)
+            self.xtx += X.gram()
+            self.xty += X.tdot(y)
+            self.yty += float(y @ y)
+            self.n += X.shape[0]
+
+    def solve(self):
+        """Least-squares coefficients in dummy-column order"""
+        return np.linalg.lstsq(self.xtx, self.xty, rcond=None)[0]
+
+    def fit_stats(self, coef):
+        """In-sample r², adjusted r², RMSE and n computed from the sufficient statistics"""
+        sse = max(0.0, self.yty - 2 * coef @ self.xty + coef @ self.xtx @ coef)
+        mean_y = self.xty[0] / self.n
+        sst = self.yty - self.n * mean_y ** 2
+        r_squared = 1 - sse / sst if sst > 0 else 0.0
+        dof = self.n - self.p
+        return {
+            'r_squared': float(r_squared),
+            'adj_r_squared': float(1 - (1 - r_squared) * (self.n - 1) / dof if dof > 0 else r_squared),
+            'rmse': float(np.sqrt(sse / self.n)),
+            'n': self.n
+        }
+
+    def full_vector(self, coef):
+        """Expand dummy coefficients to CompiledModel's layout (baselines set to zero)"""
+        return np.concatenate([
+            coef[:1],
+            [0.0], coef[self.position_start:self.year_start],
+            [0.0], coef[self.year_start:self.dev_trait_start],
+            [0.0], coef[self.dev_trait_start:]
+        ])
+
+    def save(self, path):
+        """Atomically persist the statistics"""
+        tmp_path = f'{path}.tmp.npz'
+        np.savez(tmp_path, xtx=self.xtx, xty=self.xty, yty=self.yty, n=self.n,
+                 levels=json.dumps([self.position_levels, self.year_levels, self.dev_trait_levels]),
+                 interactions=json.dumps(self.interactions))
+        os.replace(tmp_path, path)
+
+    def load(self, path):
+        """Restore statistics saved with the same category levels and interactions"""
+        with np.load(path) as data:
+            levels = json.loads(str(data['levels']))
+            if levels != [self.position_levels, self.year_levels, self.dev_trait_levels]:
+                raise ValueError(f"Saved statistics in {path} use different category levels")
+            # States saved before interactions existed are purely additive
+            interactions = json.loads(str(data['interactions'])) if 'interactions' in data else []
+            if interactions != self.interactions:
+                raise ValueError(f"Saved statistics in {path} use interactions {interactions}, expected {self.interactions}")
+            self.xtx = data['xtx']
+            self.xty = data['xty']
+            self.yty = float(data['yty'])
+            self.n = int(data['n'])
+
+
+def state_interactions(path):
+    """Interaction specs a saved SufficientStats file was built with ([] for additive states)"""
+    with np.load(path) as data:
+        return json.loads(str(data['interactions'])) if 'interactions' in data else []
+
+
+class OnlineTrainer:
+    """Sufficient statistics persisted on disk, refit into a hot-swappable model
+
+    `base_model` supplies the category levels, floor rule and version
+    lineage. Retrained versions are named '<base version>+r<n>'. They fit
+    `interactions` (features.FeatureEngine specs) on top of the main
+    effects. By default these come from the state file at `path` when it
+    exists, so any tool can open a state it did not create, and otherwise
+    from the base model.
+
+    Single submissions are saved in batches (see autosave.Autosave): after
+    `save_every` of them, `save_interval` seconds after the first unsaved
+    one, or at exit. Backfills save at once.
+    """
+
+    def __init__(self, path, base_model, min_rows=100, interactions=None, save_every=50, save_interval=30.0):
+        self.path = path
+        self.base_model = base_model
+        self.min_rows = min_rows
+        if interactions is None:
+            interactions = state_interactions(path) if os.path.exists(path) else base_model.interactions
+        self.stats = SufficientStats(base_model.position_levels, base_model.year_levels,
+                                     base_model.dev_trait_levels, interactions)
+        if os.path.exists(path):
+            self.stats.load(path)
+        self._model = None
+        self._lock = threading.Lock()
+        self.autosave = Autosave(self.save, every=save_every, interval=save_interval)
+
+    def save(self):
+        """Write the statistics to `path` now"""
+        with self._lock:
+            self.stats.save(self.path)
+
+    def _update(self, record, actual_points):
+        self.stats.update(record['position'], record['year'], record['dev_trait'],
+                          record['xp_penalty'], staff_mask(record), actual_points)
+
+    def add(self, record, actual_points):
+        """Record one submission (prediction inputs + actual points); it is saved with the next batch"""
+        with self._lock:
+            self._update(record, actual_points)
+        self.autosave.changed()
+
+    def backfill(self, rows):
+        """Add stored submissions (e.g. replica rows); rows with unknown categories are skipped"""
+        skipped = 0
+        with self._lock:
+            for row in rows:
+                try:
+                    self._update(row, row['actual_points'])
+                except KeyError:
+                    skipped += 1
+            self.stats.save(self.path)
+        self.autosave.saved()
+        return skipped
+
+    def rebuild(self, rows):
+        """Replace the statistics with ones from stored submissions alone; returns rows skipped"""
+        with self._lock:
+            stats = self.stats
+            self.stats = SufficientStats(stats.position_levels, stats.year_levels, stats.dev_trait_levels,
+                                         stats.interactions)
+            self._model = None
+        return self.backfill(rows)
+
+    def backfill_dataset(self, dataset):
+        """Add a columnar.ColumnarDataset in one vectorized pass; returns rows skipped for unknown categories"""
+        players, masks, known = dataset.model_inputs(self.base_model)
+        actual_points = np.asarray(dataset['actual_points'])[known]
+        with self._lock:
+            self.stats.update_batch(players['position'], players['year'], players['dev_trait'],
+                                    players['xp_penalty'], masks, actual_points)
+            self.stats.save(self.path)
+        self.autosave.saved()
+        return int((~known).sum())
+
+    def refit(self):
+        """Solve for new coefficients; returns None until min_rows submissions are recorded"""
+        with self._lock:
+            if self.stats.n < self.min_rows:
+                return None
+            coef = self.stats.solve()
+            base = self.base_model
+            model = CompiledModel.from_vector(
+                self.stats.full_vector(coef),
+                base.position_levels,
+                base.year_levels,
+                base.dev_trait_levels,
+                interactions=self.stats.interactions,
+                floor=base.floor,
+                stats=self.stats.fit_stats(coef),
+                devt_accuracy=base.devt_accuracy,
+                version=f'{base.version}+r{self.stats.n}'
+            )
+            self._model = model
+            return model
+
+    def current(self):
+        """The latest refit, refreshed when new submissions arrived, else the base model"""
+        model = self._model
+        if model is None or not model.version.endswith(f'+r{self.stats.n}'):
+            model = self.refit() or self.base_model
+        return model
+
+    def publish(self, directory):
+        """Refit and write the new version's artifact; returns its path"""
+        model = self.refit()
+        if model is None:
+            raise ValueError(f"Need at least {self.min_rows} submissions to retrain, have {self.stats.n}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{model.version}.json')
+        save_artifact(model, path)
+        return path
@@ -0,0 +1,153 @@
+"""Stream-score large roster exports with a published model
+
+Reads CSV or Parquet in fixed-size chunks, checks the categories against
+the model, scores each chunk in one vectorized pass and writes it out
+before reading the next. Memory stays flat at roughly one chunk.
+
+Coaching abilities come from per-row 0/1 columns (HC_Moti.1 ... DC_TD3)
+when the file has them. Otherwise --abilities sets one staff for every row.
+
+    python score.py league_export.csv scored.csv --model-version v4.0
+    python score.py league_export.parquet scored.parquet --abilities OC_TD2 DC_TD2 --on-invalid skip
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from model import COACHING_VARS, coaching_masks, staff_mask
+from registry import available_versions, load_model
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+CATEGORY_COLUMNS = ('position', 'year', 'dev_trait')
+
+
+def _is_parquet(path):
+    return path.endswith(('.parquet', '.pq'))
+
+
+def read_chunks(path, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Yield DataFrames of up to `chunk_rows` rows from a CSV or Parquet file"""
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        source = sys.stdin if path == '-' else path
+        dtype = {name: 'category' for name in CATEGORY_COLUMNS}
+        yield from pd.read_csv(source, chunksize=chunk_rows, dtype=dtype)
+
+
+def invalid_rows(model, chunk):
+    """Boolean mask of rows with an unknown category or a missing XP penalty"""
+    bad = chunk['xp_penalty'].isna().to_numpy()
+    for name, levels in zip(CATEGORY_COLUMNS, (model.position_levels, model.year_levels, model.dev_trait_levels)):
+        bad = bad | ~chunk[name].isin(levels).to_numpy()
+    return bad
+
+
+def score_chunks(model, chunks, mask=0, on_invalid='error', stats=None):
+    """Add a prediction column to each chunk
+
+    Rows with unknown categories raise ValueError, or are dropped with
+    on_invalid='skip'. `stats` counts rows read, scored and skipped.
+    """
+    stats = stats if stats is not None else {}
+    for key in ('read', 'scored', 'skipped'):
+        stats.setdefault(key, 0)
+    per_row = None
+
+    for chunk in chunks:
+        missing = [name for name in (*CATEGORY_COLUMNS, 'xp_penalty') if name not in chunk]
+        if missing:
+            raise ValueError(f"Missing columns {missing}")
+        if per_row is None:
+            present = [var in chunk for var in COACHING_VARS]
+            if any(present) and not all(present):
+                raise ValueError(f"Provide all or none of the coaching columns {COACHING_VARS}")
+            per_row = all(present)
+
+        offset = stats['read']
+        stats['read'] += len(chunk)
+        bad = invalid_rows(model, chunk)
+        if bad.any():
+            first = int(np.argmax(bad))
+            if on_invalid != 'skip':
+                raise ValueError(f"Row {offset + first} has an unknown category or missing XP penalty: "
+                                 f"{chunk.iloc[first][list(CATEGORY_COLUMNS)].to_dict()}")
+            stats['skipped'] += int(bad.sum())
+            chunk = chunk[~bad]
+            # Drop the rejected levels so categorical encoding only sees known ones
+            chunk = chunk.assign(**{
+                name: chunk[name].cat.remove_unused_categories()
+                for name in CATEGORY_COLUMNS if isinstance(chunk[name].dtype, pd.CategoricalDtype)
+            })
+
+        masks = coaching_masks(chunk) if per_row else mask
+        chunk = chunk.assign(prediction=model.predict_masks(chunk, masks))
+        stats['scored'] += len(chunk)
+        yield chunk
+
+
+def write_chunks(chunks, path):
+    """Stream scored chunks to a CSV or Parquet file ('-' for CSV on stdout)"""
+    if _is_parquet(path):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        writer = None
+        try:
+            for chunk in chunks:
+                table = pa.Table.from_pandas(chunk, preserve_index=False)
+                if writer is None:
+                    writer = pq.ParquetWriter(path, table.schema)
+                # Categories can differ between chunks, so cast to the first chunk's schema
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+        return
+
+    out = sys.stdout if path == '-' else open(path, 'w', newline='')
+    try:
+        header = True
+        for chunk in chunks:
+            chunk.to_csv(out, header=header, index=False)
+            header = False
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a roster export in constant memory")
+    parser.add_argument('input', help="CSV or Parquet file ('-' for CSV on stdin)")
+    parser.add_argument('output', help="CSV or Parquet file ('-' for CSV on stdout)")
+    parser.add_argument('--model-version', default='v4.0', choices=available_versions())
+    parser.add_argument('--abilities', nargs='*', default=[], choices=COACHING_VARS, metavar='ABILITY',
+                        help="Coaching abilities shared by every row when the file has no coaching columns")
+    parser.add_argument('--chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument('--on-invalid', choices=('error', 'skip'), default='error')
+    args = parser.parse_args()
+
+    model = load_model(args.model_version)
+    mask = staff_mask({var: True for var in args.abilities})
+    stats = {}
+
+    start = time.perf_counter()
+    try:
+        write_chunks(score_chunks(model, read_chunks(args.input, args.chunk_rows), mask, args.on_invalid, stats),
+                     args.output)
+    except ValueError as e:
+        sys.exit(f"Error: {e}")
+    elapsed = time.perf_counter() - start
+
+    print(f"Scored {stats['scored']:,} of {stats['read']:,} rows ({stats['skipped']:,} skipped) "
+          f"with model {model.version} in {elapsed:.2f}s ({stats['read'] / max(elapsed, 1e-9):,.0f} rows/s)",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
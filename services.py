@@ -0,0 +1,201 @@
+"""Process-wide services shared by the Streamlit apps
+
+app.py and app2.py run the same infrastructure around different model
+versions: the storage backend and write-behind spool, submission dedupe,
+the ingest-time outlier screen, online retraining, live accuracy stats,
+the player index, interval tables and the metrics exporter. AppServices
+wires all of it for one model version, with file names derived from the
+version, and creates each piece on first use so app startup never pays
+for it. Each app keeps one instance per process through st.cache_resource.
+
+The local replica that the player index, interval tables and retrainer
+rebuild read from is kept in step with the storage backend by a
+background ReplicaSyncer started from every script run
+(start_replica_sync), so no external sync job is needed.
+"""
+import json
+import os
+import threading
+
+from metrics import start_export
+from registry import load_model
+from storage import SubmissionStore, record_submission
+
+# Files shared by both apps; per-version files are named in AppServices
+SPOOL_PATH = "submissions_spool.db"
+DEDUPE_PATH = "submission_keys.db"
+REPLICA_PATH = "submissions_replica.db"
+INTERVAL_CACHE_DIR = "interval_cache"
+
+
+class AppServices:
+    """Lazily created submission, retraining, accuracy and lookup services for one model version
+
+    `load_info` returns the Sheets service account info and is only called
+    when the 'sheets' backend connects. `retrain_interactions` are fit by
+    the online retrainer on top of the model's main effects; they change
+    the state file's layout, so `trainer_state_path` should name a
+    separate file when they are set.
+    """
+
+    def __init__(self, model_version, load_info=None, storage_backend='sheets',
+                 spool_path=SPOOL_PATH, spool_batch_size=50, spool_max_latency=10.0, dedupe_path=DEDUPE_PATH,
+                 trainer_state_path=None, retrain_interactions=None, retrain_min_rows=100, serve_retrained=False,
+                 live_stats_min_n=30, outlier_threshold=3.5, replica_path=REPLICA_PATH, replica_sync_interval=60.0,
+                 interval_cache_dir=INTERVAL_CACHE_DIR, interval_method='conformal',
+                 metrics_export=None, metrics_port=9464, metrics_file=None):
+        self.base_model = load_model(model_version)
+        self.load_info = load_info
+        self.storage_backend = storage_backend
+        self.spool_path = spool_path
+        self.spool_batch_size = spool_batch_size
+        self.spool_max_latency = spool_max_latency
+        self.dedupe_path = dedupe_path
+        self.trainer_state_path = trainer_state_path or f"retrain_state_{model_version}.npz"
+        self.retrain_interactions = retrain_interactions
+        self.retrain_min_rows = retrain_min_rows
+        self.serve_retrained = serve_retrained
+        self.live_stats_path = f"live_stats_{model_version}.json"
+        self.live_stats_min_n = live_stats_min_n
+        self.outlier_path = f"outliers_{model_version}.db"
+        self.outlier_threshold = outlier_threshold
+        self.replica_path = replica_path
+        self.replica_sync_interval = replica_sync_interval
+        self.interval_cache_dir = interval_cache_dir
+        self.interval_method = interval_method
+        self.metrics_export = metrics_export
+        self.metrics_port = metrics_port
+        self.metrics_file = metrics_file or f"metrics_{model_version}.jsonl"
+
+        self._resources = {}
+        self._lock = threading.RLock()
+
+    def _resource(self, name, create):
+        """The resource called `name`, created by `create()` the first time it is asked for"""
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = create()
+            return self._resources[name]
+
+    @property
+    def backend(self):
+        """Configured submission backend; a Sheets connection connects on first use and reconnects after failures"""
+        from backends import open_backend
+        return self._resource('backend', lambda: open_backend(self.storage_backend, self.load_info))
+
+    @property
+    def store(self):
+        """Submission write path; the spool worker and storage backend load on first save"""
+        return self._resource('store', lambda: SubmissionStore(
+            self.spool_path,
+            lambda: self.backend,
+            batch_size=self.spool_batch_size,
+            max_latency=self.spool_max_latency,
+            dedupe_path=self.dedupe_path
+        ))
+
+    @property
+    def trainer(self):
+        """Retraining sufficient statistics, rebuilt from the replica once it has rows"""
+        def create():
+            from retrain import OnlineTrainer
+            trainer = OnlineTrainer(self.trainer_state_path, self.base_model, min_rows=self.retrain_min_rows,
+                                    interactions=self.retrain_interactions)
+            self._rebuild_trainer(trainer)
+            return trainer
+        return self._resource('trainer', create)
+
+    def _rebuild_trainer(self, trainer):
+        """Refit the retrainer from the replica's screened rows, once per state file
+
+        The first start with a synced replica rebuilds the state from every
+        stored submission that passes the outlier screen, replacing whatever
+        live submissions were counted before. A marker next to the state
+        file records the rebuild; until one succeeds, every start retries.
+        """
+        marker = f'{self.trainer_state_path}.rebuilt'
+        if os.path.exists(marker) or not os.path.exists(self.replica_path):
+            return False
+        from replica import SheetReplica
+        replica = SheetReplica(self.replica_path)
+        try:
+            high_water = replica.high_water()
+            if not high_water:
+                return False
+            skipped = trainer.rebuild(self.outliers.screen(replica.iter_rows(), self.base_model))
+        finally:
+            replica.close()
+        with open(marker, 'w') as f:
+            json.dump({'high_water': high_water, 'rows': trainer.stats.n, 'skipped': skipped}, f)
+        return True
+
+    @property
+    def live_stats(self):
+        """Live accuracy accumulators"""
+        from live_stats import LiveStats
+        return self._resource('live_stats', lambda: LiveStats(self.live_stats_path, min_n=self.live_stats_min_n))
+
+    @property
+    def outliers(self):
+        """Running residual statistics for outlier screening"""
+        from outliers import OutlierFilter
+        return self._resource('outliers', lambda: OutlierFilter(self.outlier_path, threshold=self.outlier_threshold))
+
+    @property
+    def player_index(self):
+        """Previously submitted players for autocomplete, refreshed from the local replica as it syncs"""
+        from players import PlayerIndex
+        return self._resource('player_index', lambda: PlayerIndex(self.replica_path))
+
+    def start_replica_sync(self):
+        """Start the background replica sync once; returns the ReplicaSyncer"""
+        def create():
+            from replica import ReplicaSyncer
+            syncer = ReplicaSyncer(self.replica_path, lambda: self.backend, interval=self.replica_sync_interval)
+            syncer.start()
+            return syncer
+        return self._resource('replica_sync', create)
+
+    def model(self):
+        """Model used for predictions"""
+        if self.serve_retrained:
+            return self.trainer.current()
+        return self.base_model
+
+    def interval_table(self):
+        """Latest interval table for the current model, or None; tables are rebuilt in the background"""
+        from intervals import IntervalRefresher
+        model = self.model()
+        with self._lock:
+            refresher = self._resources.get('intervals')
+            # A retrained model gets a new version with every submission; only the latest one's table is kept
+            if refresher is None or refresher.model.version != model.version:
+                refresher = self._resources['intervals'] = IntervalRefresher(
+                    model, self.replica_path, self.interval_cache_dir, method=self.interval_method
+                )
+        return refresher.current()
+
+    def model_stats(self):
+        """Model performance statistics, live once enough results are submitted"""
+        n_params = len(self.base_model.beta) - 4  # intercept and one baseline per factor excluded
+        return self.live_stats.model_stats(self.base_model.stats, n_params=n_params)
+
+    def devt_accuracy(self):
+        """DevT-specific accuracy data, live once enough results are submitted"""
+        return self.live_stats.devt_accuracy(self.base_model.devt_accuracy)
+
+    def save(self, prediction_data, actual_points, scope=''):
+        """Queue a submission and feed the retrainer, live stats and player index
+
+        Returns False for a repeat within `scope`.
+        """
+        if not record_submission(self.store, prediction_data, actual_points, trainer=self.trainer,
+                                 live_stats=self.live_stats, scope=scope, outliers=self.outliers):
+            return False
+        self.player_index.add_submission(prediction_data, actual_points)
+        return True
+
+    def start_metrics(self):
+        """Start the configured metrics exporter once"""
+        return self._resource('metrics', lambda: start_export(self.metrics_export, port=self.metrics_port,
+                                                              path=self.metrics_file))
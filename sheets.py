@@ -0,0 +1,232 @@
+import datetime
+import random
+import re
+import threading
+import time
+
+from metrics import metrics
+from model import COACHING_VARS
+
+# Google Sheets setup
+SHEET_ID = "1ANYMLAgjc1nwXYCdm2nbegrgPtUfUGh1aR_nhLxcMK8"
+SCOPES = [
+    'https://www.googleapis.com/auth/spreadsheets',
+    'https://www.googleapis.com/auth/drive'
+]
+
+# Column layout of the rows written by save_complete_data
+SUBMISSION_COLUMNS = [
+    'team',
+    'player_name',
+    'actual_points',
+    'position',
+    'year',
+    'dev_trait',
+    'dev_trait_num',
+    'snaps',
+    *COACHING_VARS,
+    'xp_penalty'
+]
+LAST_COLUMN = chr(ord('A') + len(SUBMISSION_COLUMNS) - 1)
+
+# (connect, read) timeout in seconds for every Sheets API request
+REQUEST_TIMEOUT = (5.0, 15.0)
+
+# Refresh the access token this many seconds before it expires
+TOKEN_REFRESH_MARGIN = 300
+
+
+def _authorize(service_account_info, sheet_id, timeout):
+    """Open the worksheet; returns (credentials, worksheet)"""
+    # Imported here so only the first connection pays for the Google client stack
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    creds = Credentials.from_service_account_info(service_account_info, scopes=SCOPES)
+    client = gspread.authorize(creds)
+    client.http_client.set_timeout(timeout)
+    return creds, client.open_by_key(sheet_id).sheet1
+
+
+def open_worksheet(service_account_info, sheet_id=SHEET_ID, timeout=REQUEST_TIMEOUT):
+    """Authorize with a service account and open the submissions worksheet"""
+    return _authorize(service_account_info, sheet_id, timeout)[1]
+
+
+def _expires_soon(creds, margin):
+    if creds is None or getattr(creds, 'expiry', None) is None:
+        return False
+    # google-auth keeps expiry as a naive UTC datetime
+    now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+    return creds.expiry - now <= datetime.timedelta(seconds=margin)
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised without calling Google while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Google Sheets circuit open, next attempt in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class SheetsConnection:
+    """Self-healing handle on the submissions worksheet
+
+    Stands in for the worksheet itself (append_row, append_rows, get,
+    get_all_values) and never caches a failed connection. It connects on
+    first use with bounded request timeouts, refreshes the access token
+    shortly before it expires, and drops the connection after any failed
+    call so the next call reconnects. `load_info` is called on every
+    connect, so missing or rotated secrets are picked up.
+
+    After `failure_threshold` consecutive failures the circuit opens: calls
+    raise CircuitOpenError at once for a cool-down that doubles on every
+    re-open (jittered, capped at `max_cooldown`). Then a single trial call
+    is let through, and its result closes or re-opens the circuit.
+    """
+
+    def __init__(self, load_info, sheet_id=SHEET_ID, timeout=REQUEST_TIMEOUT, failure_threshold=3,
+                 base_cooldown=5.0, max_cooldown=300.0, refresh_margin=TOKEN_REFRESH_MARGIN, opener=_authorize):
+        self.load_info = load_info
+        self.sheet_id = sheet_id
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.refresh_margin = refresh_margin
+        self.opener = opener
+        self.failures = 0
+        self.opens = 0
+        self.open_until = None
+        self.last_error = None
+        self._creds = None
+        self._sheet = None
+        self._trial = False
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.open_until is None:
+                return 'closed'
+            return 'open' if time.monotonic() < self.open_until else 'half-open'
+
+    def _admit(self):
+        """Fail fast while open; let one trial call through once the cool-down ends"""
+        with self._lock:
+            if self.open_until is None:
+                return
+            remaining = self.open_until - time.monotonic()
+            if remaining > 0 or self._trial:
+                metrics.incr('sheets_rejected')
+                raise CircuitOpenError(max(remaining, 0.0))
+            self._trial = True
+
+    def _worksheet(self):
+        with self._connect_lock:
+            if self._sheet is None:
+                try:
+                    with metrics.span('sheets_connect'):
+                        self._creds, self._sheet = self.opener(self.load_info(), self.sheet_id, self.timeout)
+                except Exception:
+                    metrics.incr('sheets_connect_failures')
+                    raise
+            elif _expires_soon(self._creds, self.refresh_margin):
+                from google.auth.transport.requests import Request
+                with metrics.span('sheets_token_refresh'):
+                    self._creds.refresh(Request())
+            return self._sheet
+
+    def _succeeded(self):
+        with self._lock:
+            self.failures = 0
+            self.opens = 0
+            self.open_until = None
+            self.last_error = None
+            self._trial = False
+
+    def _failed(self, error):
+        # Drop the connection so the next admitted call reconnects from scratch
+        self._creds = self._sheet = None
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opens += 1
+                cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self.opens - 1))
+                self.open_until = time.monotonic() + cooldown * random.uniform(0.5, 1.0)
+                metrics.incr('sheets_circuit_opened')
+            self._trial = False
+
+    def _call(self, method, *args, **kwargs):
+        self._admit()
+        try:
+            result = getattr(self._worksheet(), method)(*args, **kwargs)
+        except Exception as e:
+            self._failed(e)
+            raise
+        self._succeeded()
+        return result
+
+    def append_row(self, values, **kwargs):
+        return self._call('append_row', values, **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        return self._call('append_rows', values, **kwargs)
+
+    def get(self, range_name, **kwargs):
+        return self._call('get', range_name, **kwargs)
+
+    def get_all_values(self, **kwargs):
+        return self._call('get_all_values', **kwargs)
+
+
+def _row_span(range_name):
+    """Parse the 1-based row bounds out of an A1 range like 'A5:V104'"""
+    rows = [int(r) for r in re.findall(r'[A-Z]+(\d+)', range_name)]
+    return rows[0], rows[-1]
+
+
+class LocalWorksheet:
+    """In-memory stand-in for the gspread Worksheet calls the app makes
+
+    `latency` adds a delay to every API call and `fail_next` makes the next
+    N calls raise, to exercise the read and write paths without touching Google.
+    """
+
+    def __init__(self, rows=None, latency=0.0, fail_next=0):
+        self.rows = [list(row) for row in rows or []]
+        self.latency = latency
+        self.fail_next = fail_next
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _api_call(self):
+        """Simulate one round trip, honouring injected latency and failures"""
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            if self.fail_next > 0:
+                self.fail_next -= 1
+                raise ConnectionError("Simulated Sheets API failure")
+
+    def append_row(self, values, **kwargs):
+        self.append_rows([values], **kwargs)
+
+    def append_rows(self, values, **kwargs):
+        self._api_call()
+        with self._lock:
+            self.rows.extend(list(row) for row in values)
+
+    def get(self, range_name, **kwargs):
+        self._api_call()
+        first, last = _row_span(range_name)
+        with self._lock:
+            return [list(row) for row in self.rows[first - 1:last]]
+
+    def get_all_values(self, **kwargs):
+        self._api_call()
+        with self._lock:
+            return [list(row) for row in self.rows]
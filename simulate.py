@@ -0,0 +1,160 @@
+import math
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from model import staff_mask
+
+# Class progression between seasons; None means the player has left the program
+NEXT_YEAR = {
+    'FR': 'SO',
+    'FR (RS)': 'SO (RS)',
+    'SO': 'JR',
+    'SO (RS)': 'JR (RS)',
+    'JR': 'SR',
+    'JR (RS)': 'SR (RS)',
+    'SR': None,
+    'SR (RS)': None
+}
+
+# Year a true freshman moves to when redshirted
+REDSHIRT_YEAR = {'FR': 'FR (RS)'}
+
+# Stand-in when the model has no level for a redshirt year (v2.3 has no SR (RS))
+YEAR_FALLBACK = {'FR (RS)': 'FR', 'SO (RS)': 'SO', 'JR (RS)': 'JR', 'SR (RS)': 'SR'}
+
+# Paths simulated per task; fixed so results do not depend on the worker count
+CHUNK_PATHS = 2000
+
+QUANTILES = (0.1, 0.5, 0.9)
+
+
+def _year_code(year, index):
+    """Model code of `year`, or of its YEAR_FALLBACK stand-in; -1 for None or an unknown year"""
+    if year is not None and year not in index:
+        year = YEAR_FALLBACK.get(year)
+    return index.get(year, -1)
+
+
+def _year_transitions(year_levels):
+    """Next-year code tables (-1 once a player leaves) for normal and redshirt progression"""
+    index = {y: i for i, y in enumerate(year_levels)}
+    normal = np.array([_year_code(NEXT_YEAR.get(y), index) for y in year_levels])
+    redshirt = np.array([_year_code(REDSHIRT_YEAR.get(y, NEXT_YEAR.get(y)), index) for y in year_levels])
+    stranded = [y for y, code in zip(year_levels, normal) if code < 0 and NEXT_YEAR.get(y) is not None]
+    if stranded:
+        warnings.warn(f"No next year in the model for {stranded}; those players leave the simulation early")
+    return normal, redshirt
+
+
+def residual_sd(model, dev_trait_levels):
+    """Per-DevT residual standard deviation implied by the model's DevT MAE (normal errors)"""
+    accuracy = model.devt_accuracy or {}
+    fallback = (model.stats or {}).get('rmse', 0.0)
+    return np.array([
+        accuracy[d]['mae'] * math.sqrt(math.pi / 2) if d in accuracy else fallback
+        for d in dev_trait_levels
+    ])
+
+
+def _simulate_chunk(task):
+    """Simulate one block of paths for every staff plan (runs in a worker process)"""
+    model, positions, years, dev_traits, xp_penalty, plan_masks, sd, redshirt_rate, seed, n_paths = task
+    rng = np.random.default_rng(seed)
+    normal_next, redshirt_next = _year_transitions(model.year_levels)
+    n_plans, seasons = plan_masks.shape
+    n_players = len(positions)
+
+    year = np.broadcast_to(years, (n_paths, n_players)).copy()
+    player_sd = sd[dev_traits]
+    player_base = model.xp_coeff * xp_penalty
+    totals = np.zeros((n_plans, n_paths, n_players))
+
+    for season in range(seasons):
+        active = year >= 0
+        # Common random numbers: every plan sees the same noise and progression
+        noise = rng.standard_normal((n_paths, n_players)) * player_sd
+        redshirted = rng.random((n_paths, n_players)) < redshirt_rate
+
+        expected = model.base[positions, np.where(active, year, 0), dev_traits] + player_base
+        for plan in range(n_plans):
+            points = expected + model.staff_bonus[plan_masks[plan, season]]
+            if model.interactions:
+                # Interactions depend on the player's current year, so score each path's roster
+                effect = model.interaction_effect(
+                    np.broadcast_to(positions, year.shape).ravel(), np.where(active, year, 0).ravel(),
+                    np.broadcast_to(dev_traits, year.shape).ravel(), np.broadcast_to(xp_penalty, year.shape).ravel(),
+                    plan_masks[plan, season]
+                )
+                points = points + effect.reshape(year.shape)
+            if model.floor is not None:
+                np.maximum(points, model.floor, out=points)
+            points = np.maximum(points + noise, 0.0)
+            totals[plan] += np.where(active, points, 0.0)
+
+        safe_year = np.where(active, year, 0)
+        year = np.where(active, np.where(redshirted, redshirt_next[safe_year], normal_next[safe_year]), -1)
+
+    return totals
+
+
+def simulate(model, roster, plans, seasons=4, n_paths=20000, seed=0, redshirt_rate=0.0,
+             workers=None, noise_sd=None):
+    """Monte Carlo dynasty progression of a roster under several staff plans
+
+    `plans` maps a plan name to a coaching_abilities dict (held every season)
+    or a list of one dict per season. Each path advances every player's year
+    per NEXT_YEAR (true freshmen redshirt with probability `redshirt_rate`)
+    and adds residual noise drawn from the per-DevT error distribution.
+    Paths run in fixed-size chunks across a process pool, each chunk seeded
+    from `seed`, so results are identical for any worker count.
+
+    Returns (plan names, cumulative points array of shape (plans, paths, players)).
+    """
+    positions, years, dev_traits = model.encode(roster)
+    xp_penalty = np.asarray(roster['xp_penalty'], dtype=np.float64)
+
+    names = list(plans)
+    plan_masks = np.empty((len(names), seasons), dtype=np.int64)
+    for i, name in enumerate(names):
+        plan = plans[name]
+        per_season = plan if isinstance(plan, (list, tuple)) else [plan] * seasons
+        if len(per_season) != seasons:
+            raise ValueError(f"Plan {name!r} has {len(per_season)} seasons, expected {seasons}")
+        plan_masks[i] = [staff_mask(abilities) for abilities in per_season]
+
+    sd = residual_sd(model, model.dev_trait_levels) if noise_sd is None else np.asarray(
+        [noise_sd[d] for d in model.dev_trait_levels], dtype=np.float64)
+
+    chunk_sizes = [min(CHUNK_PATHS, n_paths - start) for start in range(0, n_paths, CHUNK_PATHS)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    tasks = [
+        (model, positions, years, dev_traits, xp_penalty, plan_masks, sd, redshirt_rate, child, size)
+        for child, size in zip(seeds, chunk_sizes)
+    ]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(tasks) == 1:
+        results = [_simulate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            results = list(pool.map(_simulate_chunk, tasks))
+
+    return names, np.concatenate(results, axis=1)
+
+
+def summarize(names, cumulative, quantiles=QUANTILES):
+    """Per-plan roster-total and per-player distributions of cumulative skill points"""
+    summary = {}
+    for i, name in enumerate(names):
+        per_player = cumulative[i]
+        roster_total = per_player.sum(axis=1)
+        summary[name] = {
+            'roster_mean': float(roster_total.mean()),
+            'roster_quantiles': dict(zip(quantiles, np.quantile(roster_total, quantiles).tolist())),
+            'player_mean': per_player.mean(axis=0),
+            'player_quantiles': dict(zip(quantiles, np.quantile(per_player, quantiles, axis=0)))
+        }
+    return summary
@@ -0,0 +1,205 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from metrics import metrics
+
+
+# Seconds a claimed batch stays reserved for its worker before others may retry it
+CLAIM_LEASE = 60.0
+
+
+class SubmissionSpool:
+    """Durable on-disk queue of sheet rows waiting to be flushed
+
+    Rows are committed to SQLite before put() returns, so a submission
+    survives a crash or restart until the worker acknowledges it.
+
+    Several processes may share one spool file (app.py and app2.py do).
+    A worker claims a batch with claim(), which leases the rows to this
+    spool's `owner` in the same transaction that selects them, so no two
+    workers send the same rows. A lease left by a crashed process expires
+    after `lease` seconds.
+    """
+
+    def __init__(self, path, lease=CLAIM_LEASE):
+        self.path = path
+        self.lease = lease
+        self.owner = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=FULL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS spool ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT,'
+            ' row TEXT NOT NULL,'
+            ' created REAL NOT NULL,'
+            ' owner TEXT,'
+            ' lease_until REAL)'
+        )
+        # Spools written before rows were claimed have no lease columns
+        columns = {row[1] for row in self._conn.execute('PRAGMA table_info(spool)')}
+        for name, kind in (('owner', 'TEXT'), ('lease_until', 'REAL')):
+            if name not in columns:
+                self._conn.execute(f'ALTER TABLE spool ADD COLUMN {name} {kind}')
+
+    def put(self, row):
+        """Durably append one row"""
+        with self._lock:
+            self._conn.execute('INSERT INTO spool (row, created) VALUES (?, ?)',
+                               (json.dumps(row), time.time()))
+
+    def peek(self, limit):
+        """Return up to `limit` of the oldest (id, row) pairs without removing them"""
+        with self._lock:
+            cur = self._conn.execute('SELECT id, row FROM spool ORDER BY id LIMIT ?', (limit,))
+            return [(row_id, json.loads(row)) for row_id, row in cur]
+
+    def claim(self, limit):
+        """Lease up to `limit` of the oldest unclaimed (id, row) pairs to this spool
+
+        The rows stay in the spool until ack(); release() hands them back
+        early after a failed write.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                cur = self._conn.execute(
+                    'SELECT id, row FROM spool WHERE lease_until IS NULL OR lease_until < ? ORDER BY id LIMIT ?',
+                    (now, limit)
+                )
+                batch = [(row_id, json.loads(row)) for row_id, row in cur]
+                self._conn.executemany('UPDATE spool SET owner = ?, lease_until = ? WHERE id = ?',
+                                       [(self.owner, now + self.lease, row_id) for row_id, _ in batch])
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return batch
+
+    def ack(self, ids):
+        """Remove rows that have been written upstream"""
+        with self._lock:
+            self._conn.executemany('DELETE FROM spool WHERE id = ?', [(i,) for i in ids])
+
+    def release(self, ids):
+        """Give up this spool's claim on rows that were not written"""
+        with self._lock:
+            self._conn.executemany('UPDATE spool SET owner = NULL, lease_until = NULL WHERE id = ? AND owner = ?',
+                                   [(i, self.owner) for i in ids])
+
+    def oldest_age(self):
+        """Seconds since the oldest pending row was spooled, or None when empty"""
+        with self._lock:
+            created = self._conn.execute('SELECT MIN(created) FROM spool').fetchone()[0]
+        return None if created is None else time.time() - created
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM spool').fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class SpoolWorker(threading.Thread):
+    """Background thread that flushes spooled rows with batched append_rows
+
+    A batch is sent once `batch_size` rows are pending or the oldest row has
+    waited `max_latency` seconds. Failed writes stay in the spool and are
+    retried with jittered exponential backoff up to `max_backoff` seconds.
+    `get_sheet` is called before every flush and may return None while
+    the sheet is unavailable.
+    """
+
+    def __init__(self, spool, get_sheet, batch_size=50, max_latency=10.0,
+                 base_backoff=1.0, max_backoff=300.0, poll_interval=0.5):
+        super().__init__(name='submission-spool', daemon=True)
+        self.spool = spool
+        self.get_sheet = get_sheet
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.poll_interval = poll_interval
+        self.failures = 0
+        self.last_error = None
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+
+    def submit(self, row):
+        """Spool a row and return as soon as it is durable"""
+        self.spool.put(row)
+        if len(self.spool) >= self.batch_size:
+            self._wake.set()
+
+    def _due(self):
+        age = self.spool.oldest_age()
+        if age is None:
+            return False
+        return age >= self.max_latency or len(self.spool) >= self.batch_size
+
+    def flush_once(self):
+        """Send one batch upstream; returns the number of rows written"""
+        batch = self.spool.claim(self.batch_size)
+        if not batch:
+            return 0
+        ids = [row_id for row_id, _ in batch]
+        try:
+            sheet = self.get_sheet()
+            if sheet is None:
+                raise ConnectionError("Google Sheets connection unavailable")
+            with metrics.span('sheet_append'):
+                sheet.append_rows([row for _, row in batch])
+        except BaseException:
+            self.spool.release(ids)
+            raise
+        self.spool.ack(ids)
+        metrics.incr('sheet_rows_written', len(batch))
+        return len(batch)
+
+    def drain(self):
+        """Flush everything pending on the calling thread (after stop())"""
+        while self.flush_once():
+            pass
+
+    def _backoff(self, error=None):
+        # A circuit breaker knows exactly when its next trial call is allowed
+        retry_after = getattr(error, 'retry_after', None)
+        if retry_after is not None:
+            return min(self.max_backoff, retry_after)
+        delay = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - 1))
+        return delay * random.uniform(0.5, 1.0)
+
+    def run(self):
+        while not self._stopping.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if not self._due():
+                continue
+            if self.failures:
+                metrics.incr('sheet_write_retries')
+            try:
+                # Rows leased to another process's worker count as due but can't be claimed here
+                while self._due() and not self._stopping.is_set():
+                    if not self.flush_once():
+                        break
+                self.failures = 0
+                self.last_error = None
+            except Exception as e:
+                self.failures += 1
+                self.last_error = e
+                metrics.incr('sheet_write_failures')
+                self._stopping.wait(self._backoff(e))
+
+    def stop(self, timeout=None):
+        """Stop the worker thread; pending rows remain in the spool"""
+        self._stopping.set()
+        self._wake.set()
+        self.join(timeout)
@@ -0,0 +1,110 @@
+import threading
+
+from metrics import metrics
+from sheets import SUBMISSION_COLUMNS
+
+# DevT to number mapping for database
+DEV_TRAIT_NUM = {
+    'Elite': 4,
+    'Star': 3,
+    'Impact': 2,
+    'Normal': 1
+}
+
+
+def submission_row(prediction_data, actual_points):
+    """Build the sheet row for one submission in SUBMISSION_COLUMNS order"""
+    values = dict(
+        prediction_data,
+        actual_points=actual_points,
+        dev_trait_num=DEV_TRAIT_NUM[prediction_data['dev_trait']]
+    )
+    return [values[name] for name in SUBMISSION_COLUMNS]
+
+
+class SubmissionStore:
+    """Facade over the submission write path
+
+    Nothing behind it is loaded until the first save: the spool, its
+    background worker, the dedupe index and, through `get_sheet`, the
+    Google Sheets client are all created on demand, so app startup never
+    pays for them. With a `dedupe_path`, repeated submissions of the same
+    content within a scope (e.g. one browser session) are dropped before
+    they reach the spool. Submissions without a scope are never deduped:
+    two anonymous users can legitimately submit identical rows, and the
+    replica keeps them both for the same reason.
+    """
+
+    def __init__(self, spool_path, get_sheet, batch_size=50, max_latency=10.0, dedupe_path=None):
+        self.spool_path = spool_path
+        self.get_sheet = get_sheet
+        self.batch_size = batch_size
+        self.max_latency = max_latency
+        self.dedupe_path = dedupe_path
+        self._worker = None
+        self._dedupe = None
+        self._lock = threading.Lock()
+
+    @property
+    def worker(self):
+        """The spool worker, started on first use"""
+        with self._lock:
+            if self._worker is None:
+                from spool import SpoolWorker, SubmissionSpool
+                self._worker = SpoolWorker(
+                    SubmissionSpool(self.spool_path),
+                    self.get_sheet,
+                    batch_size=self.batch_size,
+                    max_latency=self.max_latency
+                )
+                self._worker.start()
+            return self._worker
+
+    @property
+    def dedupe(self):
+        """The dedupe index, loaded on first use (None when disabled)"""
+        with self._lock:
+            if self._dedupe is None and self.dedupe_path is not None:
+                from dedupe import DedupeIndex
+                self._dedupe = DedupeIndex(self.dedupe_path)
+            return self._dedupe
+
+    def save(self, prediction_data, actual_points, scope=''):
+        """Durably queue one submission; returns the row written, or None for a duplicate"""
+        row = submission_row(prediction_data, actual_points)
+        dedupe = self.dedupe if scope else None
+        if dedupe is None:
+            self.worker.submit(row)
+            return row
+
+        from dedupe import submission_key
+        key = submission_key(row, scope)
+        if not dedupe.add(key):
+            metrics.incr('duplicate_submissions')
+            return None
+        try:
+            self.worker.submit(row)
+        except Exception:
+            dedupe.discard(key)
+            raise
+        return row
+
+
+def record_submission(store, prediction_data, actual_points, trainer=None, live_stats=None, scope='',
+                      outliers=None):
+    """Queue a submission and feed it to the retrainer and live accuracy stats
+
+    Returns False, without touching the retrainer or stats, for a duplicate.
+    A submission that `outliers` (an outliers.OutlierFilter) quarantines is
+    still queued for the sheet but skips the retrainer and stats.
+    """
+    if store.save(prediction_data, actual_points, scope=scope) is None:
+        return False
+    metrics.incr('submissions')
+    if outliers is not None and not outliers.admit(prediction_data, actual_points):
+        return True
+    if trainer is not None:
+        trainer.add(prediction_data, actual_points)
+    if live_stats is not None:
+        live_stats.update(prediction_data['dev_trait'], actual_points, prediction_data['prediction'])
+    return True
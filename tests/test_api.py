@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+
+from api import MAX_BATCH_PLAYERS, create_app
+from live_stats import LiveStats
+from model import COACHING_VARS
+from registry import load_model
+from retrain import OnlineTrainer
+from sheets import SUBMISSION_COLUMNS, LocalWorksheet
+from storage import SubmissionStore
+
+
+def call(app, requests, concurrent=False):
+    """Run (method, path, body) requests through the ASGI app inside its lifespan; returns [(status, json)]"""
+    async def one(method, path, body):
+        payload = body if isinstance(body, bytes) else json.dumps(body).encode()
+        messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+        sent = []
+
+        async def receive():
+            return messages.pop(0) if messages else {'type': 'http.disconnect'}
+
+        async def send(message):
+            sent.append(message)
+
+        await app({'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                   'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'',
+                   'root_path': '', 'headers': [(b'content-type', b'application/json')],
+                   'client': ('test', 1), 'server': ('test', 80)}, receive, send)
+        status = next(m['status'] for m in sent if m['type'] == 'http.response.start')
+        return status, json.loads(b''.join(m.get('body', b'') for m in sent if m['type'] == 'http.response.body'))
+
+    async def run():
+        async with app.router.lifespan_context(app):
+            if concurrent:
+                return await asyncio.gather(*(one(*request) for request in requests))
+            return [await one(*request) for request in requests]
+
+    return asyncio.run(run())
+
+
+def player(**fields):
+    return {'position': 'QB', 'year': 'FR', 'dev_trait': 'Star', 'xp_penalty': 0, **fields}
+
+
+def submission(**fields):
+    return {**player(), 'team': 'Auburn', 'player_name': 'Test Player', 'snaps': 300, 'actual_points': 40, **fields}
+
+
+@pytest.fixture
+def sheet():
+    return LocalWorksheet()
+
+
+@pytest.fixture
+def store(tmp_path, sheet):
+    store = SubmissionStore(str(tmp_path / 'spool.db'), lambda: sheet, dedupe_path=str(tmp_path / 'keys.db'))
+    yield store
+    if store._worker is not None:
+        store.worker.stop()
+
+
+@pytest.fixture
+def submit_app(store):
+    return create_app(load_model('v4.0'), store)
+
+
+def test_concurrent_predictions_are_batched(store):
+    model = load_model('v4.0')
+    app = create_app(model, store, max_wait=0.01)
+    players = [player(position=p, xp_penalty=i, coaching_abilities={COACHING_VARS[i]: True})
+               for i, p in enumerate(model.position_levels)]
+    responses = call(app, [('POST', '/predict', p) for p in players], concurrent=True)
+
+    for (status, body), p in zip(responses, players):
+        assert status == 200
+        assert body['model_version'] == 'v4.0'
+        assert body['prediction'] == pytest.approx(model.predict(p['position'], p['year'], p['dev_trait'],
+                                                                 p['xp_penalty'], p['coaching_abilities']))
+    assert app.state.batcher.requests == len(players)
+    assert app.state.batcher.batches < len(players)
+
+
+def test_batch_shares_the_staff_unless_a_player_overrides_it(submit_app):
+    model = load_model('v4.0')
+    staff = {'HC_TD1': True, 'OC_Moti.1': True}
+    players = [player(), player(position='WR', year='SR (RS)', xp_penalty=20),
+               player(dev_trait='Elite', coaching_abilities={})]
+    [(status, body)] = call(submit_app, [('POST', '/predict/batch',
+                                          {'players': players, 'coaching_abilities': staff})])
+    assert status == 200
+    expected = [model.predict(p['position'], p['year'], p['dev_trait'], p['xp_penalty'],
+                              p.get('coaching_abilities', staff)) for p in players]
+    assert body['predictions'] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('path, body, message', [
+    ('/predict', player(position='DT'), "Unknown position 'DT'"),
+    ('/predict', player(year=None), "Unknown year None"),
+    ('/predict', player(xp_penalty=101), "'xp_penalty' must be a number between 0 and 100"),
+    ('/predict', player(xp_penalty=True), "'xp_penalty' must be a number"),
+    ('/predict', player(coaching_abilities={'HC_TD4': True}), "Unknown coaching abilities ['HC_TD4']"),
+    ('/predict', player(coaching_abilities=['HC_TD1']), "'coaching_abilities' must be an object"),
+    ('/predict', b'{not json', "Request body must be valid JSON"),
+    ('/predict/batch', {'players': []}, "'players' must be a list of 1 to"),
+    ('/predict/batch', {'players': [player()] * (MAX_BATCH_PLAYERS + 1)}, "'players' must be a list of 1 to"),
+    ('/predict/batch', {'players': [player(), 'QB']}, "Each player must be a JSON object"),
+    ('/submit', player(), "'actual_points' must be a number between 0 and 200"),
+    ('/submit', submission(snaps=-1), "'snaps' must be a number between 0 and 2000"),
+])
+def test_invalid_requests_are_rejected(submit_app, sheet, path, body, message):
+    [(status, response)] = call(submit_app, [('POST', path, body)])
+    assert status == 400
+    assert message in response['error']
+    assert not sheet.rows
+
+
+def test_submission_is_queued_and_feeds_the_trainer_and_stats(tmp_path, store, sheet):
+    model = load_model('v4.0')
+    trainer = OnlineTrainer(str(tmp_path / 'state.npz'), model)
+    live_stats = LiveStats(str(tmp_path / 'live_stats.json'))
+    app = create_app(model, store, trainer=trainer, live_stats=live_stats)
+    data = submission(coaching_abilities={'DC_TD2': True}, xp_penalty=15, session='s')
+    [(status, body)] = call(app, [('POST', '/submit', data)])
+
+    expected = model.predict('QB', 'FR', 'Star', 15, {'DC_TD2': True})
+    assert status == 202
+    assert body == {'queued': True, 'duplicate': False, 'prediction': pytest.approx(expected),
+                    'prediction_error': pytest.approx(abs(40 - expected))}
+    assert trainer.stats.n == 1
+    assert live_stats.overall.n == 1
+
+    store.worker.stop()
+    store.worker.drain()
+    [row] = sheet.rows
+    values = dict(zip(SUBMISSION_COLUMNS, row))
+    assert values['team'] == 'Auburn' and values['actual_points'] == 40
+    assert values['DC_TD2'] == 1 and values['HC_TD1'] == 0
+
+
+def test_anonymous_repeats_are_all_queued(submit_app):
+    responses = call(submit_app, [('POST', '/submit', submission())] * 2)
+    assert [status for status, _ in responses] == [202, 202]
+    assert [body['duplicate'] for _, body in responses] == [False, False]
+
+
+def test_repeats_within_a_session_are_dropped(submit_app):
+    responses = call(submit_app, [
+        ('POST', '/submit', submission(session='a')),
+        ('POST', '/submit', submission(session='a')),
+        ('POST', '/submit', submission(session='b'))
+    ])
+    assert [status for status, _ in responses] == [202, 200, 202]
+    assert [body['duplicate'] for _, body in responses] == [False, True, False]
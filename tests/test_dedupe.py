@@ -0,0 +1,34 @@
+import sqlite3
+import time
+
+import dedupe
+from dedupe import DedupeIndex, submission_key
+
+
+def test_expired_keys_are_dropped_on_open(tmp_path):
+    path = str(tmp_path / 'keys.db')
+    index = DedupeIndex(path, ttl=60)
+    old, new = submission_key(['A'], 'a'), submission_key(['B'], 'b')
+    assert index.add(old) and index.add(new)
+    index.close()
+    with sqlite3.connect(path) as conn:
+        conn.execute('UPDATE submission_keys SET created = created - 120 WHERE key = ?', (old,))
+
+    reopened = DedupeIndex(path, ttl=60)
+    assert old not in reopened and new in reopened
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM submission_keys').fetchone() == (1,)
+    assert reopened.add(old)
+
+
+def test_running_index_sweeps_expired_keys(tmp_path, monkeypatch):
+    index = DedupeIndex(str(tmp_path / 'keys.db'), ttl=60)
+    key = submission_key(['A'], 'a')
+    assert index.add(key)
+    assert not index.add(key)
+
+    # An hour later the sweep runs before the check, so the key is new again
+    later = time.time() + dedupe.PRUNE_INTERVAL
+    monkeypatch.setattr(dedupe.time, 'time', lambda: later)
+    assert index.add(key)
+    assert len(index) == 1
@@ -0,0 +1,113 @@
+import re
+
+import numpy as np
+import pytest
+
+from features import COACHING_INTERACTIONS, FeatureEngine
+from model import COACHING_VARS, N_STAFF_MASKS
+from registry import load_model
+
+INTERACTIONS = (*COACHING_INTERACTIONS, 'OC_TD2 * position{WR,TE}', 'position * HC_TD1',
+                'dev_trait * year{FR} * xp_penalty')
+
+
+@pytest.fixture(scope='module')
+def engine():
+    model = load_model('v2.3')
+    return FeatureEngine(model.position_levels, model.year_levels, model.dev_trait_levels, INTERACTIONS)
+
+
+@pytest.fixture(scope='module')
+def rows(engine):
+    rng = np.random.default_rng(0)
+    n = 500
+    return {
+        'position': rng.integers(0, len(engine.position_levels), n),
+        'year': rng.integers(0, len(engine.year_levels), n),
+        'dev_trait': rng.integers(0, len(engine.dev_trait_levels), n),
+        'xp_penalty': rng.integers(0, 4, n) * rng.integers(0, 40, n),  # plenty of zeros
+        'mask': rng.integers(0, N_STAFF_MASKS, n)
+    }
+
+
+def label_value(engine, label, row):
+    """Value of one design column for a row of codes, read off the column label"""
+    if label == 'Intercept':
+        return 1.0
+    if label in COACHING_VARS:
+        return float(row['mask'] >> COACHING_VARS.index(label) & 1)
+    if label in ('XP_Penalty', 'xp_penalty'):
+        return float(row['xp_penalty'])
+    name, level, subset = re.fullmatch(r'(\w+)(?:\[(.*)\]|\{(.*)\})', label).groups()
+    value = engine.levels[name][row[name]]
+    return float(value == level if subset is None else value in subset.split(','))
+
+
+def dense_reference(engine, rows):
+    """The design built column by column from the labels, independently of the sparse code"""
+    n = len(rows['position'])
+    X = np.zeros((n, engine.p))
+    for i in range(n):
+        row = {name: column[i] for name, column in rows.items()}
+        for j, label in enumerate(engine.columns):
+            X[i, j] = np.prod([label_value(engine, factor, row) for factor in label.split(':')])
+    return X
+
+
+def design(engine, rows):
+    return engine.design(rows['position'], rows['year'], rows['dev_trait'], rows['xp_penalty'], rows['mask'])
+
+
+def test_design_matches_the_column_labels(engine, rows):
+    X = design(engine, rows)
+    assert X.shape == (len(rows['position']), len(engine.columns))
+    assert (X.data != 0).all()  # only active entries are stored
+    np.testing.assert_array_equal(X.toarray(), dense_reference(engine, rows))
+
+
+def test_design_rows_match_row_features_and_interaction_row(engine, rows):
+    X = design(engine, rows).toarray()
+    interactions = engine.interaction_design(rows['position'], rows['year'], rows['dev_trait'],
+                                             rows['xp_penalty'], rows['mask']).toarray()
+    np.testing.assert_array_equal(interactions, X[:, engine.interaction_start:])
+
+    for i in range(50):
+        codes = [int(rows[name][i]) for name in ('position', 'year', 'dev_trait')]
+        xp, mask = int(rows['xp_penalty'][i]), int(rows['mask'][i])
+        indices, data = engine.row_features(engine.position_levels[codes[0]], engine.year_levels[codes[1]],
+                                            engine.dev_trait_levels[codes[2]], xp, mask)
+        row = np.zeros(engine.p)
+        row[indices] = data
+        np.testing.assert_array_equal(row, X[i])
+
+        scalar = np.zeros(len(engine.interaction_columns))
+        for col, value in engine.interaction_row(*codes, xp, mask):
+            scalar[col] = value
+        np.testing.assert_array_equal(scalar, interactions[i])
+
+
+@pytest.mark.parametrize('block_rows', [7, 64, 8192])
+def test_gram_and_tdot_match_the_dense_products(engine, rows, block_rows):
+    X = design(engine, rows)
+    dense = X.toarray()
+    y = np.random.default_rng(1).normal(size=X.shape[0])
+    beta = np.random.default_rng(2).normal(size=X.shape[1])
+    np.testing.assert_allclose(X.gram(block_rows=block_rows), dense.T @ dense, rtol=1e-12)
+    np.testing.assert_allclose(X.tdot(y), dense.T @ y, rtol=1e-10, atol=1e-10)
+    np.testing.assert_allclose(X.dot(beta), dense @ beta, rtol=1e-10, atol=1e-10)
+    np.testing.assert_array_equal(X.slice(100, 300).toarray(), dense[100:300])
+
+
+def test_engine_without_interactions_is_the_additive_design():
+    model = load_model('v4.0')
+    engine = FeatureEngine(model.position_levels, model.year_levels, model.dev_trait_levels)
+    assert engine.p == len(model.beta) - 3  # one baseline column per factor dropped
+    assert engine.interaction_design([0, 1], [0, 1], [0, 1], [0, 5], [0, 3]).shape == (2, 0)
+
+
+@pytest.mark.parametrize('spec', ['DC_TD2', 'DC_TD9 * year', 'year{XR} * DC_TD2', 'position{} * HC_TD1',
+                                  'coach * year'])
+def test_bad_interaction_specs_are_rejected(spec):
+    model = load_model('v4.0')
+    with pytest.raises(ValueError):
+        FeatureEngine(model.position_levels, model.year_levels, model.dev_trait_levels, [spec])
@@ -0,0 +1,56 @@
+import random
+
+import intervals
+from intervals import IntervalRefresher
+from model import COACHING_VARS
+from registry import load_model
+from replica import SheetReplica
+from sheets import LocalWorksheet
+from storage import submission_row
+
+
+def sheet_rows(model, n, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        data = {var: rng.randrange(2) for var in COACHING_VARS}
+        data.update(team='Team', player_name=f'Player {i}', position=rng.choice(model.position_levels),
+                    year=rng.choice(model.year_levels), dev_trait=rng.choice(model.dev_trait_levels),
+                    xp_penalty=rng.randrange(50), snaps=0)
+        rows.append(submission_row(data, rng.randrange(150)))
+    return rows
+
+
+def test_refresher_waits_for_the_replica_and_follows_it(tmp_path):
+    model = load_model('v4.0')
+    path = str(tmp_path / 'replica.db')
+    refresher = IntervalRefresher(model, path, str(tmp_path / 'cache'), refresh_interval=0)
+    assert refresher.current() is None
+    refresher._thread.join()
+    assert refresher.table is None
+
+    sheet = LocalWorksheet(sheet_rows(model, 100))
+    replica = SheetReplica(path)
+    replica.sync(sheet)
+    refresher.current()
+    refresher._thread.join()
+    assert refresher.table is not None and refresher.built_at == 100
+
+    sheet.append_rows(sheet_rows(model, 50, seed=1))
+    replica.sync(sheet)
+    refresher.current()
+    refresher._thread.join()
+    assert refresher.built_at == 150
+
+
+def test_bootstrap_refresh_never_starts_a_process_pool(tmp_path, monkeypatch):
+    def no_pool(*args, **kwargs):
+        raise AssertionError("process pool started inside the app")
+    monkeypatch.setattr(intervals, 'ProcessPoolExecutor', no_pool)
+
+    model = load_model('v4.0')
+    path = str(tmp_path / 'replica.db')
+    SheetReplica(path).sync(LocalWorksheet(sheet_rows(model, 100)))
+    refresher = IntervalRefresher(model, path, str(tmp_path / 'cache'), method='bootstrap')
+    assert refresher.refresh()
+    assert refresher.table.lookup('Normal', 'QB')
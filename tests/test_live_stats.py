@@ -0,0 +1,29 @@
+import time
+
+from live_stats import LiveStats
+
+
+def test_updates_are_saved_in_batches(tmp_path):
+    path = tmp_path / 'live_stats.json'
+    stats = LiveStats(str(path), save_every=2, save_interval=3600)
+    stats.update('Elite', 40, 35)
+    assert not path.exists()
+
+    stats.update('Normal', 30, 33)
+    reopened = LiveStats(str(path))
+    assert reopened.overall.n == 2
+    assert reopened.by_dev_trait['Elite'].sum_abs == 5
+
+    stats.update('Elite', 50, 45)
+    stats.autosave.flush()  # what exit does
+    assert LiveStats(str(path)).by_dev_trait['Elite'].n == 2
+
+
+def test_interval_saves_a_partial_batch(tmp_path):
+    path = tmp_path / 'live_stats.json'
+    stats = LiveStats(str(path), save_every=50, save_interval=0.01)
+    stats.update('Star', 20, 22)
+    deadline = time.monotonic() + 5
+    while not path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert LiveStats(str(path)).overall.n == 1
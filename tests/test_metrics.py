@@ -0,0 +1,28 @@
+import socket
+
+from metrics import metrics, start_export
+
+
+def test_port_in_use_disables_export_without_raising():
+    with socket.socket() as taken:
+        taken.bind(('0.0.0.0', 0))
+        taken.listen()
+        port = taken.getsockname()[1]
+        enabled = metrics.enabled
+        assert start_export('prometheus', port=port) is None
+        assert metrics.enabled == enabled
+
+
+def test_prometheus_export_serves_on_free_port():
+    enabled = metrics.enabled
+    with socket.socket() as probe:
+        probe.bind(('0.0.0.0', 0))
+        port = probe.getsockname()[1]
+    server = start_export('prometheus', port=port)
+    try:
+        assert server is not None
+        assert metrics.enabled
+    finally:
+        server.shutdown()
+        server.server_close()
+        metrics.enabled = enabled
@@ -0,0 +1,95 @@
+import itertools
+import json
+import os
+
+import numpy as np
+import pytest
+
+from model import COACHING_VARS, N_STAFF_MASKS
+from registry import MODEL_DIR, load_model
+
+XP_PENALTIES = (0, 35, 100)
+
+
+def artifact(version):
+    with open(os.path.join(MODEL_DIR, f'{version}.json')) as f:
+        return json.load(f)
+
+
+def baseline_prediction(a, position, year, dev_trait, xp_penalty, coaching_abilities):
+    """The apps' original per-player arithmetic over the artifact's coefficient dicts"""
+    prediction = a['coefficients']['Intercept']
+    prediction += a['position_coeffs'][position]
+    prediction += a['year_coeffs'][year]
+    prediction += a['dev_trait_coeffs'][dev_trait]
+    prediction += a['coefficients']['XP_Penalty'] * xp_penalty
+    for var, value in coaching_abilities.items():
+        if value:
+            prediction += a['coefficients'][var]
+    if a['floor'] is not None:
+        prediction = max(a['floor'], prediction)
+    return prediction
+
+
+def sample_masks(n=20, seed=0):
+    """No staff, the full staff, every single ability and a random sample of the rest"""
+    rng = np.random.default_rng(seed)
+    masks = [0, N_STAFF_MASKS - 1, *(1 << bit for bit in range(len(COACHING_VARS)))]
+    return masks + rng.integers(0, N_STAFF_MASKS, n).tolist()
+
+
+def abilities(mask):
+    return {var: bool(mask >> bit & 1) for bit, var in enumerate(COACHING_VARS)}
+
+
+def roster(a, masks):
+    """Every level combination at a few XP penalties, each under every mask in `masks`"""
+    rows = list(itertools.product(a['position_coeffs'], a['year_coeffs'], a['dev_trait_coeffs'], XP_PENALTIES,
+                                  masks))
+    return {name: np.array(column) for name, column in
+            zip(('position', 'year', 'dev_trait', 'xp_penalty', 'mask'), zip(*rows))}
+
+
+@pytest.mark.parametrize('version', ['v2.3', 'v4.0'])
+def test_predict_masks_matches_the_baseline_arithmetic(version):
+    a = artifact(version)
+    players = roster(a, sample_masks())
+    expected = np.array([
+        baseline_prediction(a, p, y, d, xp, abilities(int(m)))
+        for p, y, d, xp, m in zip(*players.values())
+    ])
+    np.testing.assert_allclose(load_model(version).predict_masks(players, players['mask']), expected,
+                               rtol=0, atol=1e-9)
+    if a['floor'] is not None:
+        assert (expected == a['floor']).any()  # the floor is exercised
+
+
+@pytest.mark.parametrize('version', ['v2.3', 'v4.0'])
+def test_predict_batch_matches_the_baseline_arithmetic(version):
+    a = artifact(version)
+    model = load_model(version)
+    players = roster(a, [0])
+    for mask in sample_masks(5):
+        staff = abilities(mask)
+        expected = [baseline_prediction(a, p, y, d, xp, staff)
+                    for p, y, d, xp in zip(players['position'], players['year'], players['dev_trait'],
+                                           players['xp_penalty'])]
+        np.testing.assert_allclose(model.predict_batch(players, staff), expected, rtol=0, atol=1e-9)
+
+
+@pytest.mark.parametrize('version', ['v2.3', 'v4.0'])
+def test_predict_matches_the_baseline_arithmetic(version):
+    a = artifact(version)
+    model = load_model(version)
+    players = roster(a, sample_masks())
+    for p, y, d, xp, m in zip(*players.values()):
+        staff = abilities(int(m))
+        assert model.predict(p, y, d, xp, staff) == pytest.approx(baseline_prediction(a, p, y, d, xp, staff),
+                                                                  rel=0, abs=1e-9)
+
+
+@pytest.mark.parametrize('version', ['v2.3', 'v4.0'])
+def test_staff_bonus_table_covers_every_mask(version):
+    coefficients = artifact(version)['coefficients']
+    expected = [sum(coefficients[var] for var, on in abilities(mask).items() if on) for mask in range(N_STAFF_MASKS)]
+    np.testing.assert_allclose(load_model(version).staff_bonus, expected, rtol=0, atol=1e-9)
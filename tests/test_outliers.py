@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from outliers import BIN_WIDTH, N_BINS, RESIDUAL_RANGE, OutlierFilter, RobustHistogram
+
+
+def record(residual, dev_trait='Normal', position='QB', prediction=50.0):
+    """Prediction inputs whose actual points will give `residual`"""
+    return {'dev_trait': dev_trait, 'position': position, 'prediction': prediction}, prediction + residual
+
+
+@pytest.fixture
+def outliers(tmp_path):
+    outliers = OutlierFilter(str(tmp_path / 'outliers.db'), min_n=30)
+    yield outliers
+    outliers.close()
+
+
+def test_histogram_median_and_mad_are_within_a_bin():
+    rng = np.random.default_rng(0)
+    residuals = rng.normal(3.0, 8.0, 5001)
+    histogram = RobustHistogram()
+    for r in residuals:
+        histogram.add(r)
+
+    median = np.median(residuals)
+    assert histogram.n == len(residuals)
+    assert abs(histogram.median() - median) <= BIN_WIDTH
+    assert abs(histogram.mad() - np.median(np.abs(residuals - median))) <= 2 * BIN_WIDTH
+
+
+def test_histogram_clamps_to_its_end_bins():
+    assert RobustHistogram.bin(-RESIDUAL_RANGE - 50) == 0
+    assert RobustHistogram.bin(RESIDUAL_RANGE + 50) == N_BINS - 1
+    histogram = RobustHistogram()
+    histogram.add(5.0, count=10)
+    assert histogram.median() == 5.0
+    assert histogram.mad() == BIN_WIDTH  # never zero
+
+
+def test_outlier_is_quarantined_once_its_stratum_has_enough_residuals(outliers):
+    rng = np.random.default_rng(1)
+    wild = record(60.0)
+    assert outliers.score('Normal', 'QB', 60.0) is None
+    for r in rng.normal(0, 4, 29):
+        assert outliers.admit(*record(r))
+    # Below min_n nothing is scored, so even a wild residual is admitted
+    assert outliers.admit(*record(-60.0))
+    assert len(outliers) == 0
+
+    assert not outliers.admit(*wild)
+    [held] = outliers.quarantined()
+    assert held['record'] == wild[0] and held['actual_points'] == wild[1]
+    assert held['residual'] == 60.0 and held['score'] > outliers.threshold
+    assert outliers.admit(*record(2.0))
+
+
+def test_sparse_stratum_borrows_the_pooled_statistics(outliers):
+    for r in np.linspace(-5, 5, 40):
+        outliers.admit(*record(r, position='WR'))
+    # QB has no residuals of its own; the Normal DevT pool scores it
+    assert outliers.score('Normal', 'QB', 0.0) == pytest.approx(0.0, abs=0.2)
+    assert not outliers.admit(*record(80.0, position='QB'))
+    # A DevT with no residuals falls back to everything
+    assert outliers.score('Elite', 'K', 80.0) > outliers.threshold
+
+
+def test_flag_logs_outliers_but_admits_them(tmp_path):
+    outliers = OutlierFilter(str(tmp_path / 'outliers.db'), min_n=30, action='flag')
+    for r in np.linspace(-5, 5, 40):
+        outliers.admit(*record(r))
+    assert outliers.admit(*record(70.0))
+    assert len(outliers) == 1
+    with pytest.raises(ValueError):
+        OutlierFilter(str(tmp_path / 'other.db'), action='drop')
+
+
+def test_statistics_and_quarantine_persist(tmp_path, outliers):
+    for r in np.linspace(-5, 5, 40):
+        outliers.admit(*record(r))
+    outliers.admit(*record(70.0))
+
+    reopened = OutlierFilter(outliers.path, min_n=30)
+    for key, histogram in outliers.histograms.items():
+        assert reopened.histograms[key].counts == histogram.counts
+    [held] = reopened.quarantined()
+
+    rec, actual_points = reopened.release(held['id'])
+    assert (rec, actual_points) == record(70.0)
+    assert len(reopened) == 0
+    assert reopened.quarantined(include_released=True)[0]['released'] == 1
+    with pytest.raises(KeyError):
+        reopened.release(held['id'])
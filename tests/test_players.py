@@ -0,0 +1,43 @@
+from model import COACHING_VARS
+from players import PlayerIndex
+from replica import SheetReplica
+from sheets import SUBMISSION_COLUMNS, LocalWorksheet
+from storage import submission_row
+
+
+def prediction_data(year, xp_penalty=0):
+    data = dict.fromkeys(COACHING_VARS, 0)
+    data.update(team='Auburn', player_name='Smith', position='QB', year=year, dev_trait='Star',
+                xp_penalty=xp_penalty, snaps=300, prediction=50.0)
+    return data
+
+
+def test_local_submission_before_first_refresh_stays_latest(tmp_path):
+    sheet = LocalWorksheet([submission_row(prediction_data('FR'), 30), submission_row(prediction_data('SO'), 45)])
+    replica = SheetReplica(str(tmp_path / 'replica.db'))
+    replica.sync(sheet)
+
+    index = PlayerIndex(replica.path)
+    assert index.add_submission(prediction_data('JR', xp_penalty=5), 60)
+    index.refresh(force=True)
+
+    assert [entry['year'] for entry in index.history('Auburn', 'Smith')] == ['FR', 'SO', 'JR']
+    assert index.last_known('auburn', 'smith')['year'] == 'JR'
+
+    # The submission reaches the sheet and comes back through the replica without repeating
+    sheet.append_rows([submission_row(prediction_data('JR', xp_penalty=5), 60)])
+    replica.sync(sheet)
+    index.refresh(force=True)
+    history = index.history('Auburn', 'Smith')
+    assert [entry['year'] for entry in history] == ['FR', 'SO', 'JR']
+    assert [entry['actual'] for entry in history] == [30, 45, 60]
+
+
+def test_synced_rows_follow_sheet_order(tmp_path):
+    index = PlayerIndex()
+    rows = [dict(zip(SUBMISSION_COLUMNS, submission_row(prediction_data(year), points)), sheet_row=sheet_row)
+            for sheet_row, year, points in ((7, 'SO', 45), (3, 'FR', 30))]
+    for row in rows:
+        index.add(row)
+    assert [entry['year'] for entry in index.history('Auburn', 'Smith')] == ['FR', 'SO']
+    assert index.last_known('Auburn', 'Smith')['year'] == 'SO'
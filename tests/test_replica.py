@@ -0,0 +1,69 @@
+import sqlite3
+
+from replica import SheetReplica
+from sheets import SUBMISSION_COLUMNS, LocalWorksheet
+
+
+def sheet_row(team, player_name, actual_points=40):
+    row = dict.fromkeys(SUBMISSION_COLUMNS, 0)
+    row.update(team=team, player_name=player_name, position='QB', year='FR', dev_trait='Normal',
+               actual_points=actual_points)
+    return [row[name] for name in SUBMISSION_COLUMNS]
+
+
+def test_identified_duplicates_are_dropped(tmp_path):
+    sheet = LocalWorksheet([sheet_row('Auburn', 'Smith'), sheet_row(' auburn', 'SMITH '), sheet_row('Auburn', 'Jones')])
+    replica = SheetReplica(str(tmp_path / 'replica.db'))
+    assert replica.sync(sheet) == 2
+    assert replica.duplicates == 1
+    assert [row['sheet_row'] for row in replica.iter_rows()] == [1, 3]
+
+
+def test_anonymous_rows_with_equal_content_are_kept(tmp_path):
+    sheet = LocalWorksheet([sheet_row('', ''), sheet_row('', ''), sheet_row('Auburn', ''), sheet_row('Auburn', '')])
+    replica = SheetReplica(str(tmp_path / 'replica.db'))
+    assert replica.sync(sheet) == 4
+    assert replica.dedupe() == 0
+    assert len(replica) == 4
+
+
+def test_replica_deduplicated_by_the_old_rule_is_repaired(tmp_path):
+    path = str(tmp_path / 'replica.db')
+    rows = [sheet_row('', ''), sheet_row('', ''), sheet_row('Auburn', 'Smith'), sheet_row('Auburn', 'Smith')]
+    sheet = LocalWorksheet(rows)
+    replica = SheetReplica(path)
+    replica.sync(sheet)
+    replica.close()
+
+    # Simulate a replica from before the rule: the repeated anonymous row was removed
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('DELETE FROM submissions WHERE sheet_row = 2')
+        conn.execute("DELETE FROM sync_state WHERE key = 'dedupe_rule'")
+    conn.close()
+
+    replica = SheetReplica(path)
+    assert replica.high_water() == 0
+    replica.sync(sheet)
+    assert [row['sheet_row'] for row in replica.iter_rows()] == [1, 2, 3]
+    assert replica.duplicates == 1
+
+
+def test_background_sync_follows_the_sheet_and_survives_failures(tmp_path):
+    import time
+
+    from replica import ReplicaSyncer
+
+    sheet = LocalWorksheet([sheet_row('Auburn', 'Smith')], fail_next=1)
+    syncer = ReplicaSyncer(str(tmp_path / 'replica.db'), lambda: sheet, interval=0.02, start_delay=0)
+    syncer.start()
+    try:
+        deadline = time.monotonic() + 5
+        while syncer.last_sync is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        sheet.append_rows([sheet_row('Auburn', 'Jones')])
+        time.sleep(0.1)
+    finally:
+        syncer.stop()
+    assert syncer.last_error is None
+    assert len(SheetReplica(str(tmp_path / 'replica.db'))) == 2
@@ -0,0 +1,42 @@
+from features import COACHING_INTERACTIONS
+from registry import load_model
+from retrain import OnlineTrainer
+
+
+def record(year='FR'):
+    return {'position': 'QB', 'year': year, 'dev_trait': 'Normal', 'xp_penalty': 10, 'DC_TD2': 1}
+
+
+def test_state_file_supplies_its_interactions(tmp_path):
+    path = str(tmp_path / 'state.npz')
+    base = load_model('v2.3')
+    trainer = OnlineTrainer(path, base, interactions=list(COACHING_INTERACTIONS))
+    trainer.add(record(), 40)
+    trainer.autosave.flush()
+
+    # A tool that only knows the registry model opens the interaction-aware state as saved
+    reopened = OnlineTrainer(path, base)
+    assert reopened.stats.interactions == list(COACHING_INTERACTIONS)
+    assert reopened.stats.n == 1
+    reopened.add(record('SO'), 35)
+    assert reopened.stats.n == 2
+
+
+def test_new_state_uses_the_base_model_design(tmp_path):
+    trainer = OnlineTrainer(str(tmp_path / 'state.npz'), load_model('v4.0'))
+    assert trainer.stats.interactions == []
+
+
+def test_submissions_are_saved_in_batches(tmp_path):
+    path = tmp_path / 'state.npz'
+    trainer = OnlineTrainer(str(path), load_model('v4.0'), save_every=3, save_interval=3600)
+    trainer.add(record(), 40)
+    trainer.add(record('SO'), 35)
+    assert not path.exists()
+
+    trainer.add(record('JR'), 30)
+    assert OnlineTrainer(str(path), load_model('v4.0')).stats.n == 3
+
+    trainer.add(record(), 45)
+    trainer.autosave.flush()  # what exit does
+    assert OnlineTrainer(str(path), load_model('v4.0')).stats.n == 4
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from model import COACHING_VARS
+from replica import SheetReplica
+from services import AppServices
+from sheets import LocalWorksheet
+from storage import submission_row
+
+
+def prediction_data(model, i):
+    data = dict.fromkeys(COACHING_VARS, 0)
+    data.update(team='Auburn', player_name=f'Player {i}', position='QB', year='FR', dev_trait='Normal',
+                xp_penalty=i % 20, snaps=0)
+    data['prediction'] = model.predict('QB', 'FR', 'Normal', data['xp_penalty'], data)
+    return data
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def services():
+    return AppServices('v4.0', storage_backend='local')
+
+
+def test_trainer_rebuild_waits_for_the_replica_and_skips_outliers(workdir):
+    first = services()
+    model = first.base_model
+    assert first.trainer.stats.n == 0
+    assert not os.path.exists(first.trainer_state_path + '.rebuilt')
+
+    # The live screen learns typical residuals, then quarantines one wild submission
+    for i in range(40):
+        data = prediction_data(model, i)
+        assert first.outliers.admit(data, round(data['prediction']))
+    wild = prediction_data(model, 99)
+    assert not first.outliers.admit(wild, round(wild['prediction']) + 90)
+
+    rows = [submission_row(data, round(data['prediction'])) for data in map(lambda i: prediction_data(model, i), range(40))]
+    rows.append(submission_row(wild, round(wild['prediction']) + 90))
+    SheetReplica(first.replica_path).sync(LocalWorksheet(rows))
+
+    # A later start finds the replica and rebuilds without the quarantined row
+    second = services()
+    assert second.trainer.stats.n == 40
+    assert os.path.exists(second.trainer_state_path + '.rebuilt')
+
+    # The rebuild happens once; later starts keep the saved state
+    second.trainer.add(prediction_data(model, 50), 30)
+    second.trainer.autosave.flush()
+    assert services().trainer.stats.n == 41
+
+
+def test_save_feeds_every_service(workdir):
+    app = services()
+    data = prediction_data(app.base_model, 1)
+    assert app.save(data, 40, scope='session')
+    assert not app.save(data, 40, scope='session')
+    assert app.trainer.stats.n == 1
+    assert app.live_stats.overall.n == 1
+    assert app.player_index.last_known('Auburn', 'Player 1')['year'] == 'FR'
@@ -0,0 +1,210 @@
+import json
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from model import COACHING_VARS
+from sheets import LocalWorksheet
+from spool import SpoolWorker, SubmissionSpool
+from storage import SubmissionStore
+
+
+def row(i):
+    return ['Team', f'Player {i}', i]
+
+
+def prediction_data():
+    return {'team': 'Auburn', 'player_name': 'Test Player', 'snaps': 300, 'position': 'QB', 'year': 'FR',
+            'dev_trait': 'Star', 'xp_penalty': 0, **{var: 0 for var in COACHING_VARS}}
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met before timeout")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def spool(tmp_path):
+    spool = SubmissionSpool(str(tmp_path / 'spool.db'))
+    yield spool
+    spool.close()
+
+
+def start_worker(spool, sheet, **kwargs):
+    kwargs.setdefault('poll_interval', 0.01)
+    worker = SpoolWorker(spool, lambda: sheet, **kwargs)
+    worker.start()
+    return worker
+
+
+def test_full_batches_flush_without_waiting(spool):
+    sheet = LocalWorksheet()
+    worker = start_worker(spool, sheet, batch_size=5, max_latency=60)
+    try:
+        for i in range(12):
+            worker.submit(row(i))
+        wait_until(lambda: len(sheet.rows) == 10)
+        time.sleep(0.1)
+    finally:
+        worker.stop()
+    # Two full batches went out as two calls; the partial one waits for max_latency
+    assert sheet.calls == 2
+    assert sheet.rows == [row(i) for i in range(10)]
+    assert len(spool) == 2
+
+
+def test_partial_batch_flushes_after_max_latency(spool):
+    sheet = LocalWorksheet()
+    worker = start_worker(spool, sheet, batch_size=100, max_latency=0.2)
+    try:
+        start = time.monotonic()
+        for i in range(3):
+            worker.submit(row(i))
+        wait_until(lambda: len(sheet.rows) == 3)
+        elapsed = time.monotonic() - start
+    finally:
+        worker.stop()
+    assert elapsed >= 0.2
+    assert sheet.calls == 1
+    assert len(spool) == 0
+
+
+def test_failed_writes_are_retried(spool):
+    sheet = LocalWorksheet(fail_next=3)
+    worker = start_worker(spool, sheet, batch_size=2, max_latency=0, base_backoff=0.01, max_backoff=0.05)
+    try:
+        worker.submit(row(0))
+        worker.submit(row(1))
+        wait_until(lambda: len(sheet.rows) == 2)
+        wait_until(lambda: worker.failures == 0)
+    finally:
+        worker.stop()
+    assert sheet.rows == [row(0), row(1)]
+    assert sheet.calls == 4
+    assert worker.last_error is None
+    assert len(spool) == 0
+
+
+def test_backoff_is_jittered_exponential(spool):
+    worker = SpoolWorker(spool, lambda: None, base_backoff=1.0, max_backoff=10.0)
+    for failures, full in ((1, 1.0), (2, 2.0), (3, 4.0), (6, 10.0)):
+        worker.failures = failures
+        delays = [worker._backoff() for _ in range(50)]
+        assert all(full * 0.5 <= delay <= full for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_backoff_follows_retry_after(spool):
+    error = ConnectionError("circuit open")
+    error.retry_after = 7.5
+    worker = SpoolWorker(spool, lambda: None, max_backoff=5.0)
+    worker.failures = 1
+    assert worker._backoff(error) == 5.0
+
+
+def test_unavailable_sheet_keeps_rows(spool):
+    worker = SpoolWorker(spool, lambda: None)
+    worker.submit(row(0))
+    with pytest.raises(ConnectionError):
+        worker.flush_once()
+    assert spool.claim(10) == [(1, row(0))]
+
+
+def test_rows_survive_reopen(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    sheet = LocalWorksheet(fail_next=1)
+    first = SubmissionSpool(path)
+    worker = SpoolWorker(first, lambda: sheet, batch_size=10)
+    for i in range(3):
+        worker.submit(row(i))
+    with pytest.raises(ConnectionError):
+        worker.flush_once()
+    first.close()
+
+    reopened = SubmissionSpool(path)
+    assert len(reopened) == 3
+    SpoolWorker(reopened, lambda: sheet, batch_size=2).drain()
+    reopened.close()
+    assert sheet.rows == [row(i) for i in range(3)]
+
+
+def test_expired_claim_is_retried_after_crash(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    crashed = SubmissionSpool(path, lease=0.05)
+    crashed.put(row(0))
+    assert len(crashed.claim(10)) == 1
+    crashed.close()
+
+    other = SubmissionSpool(path)
+    assert other.claim(10) == []
+    time.sleep(0.1)
+    assert [r for _, r in other.claim(10)] == [row(0)]
+    other.close()
+
+
+def test_workers_sharing_a_spool_send_each_row_once(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    sheet = LocalWorksheet(latency=0.01)
+    spools = [SubmissionSpool(path) for _ in range(2)]
+    workers = [start_worker(spool, sheet, batch_size=5, max_latency=0) for spool in spools]
+    try:
+        writers = [
+            threading.Thread(target=lambda w=w, k=k: [w.submit(row(k * 100 + i)) for i in range(40)])
+            for k, w in enumerate(workers)
+        ]
+        for writer in writers:
+            writer.start()
+        for writer in writers:
+            writer.join()
+        wait_until(lambda: len(spools[0]) == 0)
+    finally:
+        for worker in workers:
+            worker.stop()
+        for spool in spools:
+            spool.close()
+    sent = [tuple(r) for r in sheet.rows]
+    assert len(sent) == 80
+    assert len(set(sent)) == 80
+
+
+def test_spool_written_before_leases_is_migrated(tmp_path):
+    path = str(tmp_path / 'spool.db')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE spool (id INTEGER PRIMARY KEY AUTOINCREMENT, row TEXT NOT NULL, created REAL NOT NULL)')
+        conn.execute('INSERT INTO spool (row, created) VALUES (?, ?)', (json.dumps(row(0)), time.time()))
+    conn.close()
+
+    spool = SubmissionSpool(path)
+    assert spool.peek(10) == [(1, row(0))]
+    assert spool.claim(10) == [(1, row(0))]
+    spool.close()
+
+
+def test_store_starts_nothing_until_the_first_save(tmp_path):
+    sheet = LocalWorksheet()
+    opened = []
+    store = SubmissionStore(str(tmp_path / 'spool.db'), lambda: opened.append(1) or sheet, batch_size=1,
+                            dedupe_path=str(tmp_path / 'keys.db'))
+    assert store._worker is None and store._dedupe is None and not opened
+    assert not (tmp_path / 'spool.db').exists()
+
+    written = store.save(prediction_data(), 40, scope='s')
+    try:
+        wait_until(lambda: sheet.rows)
+    finally:
+        store.worker.stop()
+    assert sheet.rows == [written] and opened
+
+
+def test_failed_spool_write_forgets_the_dedupe_key(tmp_path):
+    store = SubmissionStore(str(tmp_path / 'spool.db'), lambda: None, dedupe_path=str(tmp_path / 'keys.db'))
+    store.worker.stop()
+    store.worker.spool.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        store.save(prediction_data(), 40, scope='s')
+    assert len(store.dedupe) == 0